@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Audit the tags of a music library (replaces AudioTagAudit.ps1).
+
+Every audio file is read once with the same mutagen reader the Plex organizer
+uses, in a process pool. Files whose size and mtime match the media catalog
+reuse the tags cached there by the previous audit. Besides the per-file checks
+(missing album, album artist, artist, title, track or disc), each album folder
+is checked as a whole for mixed album / album artist tags, duplicate or missing
+track numbers and partially tagged disc numbers. Rows are written to the CSV
+as soon as an album folder is complete.
+
+Usage:
+    python audio_tag_audit.py "D:/Music" --output AudioTagAudit.csv
+    python audio_tag_audit.py "/music" --albums-only --workers 8
+"""
+
+import os
+import csv
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import media_stats
+from audio_tags import read_tags
+from media_catalog import open_catalog, load_results, store_results
+
+TOOL_NAME = 'tag_audit'
+AUDIT_EXTENSIONS = ('.mp3', '.flac', '.m4a', '.ogg', '.wma')
+FIELDS = ('album', 'albumartist', 'artist', 'title', 'track', 'disc')
+FILE_COLUMNS = ['File', 'Album', 'AlbumArtist', 'Artist', 'Title', 'Track', 'DiscNumber', 'Issues']
+MISSING = {
+    'album': "Missing Album",
+    'albumartist': "Missing AlbumArtist",
+    'artist': "Missing Artist",
+    'title': "Missing Title",
+    'track': "Missing Track",
+    'disc': "Missing DiscNumber",
+}
+
+def read_file_tags(path):
+    """Worker: (the audited tag fields of one file or None when it has no readable tags, stats)."""
+    with media_stats.stage('metadata'):
+        tags = read_tags(path)
+    if tags is None:
+        return None, media_stats.take()
+    return {field: getattr(tags, field) for field in FIELDS}, media_stats.take()
+
+def find_audio_files(root):
+    """Yield (path, size, mtime_ns) for every audited file, one folder at a time."""
+    for dirpath, dirs, files in media_stats.walk(os.path.abspath(root)):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith(AUDIT_EXTENSIONS):
+                path = os.path.join(dirpath, file)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime_ns
+
+def iter_tags(files, cached, workers=None):
+    """Yield (path, size, mtime_ns, tags, from_cache) in the order of files.
+
+    Unchanged files come straight from the cache; the rest are read in a process
+    pool whose results are merged back in order, so output can start before the
+    whole library has been read.
+    """
+    jobs = [path for path, size, mtime_ns in files
+            if cached.get(path, (None, None))[:2] != (size, mtime_ns)]
+    media_stats.count('cached', len(files) - len(jobs))
+    with ProcessPoolExecutor(max_workers=workers, initializer=media_stats.init_worker) as executor:
+        read = executor.map(read_file_tags, jobs, chunksize=32)
+        for path, size, mtime_ns in files:
+            entry = cached.get(path)
+            if entry is not None and entry[:2] == (size, mtime_ns):
+                yield path, size, mtime_ns, entry[2], True
+            else:
+                tags, stats = next(read)
+                media_stats.merge(stats)
+                yield path, size, mtime_ns, tags, False
+
+def _number(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def file_issues(tags):
+    if tags is None:
+        return ["Unreadable or untagged file"]
+    return [message for field, message in MISSING.items() if not tags[field]]
+
+def album_issues(album):
+    """Issues of an album folder as a whole, from its [(path, tags)] entries."""
+    tagged = [tags for _, tags in album if tags is not None]
+    issues = []
+    if len({tags['album'] for tags in tagged if tags['album']}) > 1:
+        issues.append("Inconsistent Album")
+    if len({tags['albumartist'] for tags in tagged if tags['albumartist']}) > 1:
+        issues.append("Inconsistent AlbumArtist")
+
+    discs = [tags['disc'] for tags in tagged]
+    if any(discs) and not all(discs):
+        issues.append("Inconsistent DiscNumber")
+
+    per_disc = {}
+    for tags in tagged:
+        track = _number(tags['track'])
+        if track is not None:
+            per_disc.setdefault(_number(tags['disc']) or 1, []).append(track)
+    for disc, tracks in sorted(per_disc.items()):
+        counts = Counter(tracks)
+        if any(n > 1 for n in counts.values()):
+            issues.append(f"Duplicate Track (disc {disc})")
+        if len(counts) < max(counts):
+            issues.append(f"Missing Tracks (disc {disc})")
+    return issues
+
+def album_label(album):
+    """'AlbumArtist - Album' from the folder's most common tags, as the PowerShell report keyed albums."""
+    tagged = [tags for _, tags in album if tags is not None]
+    if not tagged:
+        return os.path.dirname(album[0][0])
+    artist = Counter(tags['albumartist'] or tags['artist'] or '' for tags in tagged).most_common(1)[0][0]
+    title = Counter(tags['album'] or '' for tags in tagged).most_common(1)[0][0]
+    return f"{artist} - {title}"
+
+def iter_albums(entries):
+    """Group consecutive (path, tags) entries by folder."""
+    album = []
+    for path, tags in entries:
+        if album and os.path.dirname(path) != os.path.dirname(album[0][0]):
+            yield album
+            album = []
+        album.append((path, tags))
+    if album:
+        yield album
+
+def file_row(path, tags, issues):
+    tags = tags or {}
+    return [path] + [tags.get(field) or '' for field in ('album', 'albumartist', 'artist', 'title', 'track', 'disc')] \
+        + ["; ".join(issues) if issues else "None"]
+
+def audit_library(root, output, catalog_path, albums_only=False, workers=None):
+    conn = open_catalog(catalog_path)
+    cached = load_results(conn, TOOL_NAME, root)
+    files = list(find_audio_files(root))
+    print(f"Auditing {len(files)} audio files in {root}")
+
+    batch = []
+    def entries():
+        nonlocal batch
+        for path, size, mtime_ns, tags, from_cache in iter_tags(files, cached, workers):
+            if not from_cache:
+                batch.append((path, size, mtime_ns, tags))
+                if len(batch) >= 500:
+                    store_results(conn, TOOL_NAME, batch)
+                    batch = []
+            yield path, tags
+
+    album_totals = {}
+    flagged = 0
+    with open(output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if not albums_only:
+            writer.writerow(FILE_COLUMNS)
+        for album in iter_albums(entries()):
+            shared = album_issues(album)
+            if albums_only:
+                issues = album_totals.setdefault(album_label(album), set())
+                issues.update(shared)
+                for _, tags in album:
+                    issues.update(file_issues(tags))
+                continue
+            for path, tags in album:
+                issues = file_issues(tags) + shared
+                flagged += bool(issues)
+                writer.writerow(file_row(path, tags, issues))
+            f.flush()
+
+        if albums_only:
+            # Like the PowerShell report: each album lists its issues by how common they are overall
+            frequency = Counter(issue for issues in album_totals.values() for issue in issues)
+            writer.writerow(['Album', 'Issues'])
+            for label, issues in album_totals.items():
+                ranked = sorted(issues, key=lambda issue: (-frequency[issue], issue))
+                writer.writerow([label, "; ".join(ranked)])
+            flagged = sum(1 for issues in album_totals.values() if issues)
+    store_results(conn, TOOL_NAME, batch)
+    conn.close()
+
+    unit = "albums" if albums_only else "files"
+    print(f"{flagged} {unit} with issues")
+    print(f"Audit complete. Report saved to: {output}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit album, artist, track and disc tags of a music library.")
+    parser.add_argument("root", help="Root folder of the music library")
+    parser.add_argument("--output", default="AudioTagAudit.csv", help="CSV report to write")
+    parser.add_argument("--albums-only", action="store_true", help="One row per album with the union of its issues")
+    parser.add_argument("--workers", type=int, default=None, help="Tag reader processes (default: one per CPU)")
+    parser.add_argument("--db", default="media_catalog.db", help="Media catalog database caching the tags")
+    media_stats.add_arguments(parser)
+    args = parser.parse_args()
+    media_stats.configure(args)
+
+    if not os.path.isdir(args.root):
+        print(f"Error: Folder not found - {args.root}")
+        return
+
+    audit_library(os.path.abspath(args.root), args.output, args.db,
+                  albums_only=args.albums_only, workers=args.workers)
+    media_stats.report(args)
+
+if __name__ == "__main__":
+    main()
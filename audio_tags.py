@@ -0,0 +1,260 @@
+import os
+
+# mutagen is imported inside the readers and writers: each container module
+# costs startup time, and most runs only ever touch one or two formats.
+from bounded_io import open_bounded
+from media_headers import map_file, read_id3_text
+
+class AudioTags:
+    """Lightweight tag record shared by the music tools."""
+    __slots__ = ('path', 'artist', 'album', 'albumartist', 'title', 'track', 'disc')
+
+    def __init__(self, path, artist=None, album=None, albumartist=None, title=None, track=None, disc=None):
+        self.path = path
+        self.artist = artist
+        self.album = album
+        self.albumartist = albumartist
+        self.title = title
+        self.track = track
+        self.disc = disc
+
+    def __repr__(self):
+        return (f"AudioTags({self.path!r}, artist={self.artist!r}, album={self.album!r}, "
+                f"title={self.title!r}, track={self.track!r}, disc={self.disc!r})")
+
+def _first(values):
+    """Return the first non-empty text value of a tag, or None."""
+    if not values:
+        return None
+    value = str(values[0]).strip()
+    return value or None
+
+def _number(value):
+    """Reduce '3/12' style numbers to '3'."""
+    if value is None:
+        return None
+    value = str(value).split('/')[0].strip()
+    return value or None
+
+def _from_id3(path, tags):
+    def text(frame_id):
+        frame = tags.get(frame_id)
+        return _first(frame.text) if frame is not None else None
+
+    return AudioTags(
+        path,
+        artist=text('TPE1'),
+        album=text('TALB'),
+        albumartist=text('TPE2'),
+        title=text('TIT2'),
+        track=_number(text('TRCK')),
+        disc=_number(text('TPOS')),
+    )
+
+def _from_vorbis(path, tags):
+    return AudioTags(
+        path,
+        artist=_first(tags.get('artist')),
+        album=_first(tags.get('album')),
+        albumartist=_first(tags.get('albumartist')),
+        title=_first(tags.get('title')),
+        track=_number(_first(tags.get('tracknumber'))),
+        disc=_number(_first(tags.get('discnumber'))),
+    )
+
+def _from_mp4(path, tags):
+    def pair(key):
+        value = tags.get(key)
+        if value and value[0] and value[0][0]:
+            return str(value[0][0])
+        return None
+
+    return AudioTags(
+        path,
+        artist=_first(tags.get('\xa9ART')),
+        album=_first(tags.get('\xa9alb')),
+        albumartist=_first(tags.get('aART')),
+        title=_first(tags.get('\xa9nam')),
+        track=pair('trkn'),
+        disc=pair('disk'),
+    )
+
+def _from_asf(path, tags):
+    def text(key):
+        return _first([v.value for v in tags.get(key, [])])
+
+    return AudioTags(
+        path,
+        artist=text('Author'),
+        album=text('WM/AlbumTitle'),
+        albumartist=text('WM/AlbumArtist'),
+        title=text('Title'),
+        track=_number(text('WM/TrackNumber')),
+        disc=_number(text('WM/PartOfSet')),
+    )
+
+def _fast_id3(path):
+    """Text frames of a plain ID3v2.3/2.4 tag straight from the mapped file, or None."""
+    with map_file(path) as buf:
+        values = read_id3_text(buf)
+    if values is None:
+        return None
+    return AudioTags(
+        path,
+        artist=values.get('TPE1'),
+        album=values.get('TALB'),
+        albumartist=values.get('TPE2'),
+        title=values.get('TIT2'),
+        track=_number(values.get('TRCK')),
+        disc=_number(values.get('TPOS')),
+    )
+
+def _read_mp3(path, f):
+    from mutagen.id3 import ID3, ID3NoHeaderError
+
+    try:
+        return _from_id3(path, ID3(f))
+    except ID3NoHeaderError:
+        return None
+
+def _parse_flac(path, f):
+    from mutagen.flac import FLAC
+
+    audio = FLAC(f)
+    tags = _from_vorbis(path, audio.tags) if audio.tags else None
+    return tags, audio.info
+
+def read_flac(filepath):
+    """Parse a FLAC file once and return (AudioTags or None, StreamInfo)."""
+    path = os.fspath(filepath)
+    with open_bounded(path) as f:
+        return _parse_flac(path, f)
+
+def _read_flac(path, f):
+    return _parse_flac(path, f)[0]
+
+def _read_mp4(path, f):
+    from mutagen.mp4 import MP4
+
+    tags = MP4(f).tags
+    return _from_mp4(path, tags) if tags else None
+
+def _read_ogg(path, f):
+    from mutagen.oggvorbis import OggVorbis
+
+    tags = OggVorbis(f).tags
+    return _from_vorbis(path, tags) if tags else None
+
+def _read_wav(path, f):
+    from mutagen.wave import WAVE
+
+    tags = WAVE(f).tags
+    return _from_id3(path, tags) if tags else None
+
+def _read_wma(path, f):
+    from mutagen.asf import ASF
+
+    tags = ASF(f).tags
+    return _from_asf(path, tags) if tags else None
+
+# Each reader parses the tag blocks of a single container type, once, without
+# scanning audio frames, from a bounded head/tail reader over the file.
+READERS = {
+    '.mp3': _read_mp3,
+    '.flac': _read_flac,
+    '.m4a': _read_mp4,
+    '.mp4': _read_mp4,
+    '.aac': _read_mp3,
+    '.ogg': _read_ogg,
+    '.wav': _read_wav,
+    '.wma': _read_wma,
+}
+
+# Header parsers for the common layouts; a None result falls through to mutagen
+FAST_READERS = {
+    '.mp3': _fast_id3,
+    '.aac': _fast_id3,
+}
+
+def read_tags(filepath):
+    """Read the tags of an audio file in a single parse, dispatching on extension.
+
+    Returns an AudioTags record, or None when the format is unsupported, the file
+    has no tags or cannot be parsed.
+    """
+    path = os.fspath(filepath)
+    ext = os.path.splitext(path)[1].lower()
+    reader = READERS.get(ext)
+    if reader is None:
+        return None
+    fast = FAST_READERS.get(ext)
+    if fast is not None:
+        try:
+            tags = fast(path)
+        except Exception:
+            # Anything the in-place parser trips over is left to mutagen
+            tags = None
+        if tags is not None:
+            return tags
+    try:
+        with open_bounded(path) as f:
+            return reader(path, f)
+    except Exception:
+        return None
+
+def _keep_padding(info):
+    """Reuse the existing padding so a tag edit is written in place when it fits."""
+    return info.padding if info.padding >= 0 else info.get_default_padding()
+
+def _write_album_id3(path, album):
+    from mutagen.id3 import ID3, ID3NoHeaderError, TALB
+
+    try:
+        tags = ID3(path)
+    except ID3NoHeaderError:
+        tags = ID3()
+    tags.setall('TALB', [TALB(encoding=3, text=[album])])
+    # Keep the file's ID3 version: saving defaults to v2.4, which some players and Explorer cannot read
+    version = tags.version[1] if tags.version[1] in (3, 4) else 4
+    tags.save(path, padding=_keep_padding, v2_version=version, v23_sep='/' if version == 3 else None)
+
+def _write_album_flac(path, album):
+    from mutagen.flac import FLAC
+
+    audio = FLAC(path)
+    if audio.tags is None:
+        audio.add_tags()
+    audio['album'] = album
+    audio.save(padding=_keep_padding)
+
+def _write_album_mp4(path, album):
+    from mutagen.mp4 import MP4
+
+    audio = MP4(path)
+    if audio.tags is None:
+        audio.add_tags()
+    audio['\xa9alb'] = [album]
+    audio.save(padding=_keep_padding)
+
+ALBUM_WRITERS = {
+    '.mp3': _write_album_id3,
+    '.aac': _write_album_id3,
+    '.flac': _write_album_flac,
+    '.m4a': _write_album_mp4,
+    '.mp4': _write_album_mp4,
+}
+
+def write_album(filepath, album):
+    """Set the album tag of a file, in place where the format has padding."""
+    path = os.fspath(filepath)
+    writer = ALBUM_WRITERS.get(os.path.splitext(path)[1].lower())
+    if writer is not None:
+        writer(path, album)
+        return
+    from mutagen import File
+
+    audio = File(path, easy=True)
+    if audio is None:
+        raise ValueError(f"Unsupported format: {path}")
+    audio['album'] = album
+    audio.save()
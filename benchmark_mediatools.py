@@ -0,0 +1,739 @@
+#!/usr/bin/env python3
+"""
+Benchmark the mediatools scripts against synthetic media corpora.
+
+Corpora are generated locally with PIL, piexif and mutagen: JPEGs with and
+without EXIF GPS, PNGs, tagged MP3/FLAC/M4A files laid out as multi-disc
+albums, and small MP4s. Every tool runs in its own child process so that
+peak RSS is measured per tool.
+
+Usage:
+    python benchmark_mediatools.py run --sizes 1000,5000 --save results-abc123.json
+    python benchmark_mediatools.py compare results-old.json results-new.json
+    python benchmark_mediatools.py memory --rows 200000
+    python benchmark_mediatools.py headers --iterations 2000
+    python benchmark_mediatools.py fetch
+    python benchmark_mediatools.py startup --budget-ms 250
+    python benchmark_mediatools.py geocode --places 200000 --rows 1000000
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import struct
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime, timedelta
+
+from mediatools import COMMANDS, load_script
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Share of the corpus taken by each kind of file
+CORPUS_MIX = {
+    'jpg_gps': 0.20,
+    'jpg_nogps': 0.30,
+    'png': 0.10,
+    'mp3': 0.15,
+    'flac': 0.10,
+    'm4a': 0.10,
+    'mp4': 0.05,
+}
+
+TRACKS_PER_DISC = 12
+DISCS_PER_ALBUM = 2
+
+TOOLS = [
+    'find_no_gps_media',
+    'gps_extract',
+    'gps_update',
+    'gps_pipeline',
+    'classify_flac',
+    'music_finder',
+    'plex_music_organizer',
+    'plex_multidisc_organizer',
+]
+
+# --- Corpus generation -----------------------------------------------------
+
+def _box(box_type, payload):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+def _full_box(box_type, payload):
+    return _box(box_type, b'\x00\x00\x00\x00' + payload)
+
+def _minimal_mp4(path, handler, brand, created):
+    """Write the smallest ISO-BMFF file mutagen and ffprobe accept: ftyp, moov with one track, mdat."""
+    mac_time = int((created - datetime(1904, 1, 1)).total_seconds())
+    matrix = struct.pack('>9I', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+    mvhd = _full_box(b'mvhd', struct.pack('>IIII', mac_time, mac_time, 1000, 1000)
+                     + b'\x00\x01\x00\x00\x01\x00' + b'\x00' * 10 + matrix + b'\x00' * 24 + struct.pack('>I', 2))
+    mdhd = _full_box(b'mdhd', struct.pack('>IIII', mac_time, mac_time, 44100, 44100) + b'\x55\xc4\x00\x00')
+    hdlr = _full_box(b'hdlr', b'\x00' * 4 + handler + b'\x00' * 13)
+    moov = _box(b'moov', mvhd + _box(b'trak', _box(b'mdia', mdhd + hdlr)))
+    with open(path, 'wb') as f:
+        f.write(_box(b'ftyp', brand + b'\x00\x00\x00\x00' + brand + b'isom') + moov + _box(b'mdat', b'\x00' * 256))
+
+def _minimal_flac(path):
+    """Write a FLAC stream with a STREAMINFO block only (16-bit, 44.1 kHz, stereo)."""
+    info = struct.pack('>HH', 4096, 4096) + b'\x00' * 6
+    info += ((44100 << 44) | (1 << 41) | (15 << 36) | 44100 * 5).to_bytes(8, 'big') + b'\x00' * 16
+    with open(path, 'wb') as f:
+        f.write(b'fLaC' + bytes([0x80]) + len(info).to_bytes(3, 'big') + info)
+
+def _minimal_mp3(path):
+    """Write twenty silent MPEG-1 Layer III frames (128 kbps, 44.1 kHz)."""
+    with open(path, 'wb') as f:
+        f.write((b'\xff\xfb\x90\x64' + b'\x00' * 413) * 20)
+
+def _write_jpeg(path, taken, gps):
+    import piexif
+    from PIL import Image
+
+    exif = {"0th": {}, "Exif": {piexif.ExifIFD.DateTimeOriginal: taken.strftime('%Y:%m:%d %H:%M:%S')}, "GPS": {}, "1st": {}}
+    if gps:
+        lat, lon = gps
+        exif["GPS"] = {
+            piexif.GPSIFD.GPSLatitudeRef: 'N' if lat >= 0 else 'S',
+            piexif.GPSIFD.GPSLatitude: ((int(abs(lat)), 1), (int(abs(lat) * 60) % 60, 1), (0, 1)),
+            piexif.GPSIFD.GPSLongitudeRef: 'E' if lon >= 0 else 'W',
+            piexif.GPSIFD.GPSLongitude: ((int(abs(lon)), 1), (int(abs(lon) * 60) % 60, 1), (0, 1)),
+        }
+    Image.new('RGB', (64, 48), (random.randrange(256), 90, 160)).save(path, quality=80, exif=piexif.dump(exif))
+
+def _tag_audio(path, artist, album, title, track, disc):
+    from mutagen.flac import FLAC
+    from mutagen.mp4 import MP4
+    from mutagen.id3 import ID3, TPE1, TALB, TIT2, TRCK, TPOS
+
+    if path.endswith('.mp3'):
+        tags = ID3()
+        tags.add(TPE1(encoding=3, text=[artist]))
+        tags.add(TALB(encoding=3, text=[album]))
+        tags.add(TIT2(encoding=3, text=[title]))
+        tags.add(TRCK(encoding=3, text=[str(track)]))
+        tags.add(TPOS(encoding=3, text=[str(disc)]))
+        tags.save(path)
+    elif path.endswith('.flac'):
+        audio = FLAC(path)
+        audio['artist'], audio['album'], audio['title'] = artist, album, title
+        audio['tracknumber'], audio['discnumber'] = str(track), str(disc)
+        audio.save()
+    else:
+        audio = MP4(path)
+        audio['\xa9ART'], audio['\xa9alb'], audio['\xa9nam'] = [artist], [album], [title]
+        audio['trkn'], audio['disk'] = [(track, 0)], [(disc, 0)]
+        audio.save()
+
+def generate_corpus(root, size, seed=1234):
+    """Create a corpus of roughly `size` files under root and return its manifest."""
+    random.seed(seed)
+    counts = {kind: max(1, int(size * share)) for kind, share in CORPUS_MIX.items()}
+    photos = os.path.join(root, 'photos')
+    music = os.path.join(root, 'music')
+    videos = os.path.join(root, 'videos')
+    for directory in (photos, music, videos):
+        os.makedirs(directory, exist_ok=True)
+
+    # Photos are taken in bursts around a few trips so that proxy matching has real work
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    trips = [((random.uniform(-60, 60), random.uniform(-150, 150)), start + timedelta(days=7 * i)) for i in range(20)]
+
+    def photo_time_and_place():
+        (lat, lon), day = random.choice(trips)
+        return day + timedelta(minutes=random.randrange(12 * 60)), (lat + random.uniform(-0.01, 0.01), lon)
+
+    for i in range(counts['jpg_gps']):
+        taken, place = photo_time_and_place()
+        month_dir = os.path.join(photos, taken.strftime('%Y'), taken.strftime('%m'))
+        os.makedirs(month_dir, exist_ok=True)
+        _write_jpeg(os.path.join(month_dir, f"IMG_{i:05d}.JPG"), taken, place)
+    for i in range(counts['jpg_nogps']):
+        taken, _ = photo_time_and_place()
+        month_dir = os.path.join(photos, taken.strftime('%Y'), taken.strftime('%m'))
+        os.makedirs(month_dir, exist_ok=True)
+        _write_jpeg(os.path.join(month_dir, f"DSC_{i:05d}.jpg"), taken, None)
+
+    from PIL import Image
+    screenshots = os.path.join(photos, 'screenshots')
+    os.makedirs(screenshots, exist_ok=True)
+    for i in range(counts['png']):
+        Image.new('RGB', (64, 48), (20, 20, random.randrange(256))).save(os.path.join(screenshots, f"IMG_{i:05d}.PNG"))
+
+    titles = []
+    for ext in ('mp3', 'flac', 'm4a'):
+        for i in range(counts[ext]):
+            album_no, position = divmod(i, TRACKS_PER_DISC * DISCS_PER_ALBUM)
+            disc, track = divmod(position, TRACKS_PER_DISC)
+            disc += 1
+            track += 1
+            artist = f"Artist {ext.upper()} {album_no % 7}"
+            album = f"Album {ext.upper()} {album_no} (CD {disc})"
+            title = f"Song {random.choice(['Blue', 'Red', 'Night', 'River', 'Echo'])} {i}"
+            disc_dir = os.path.join(music, f"Album {ext.upper()} {album_no}", f"CD{disc}")
+            os.makedirs(disc_dir, exist_ok=True)
+            path = os.path.join(disc_dir, f"{track:02d} - {title}.{ext}")
+            if ext == 'mp3':
+                _minimal_mp3(path)
+            elif ext == 'flac':
+                _minimal_flac(path)
+            else:
+                _minimal_mp4(path, b'soun', b'M4A ', start)
+            _tag_audio(path, artist, album, title, track, disc)
+            titles.append((artist, title))
+
+    for i in range(counts['mp4']):
+        taken, _ = photo_time_and_place()
+        _minimal_mp4(os.path.join(videos, f"VID_{i:05d}.mp4"), b'vide', b'isom', taken)
+
+    manifest = {'size': size, 'seed': seed, 'counts': counts, 'titles': titles}
+    with open(os.path.join(root, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return manifest
+
+def ensure_corpus(corpus_dir, size):
+    root = os.path.join(corpus_dir, f"corpus-{size}")
+    manifest_path = os.path.join(root, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            return root, json.load(f)
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    print(f"Generating {size}-file corpus in {root}...")
+    started = time.perf_counter()
+    manifest = generate_corpus(root, size)
+    print(f"Corpus ready in {time.perf_counter() - started:.1f}s")
+    return root, manifest
+
+# --- Tool runners (executed in the child process) ---------------------------
+
+def _run_find_no_gps_media(corpus, workdir, manifest):
+    tool = load_script('find_no_gps_media.py')
+    tool.scan_directory_for_jpgs_without_gps(os.path.join(corpus, 'photos'), os.path.join(workdir, 'nogps.csv'))
+    return manifest['counts']['jpg_gps'] + manifest['counts']['jpg_nogps']
+
+def _run_gps_extract(corpus, workdir, manifest):
+    tool = load_script('update_media_gps-csv.py')
+    media_files = tool.process_directory(os.path.join(corpus, 'photos'))
+    tool.save_results(media_files, os.path.join(workdir, 'extract.csv'))
+    return len(media_files)
+
+def _run_gps_update(corpus, workdir, manifest):
+    tool = load_script('update_media_gps-csv.py')
+    photos = os.path.join(workdir, 'photos')
+    csv_path = os.path.join(workdir, 'update.csv')
+    # Updates rewrite files, so they run on a private copy made before the clock starts
+    shutil.copytree(os.path.join(corpus, 'photos'), photos)
+    media_files = tool.process_directory(photos)
+    tool.save_results(media_files, csv_path)
+    started = time.perf_counter()
+    tool.update_gps_from_csv(csv_path, photos)
+    return media_files.count('proxy'), time.perf_counter() - started
+
+def _run_gps_pipeline(corpus, workdir, manifest):
+    tool = load_script('fix_media_gps.py')
+    photos = os.path.join(workdir, 'photos')
+    shutil.copytree(os.path.join(corpus, 'photos'), photos)
+    # Timed end to end: it replaces find_no_gps_media, extract and update together
+    started = time.perf_counter()
+    totals = tool.fix_directory(photos)
+    return sum(totals.values()), time.perf_counter() - started
+
+def _run_classify_flac(corpus, workdir, manifest):
+    tool = load_script('classify_flac.py')
+    tool.scan_directory(os.path.join(corpus, 'music'))
+    return manifest['counts']['flac']
+
+def _run_music_finder(corpus, workdir, manifest):
+    tool = load_script('music_finder.py')
+    music_files = tool.find_music_files(os.path.join(corpus, 'music'))
+    for track in manifest['titles'][::max(1, len(manifest['titles']) // 20)]:
+        tool.find_best_match(tuple(track), music_files)
+    return len(music_files)
+
+def _run_plex_music_organizer(corpus, workdir, manifest):
+    tool = load_script('plex_music_organizer.py')
+    tool.organize_music(os.path.join(corpus, 'music'), os.path.join(workdir, 'plex'))
+    return len(manifest['titles'])
+
+def _run_plex_multidisc_organizer(corpus, workdir, manifest):
+    from pathlib import Path
+
+    tool = load_script('plex_multidisc_organizer.py')
+    processed = Path(workdir) / 'processed'
+    processed.mkdir()
+    for album_dir in sorted(Path(corpus, 'music').iterdir()):
+        tool.process_album_directory(album_dir, processed)
+    return len(manifest['titles'])
+
+def run_one(tool, corpus, workdir):
+    """Child-process entry point: run one tool quietly and print its timing as JSON."""
+    sys.path.insert(0, HERE)
+    with open(os.path.join(corpus, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    runner = globals()[f"_run_{tool}"]
+
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = runner(corpus, workdir, manifest)
+    elapsed = time.perf_counter() - started
+    if isinstance(result, tuple):
+        # The runner timed its own measured section
+        result, elapsed = result
+    print(json.dumps({'files': result, 'seconds': elapsed}))
+
+# --- Harness ----------------------------------------------------------------
+
+def measure(tool, corpus):
+    """Run a tool in a child process and return files, seconds and peak RSS."""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{tool}-")
+    try:
+        with tempfile.TemporaryFile('w+') as stderr_file:
+            proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), 'run-one', tool, corpus, workdir],
+                stdout=subprocess.PIPE, stderr=stderr_file, text=True
+            )
+            stdout = proc.stdout.read()
+            proc.stdout.close()
+            # wait4 gives the resource usage of this child alone
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            stderr_file.seek(0)
+            stderr = stderr_file.read()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if proc.returncode != 0:
+        return {'error': (stderr.strip().splitlines() or ['failed'])[-1]}
+    result = json.loads(stdout.strip().splitlines()[-1])
+    result['peak_rss_mb'] = usage.ru_maxrss / 1024
+    result['files_per_second'] = result['files'] / result['seconds'] if result['seconds'] else 0.0
+    return result
+
+def _synthetic_scan(rows, seed=1234):
+    """Yield (path, datetime, gps) tuples shaped like a photo library scan, without touching disk."""
+    from datetime import timezone
+
+    random.seed(seed)
+    start = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    for i in range(rows):
+        taken = start + timedelta(seconds=random.randrange(10 * 365 * 86400))
+        path = os.path.join('/photos', taken.strftime('%Y'), taken.strftime('%m'), f"IMG_{i:07d}.JPG")
+        gps = (random.uniform(-60, 60), random.uniform(-150, 150)) if random.random() < 0.5 else None
+        yield path, taken, gps
+
+def measure_scan_memory(rows):
+    """Memory held by scan results as one dict per file versus a MediaTable."""
+    import tracemalloc
+    from media_table import MediaTable
+
+    results = {}
+    tracemalloc.start()
+    try:
+        # Scan results as dicts, the way update_media_gps-csv.py used to keep them
+        baseline = tracemalloc.get_traced_memory()[0]
+        records = [{'path': path, 'datetime': taken, 'gps': gps} for path, taken, gps in _synthetic_scan(rows)]
+        results['dicts'] = tracemalloc.get_traced_memory()[0] - baseline
+        del records
+
+        baseline = tracemalloc.get_traced_memory()[0]
+        table = MediaTable()
+        for path, taken, gps in _synthetic_scan(rows):
+            table.append(path, taken, gps)
+        results['table'] = tracemalloc.get_traced_memory()[0] - baseline
+        del table
+    finally:
+        tracemalloc.stop()
+    return results
+
+def print_memory(rows, results):
+    print(f"\n{'representation':16} {'MB':>10} {'bytes/file':>11}")
+    for name, size in results.items():
+        print(f"{name:16} {size / (1024 * 1024):>10.1f} {size / rows:>11.1f}")
+    print(f"\nreduction: {results['dicts'] / results['table']:.1f}x")
+
+def _header_samples(directory):
+    """One JPEG with EXIF GPS, one tagged FLAC and one tagged MP3 with cover art."""
+    from mutagen.id3 import ID3, APIC
+
+    jpeg = os.path.join(directory, 'sample.jpg')
+    _write_jpeg(jpeg, datetime(2021, 6, 1, 12, 0, 0), (47.5, 8.5))
+    flac = os.path.join(directory, 'sample.flac')
+    _minimal_flac(flac)
+    _tag_audio(flac, 'Artist', 'Album', 'Title', 1, 1)
+    mp3 = os.path.join(directory, 'sample.mp3')
+    _minimal_mp3(mp3)
+    _tag_audio(mp3, 'Artist', 'Album', 'Title', 1, 1)
+    tags = ID3(mp3)
+    tags.add(APIC(encoding=3, mime='image/jpeg', type=3, data=b'\xff' * 300000))
+    tags.save(mp3)
+    return jpeg, flac, mp3
+
+def measure_header_parsing(iterations):
+    """Time and peak allocation per file of the stream parsers versus the mapped header parsers."""
+    import tracemalloc
+    import exifread
+    from mutagen.flac import FLAC
+    from mutagen.id3 import ID3
+    import media_stats
+    from media_headers import map_file, parse_exif, flac_streaminfo, read_id3_text
+
+    def exif_stream(path):
+        with media_stats.open_counted(path) as f:
+            return exifread.process_file(f, details=False)
+
+    def exif_mapped(path):
+        with map_file(path) as buf:
+            return parse_exif(buf)
+
+    def flac_mapped(path):
+        with map_file(path) as buf:
+            return flac_streaminfo(buf)
+
+    def id3_mapped(path):
+        with map_file(path) as buf:
+            return read_id3_text(buf)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        jpeg, flac, mp3 = _header_samples(directory)
+        cases = [
+            ('exif', jpeg, 'exifread', exif_stream, 'mapped', exif_mapped),
+            ('flac streaminfo', flac, 'mutagen', lambda path: FLAC(path).info, 'mapped', flac_mapped),
+            ('id3 text', mp3, 'mutagen', ID3, 'mapped', id3_mapped),
+        ]
+        for kind, path, *parsers in cases:
+            for name, parse in zip(parsers[::2], parsers[1::2]):
+                parse(path)
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    parse(path)
+                seconds = (time.perf_counter() - started) / iterations
+
+                tracemalloc.start()
+                parse(path)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results.append((kind, name, seconds, peak))
+    return results
+
+def print_header_parsing(results):
+    print(f"\n{'header':16} {'parser':10} {'us/file':>10} {'peak KB/file':>13}")
+    for kind, name, seconds, peak in results:
+        print(f"{kind:16} {name:10} {seconds * 1e6:>10.1f} {peak / 1024:>13.1f}")
+
+# The bounded reader as first written (64 KiB head, tail and blocks) and as it is now
+FETCH_CONFIGS = [
+    ('64 KiB fixed', {'head': 64 * 1024, 'tail': 64 * 1024, 'align': 64 * 1024}),
+    ('16 KiB growing', {}),
+]
+
+def _fetch_samples(directory, payload_mb=4):
+    """Camera-sized files: JPEGs, MP3, FLAC and an M4A with its moov after the audio."""
+    from mutagen.id3 import ID3, APIC
+
+    payload = b'\x00' * (payload_mb * 1024 * 1024)
+    samples = []
+    jpeg = os.path.join(directory, 'photo.jpg')
+    _write_jpeg(jpeg, datetime(2021, 6, 1, 12, 0, 0), (47.5, 8.5))
+    with open(jpeg, 'ab') as f:
+        f.write(payload)
+    samples += [('jpeg exifread', jpeg), ('jpeg PIL', jpeg)]
+
+    mp3 = os.path.join(directory, 'track.mp3')
+    with open(mp3, 'wb') as f:
+        f.write((b'\xff\xfb\x90\x64' + b'\x00' * 413) * (len(payload) // 417))
+    _tag_audio(mp3, 'Artist', 'Album', 'Title', 1, 1)
+    samples.append(('mp3', mp3))
+    art = os.path.join(directory, 'cover.mp3')
+    shutil.copy(mp3, art)
+    tags = ID3(art)
+    tags.add(APIC(encoding=3, mime='image/jpeg', type=3, data=b'\xff' * 300000))
+    tags.save(art)
+    samples.append(('mp3 with cover', art))
+
+    flac = os.path.join(directory, 'track.flac')
+    _minimal_flac(flac)
+    _tag_audio(flac, 'Artist', 'Album', 'Title', 1, 1)
+    with open(flac, 'ab') as f:
+        f.write(payload)
+    samples.append(('flac', flac))
+
+    m4a = os.path.join(directory, 'track.m4a')
+    _minimal_mp4(m4a, b'soun', b'M4A ', datetime(2021, 6, 1))
+    _tag_audio(m4a, 'Artist', 'Album', 'Title', 1, 1)
+    with open(m4a, 'rb') as f:
+        data = f.read()
+    ftyp_end = struct.unpack('>I', data[:4])[0]
+    moov_end = ftyp_end + struct.unpack('>I', data[ftyp_end:ftyp_end + 4])[0]
+    # Streaming encoders write the moov last, behind the audio
+    with open(m4a, 'wb') as f:
+        f.write(data[:ftyp_end] + _box(b'mdat', payload) + data[ftyp_end:moov_end])
+    samples.append(('m4a moov last', m4a))
+    return samples
+
+def measure_fetch():
+    """Bytes and reads each bounded reader configuration fetches per file, with the parsers the tools use."""
+    import exifread
+    from PIL import Image
+    from bounded_io import BoundedReader
+    from audio_tags import READERS
+
+    def parse(kind, path, f):
+        if kind == 'jpeg exifread':
+            return exifread.process_file(f, details=False)
+        if kind == 'jpeg PIL':
+            with Image.open(f) as img:
+                return img._getexif()
+        return READERS[os.path.splitext(path)[1]](path, f)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for kind, path in _fetch_samples(directory):
+            row = [kind, os.path.getsize(path)]
+            for _, config in FETCH_CONFIGS:
+                with BoundedReader(path, **config) as f:
+                    if parse(kind, path, f) is None:
+                        raise RuntimeError(f"{kind}: nothing parsed")
+                    row.append((f._fetched, f._fetches))
+            results.append(row)
+    return results
+
+def print_fetch(results):
+    (old, _), (new, _) = FETCH_CONFIGS
+    print(f"\n{'file':16} {'size KB':>9} {old + ' KB':>18} {'reads':>6} {new + ' KB':>20} {'reads':>6}")
+    for kind, size, (old_bytes, old_reads), (new_bytes, new_reads) in results:
+        print(f"{kind:16} {size / 1024:>9.0f} {old_bytes / 1024:>18.1f} {old_reads:>6} "
+              f"{new_bytes / 1024:>20.1f} {new_reads:>6}")
+    old_total = sum(row[2][0] for row in results)
+    new_total = sum(row[3][0] for row in results)
+    print(f"\nmean fetched per file: {old_total / len(results) / 1024:.1f} KB -> {new_total / len(results) / 1024:.1f} KB")
+
+def _startup_ms(command, repeats):
+    """Median wall time in ms of 'mediatools.py <command> --help' (a bare interpreter when command is None)."""
+    cmd = [sys.executable, '-c', 'pass'] if command is None else [sys.executable, os.path.join(HERE, 'mediatools.py'), command, '--help']
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=HERE, check=True)
+        times.append((time.perf_counter() - started) * 1000)
+    return sorted(times)[len(times) // 2]
+
+def _slowest_import(command):
+    """(module, cumulative ms) of the slowest top-level import reported by -X importtime."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(HERE, 'mediatools.py'), command, '--help'],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, cwd=HERE)
+    slowest = ('-', 0.0)
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented; only top-level ones are charged to the command
+        if not name.startswith('  ') and int(cumulative) / 1000 > slowest[1]:
+            slowest = (name.strip(), int(cumulative) / 1000)
+    return slowest
+
+def measure_startup(commands, repeats):
+    """Startup cost of each mediatools subcommand over a bare interpreter, in ms."""
+    baseline = _startup_ms(None, repeats)
+    results = []
+    for command in commands:
+        total = _startup_ms(command, repeats)
+        results.append((command, total, total - baseline) + _slowest_import(command))
+    return baseline, results
+
+def print_startup(baseline, results, budget_ms):
+    """Print the startup table; returns the commands over budget."""
+    print(f"\nbare interpreter: {baseline:.0f} ms")
+    print(f"{'command':15} {'total ms':>9} {'over python':>12}  slowest import")
+    over = []
+    for command, total, extra, module, module_ms in results:
+        flag = ''
+        if budget_ms is not None and extra > budget_ms:
+            over.append(command)
+            flag = '  OVER BUDGET'
+        print(f"{command:15} {total:>9.0f} {extra:>12.0f}  {module} ({module_ms:.0f} ms){flag}")
+    return over
+
+def _synthetic_places(path, count, seed=1234):
+    """Write a GeoNames-style cities file with count random places."""
+    import math
+
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            lat = math.degrees(math.asin(rng.uniform(-1, 1)))
+            f.write(f"{i}\tPlace {i}\tPlace {i}\t\t{lat:.5f}\t{rng.uniform(-180, 180):.5f}\tP\tPPL"
+                    f"\tC{i % 250}\t\t{i % 40}\t\t\t\t0\t\t0\tUTC\t2024-01-01\n")
+
+def measure_geocoding(places, rows, check=2000, seed=1234):
+    """Load time, query throughput and a brute-force check of the offline reverse geocoder."""
+    import numpy as np
+    from reverse_geocoder import ReverseGeocoder, EARTH_RADIUS_KM
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cities.txt')
+        _synthetic_places(path, places, seed)
+        started = time.perf_counter()
+        geocoder = ReverseGeocoder.from_geonames(path)
+        results['load_seconds'] = time.perf_counter() - started
+
+    rng = np.random.default_rng(seed)
+    lats = np.degrees(np.arcsin(rng.uniform(-1, 1, rows)))
+    lons = rng.uniform(-180, 180, rows)
+    started = time.perf_counter()
+    found, km = geocoder.query(lats, lons)
+    results['query_seconds'] = time.perf_counter() - started
+    results['rows_per_second'] = rows / results['query_seconds']
+
+    # Brute-force haversine over every place for a sample of the rows
+    place_lat = np.arcsin(geocoder.tree.data[:, 2].clip(-1, 1))
+    place_lon = np.arctan2(geocoder.tree.data[:, 1], geocoder.tree.data[:, 0])
+    mismatches = 0
+    for i in range(min(check, rows)):
+        lat, lon = np.radians(lats[i]), np.radians(lons[i])
+        h = (np.sin((place_lat - lat) / 2) ** 2
+             + np.cos(lat) * np.cos(place_lat) * np.sin((place_lon - lon) / 2) ** 2)
+        best = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h.min()))
+        mismatches += abs(best - km[i]) > 1e-6
+    results['checked'] = min(check, rows)
+    results['mismatches'] = int(mismatches)
+    return results
+
+def print_geocoding(places, rows, results):
+    print(f"\n{places} places loaded in {results['load_seconds']:.2f}s")
+    print(f"{rows} rows looked up in {results['query_seconds']:.2f}s ({results['rows_per_second']:.0f} rows/s)")
+    print(f"brute-force check: {results['mismatches']} of {results['checked']} nearest places differ")
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                              capture_output=True, text=True).stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+def print_table(results):
+    print(f"\n{'tool':28} {'size':>7} {'files':>7} {'seconds':>9} {'files/s':>10} {'peak RSS MB':>12}")
+    for size, tools in sorted(results.items(), key=lambda item: int(item[0])):
+        for tool, r in tools.items():
+            if 'error' in r:
+                print(f"{tool:28} {size:>7} {'error: ' + r['error']}")
+            else:
+                print(f"{tool:28} {size:>7} {r['files']:>7} {r['seconds']:>9.2f} "
+                      f"{r['files_per_second']:>10.1f} {r['peak_rss_mb']:>12.1f}")
+
+def compare(old_path, new_path):
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    print(f"{'tool':28} {'size':>7} {'files/s ' + old['revision']:>18} {'files/s ' + new['revision']:>18} "
+          f"{'speedup':>8} {'RSS delta MB':>13}")
+    for size, tools in sorted(new['results'].items(), key=lambda item: int(item[0])):
+        for tool, r in tools.items():
+            before = old['results'].get(size, {}).get(tool)
+            if not before or 'error' in before or 'error' in r:
+                continue
+            speedup = r['files_per_second'] / before['files_per_second'] if before['files_per_second'] else 0.0
+            print(f"{tool:28} {size:>7} {before['files_per_second']:>18.1f} {r['files_per_second']:>18.1f} "
+                  f"{speedup:>7.2f}x {r['peak_rss_mb'] - before['peak_rss_mb']:>+13.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mediatools scripts on synthetic corpora.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Generate corpora (cached) and time every tool')
+    run_parser.add_argument("--sizes", default="1000,5000", help="Comma-separated corpus sizes")
+    run_parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "mediatools-bench"),
+                            help="Where generated corpora are cached")
+    run_parser.add_argument("--tools", default=",".join(TOOLS), help="Comma-separated tools to time")
+    run_parser.add_argument("--save", help="Write results as JSON for later comparison")
+
+    corpus_parser = subparsers.add_parser('corpus', help='Only generate a corpus')
+    corpus_parser.add_argument("directory", help="Output directory")
+    corpus_parser.add_argument("--size", type=int, default=1000, help="Approximate number of files")
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two saved result files')
+    compare_parser.add_argument("old", help="Baseline results JSON")
+    compare_parser.add_argument("new", help="New results JSON")
+
+    memory_parser = subparsers.add_parser('memory', help='Compare the memory used by in-memory scan results')
+    memory_parser.add_argument("--rows", type=int, default=200000, help="Number of synthetic scan results")
+
+    headers_parser = subparsers.add_parser('headers', help='Compare stream and memory-mapped header parsers')
+    headers_parser.add_argument("--iterations", type=int, default=2000, help="Parses per file and parser")
+
+    subparsers.add_parser('fetch', help='Compare the bytes fetched per file by the bounded reader configurations')
+
+    startup_parser = subparsers.add_parser('startup', help='Time "mediatools.py <command> --help" for every subcommand')
+    startup_parser.add_argument("--commands", default=",".join(COMMANDS), help="Comma-separated subcommands to time")
+    startup_parser.add_argument("--repeats", type=int, default=5, help="Runs per command (the median is reported)")
+    startup_parser.add_argument("--budget-ms", type=float, default=250,
+                                help="Fail when a command needs more than this over a bare interpreter (0 to disable)")
+
+    geocode_parser = subparsers.add_parser('geocode', help='Time the offline reverse geocoder on synthetic places')
+    geocode_parser.add_argument("--places", type=int, default=200000, help="Number of synthetic places")
+    geocode_parser.add_argument("--rows", type=int, default=1000000, help="Number of coordinates to look up")
+
+    one_parser = subparsers.add_parser('run-one', help=argparse.SUPPRESS)
+    one_parser.add_argument("tool", choices=TOOLS)
+    one_parser.add_argument("corpus")
+    one_parser.add_argument("workdir")
+
+    args = parser.parse_args()
+
+    if args.command == 'run-one':
+        run_one(args.tool, args.corpus, args.workdir)
+    elif args.command == 'corpus':
+        generate_corpus(args.directory, args.size)
+        print(f"Corpus written to {args.directory}")
+    elif args.command == 'compare':
+        compare(args.old, args.new)
+    elif args.command == 'memory':
+        print_memory(args.rows, measure_scan_memory(args.rows))
+    elif args.command == 'headers':
+        print_header_parsing(measure_header_parsing(args.iterations))
+    elif args.command == 'fetch':
+        print_fetch(measure_fetch())
+    elif args.command == 'geocode':
+        print_geocoding(args.places, args.rows, measure_geocoding(args.places, args.rows))
+    elif args.command == 'startup':
+        commands = [c for c in args.commands.split(',') if c]
+        unknown = set(commands) - set(COMMANDS)
+        if unknown:
+            parser.error(f"unknown commands: {', '.join(sorted(unknown))}")
+        over = print_startup(*measure_startup(commands, args.repeats), args.budget_ms or None)
+        if over:
+            print(f"\nOver the {args.budget_ms:.0f} ms startup budget: {', '.join(over)}")
+            sys.exit(1)
+    elif args.command == 'run':
+        tools = [t for t in args.tools.split(',') if t]
+        unknown = set(tools) - set(TOOLS)
+        if unknown:
+            parser.error(f"unknown tools: {', '.join(sorted(unknown))}")
+
+        results = {}
+        for size in (int(s) for s in args.sizes.split(',')):
+            corpus, _ = ensure_corpus(args.corpus_dir, size)
+            results[str(size)] = {}
+            for tool in tools:
+                print(f"Timing {tool} on {size} files...")
+                results[str(size)][tool] = measure(tool, corpus)
+        print_table(results)
+
+        if args.save:
+            with open(args.save, 'w', encoding='utf-8') as f:
+                json.dump({'revision': git_revision(), 'python': platform.python_version(),
+                           'results': results}, f, indent=2)
+            print(f"\nResults saved to {args.save}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import io
+import os
+
+import media_stats
+
+# Reads start and end on ALIGN boundaries (the page size, a multiple of SMB/NFS blocks).
+# Most headers fit in the first 16 KiB; a parser that wants more makes the head grow.
+ALIGN = 4 * 1024
+HEAD_SIZE = 16 * 1024
+TAIL_SIZE = 16 * 1024
+MIN_READ = 16 * 1024
+
+class BoundedReader(io.RawIOBase):
+    """Read-only file object that serves metadata parsers from a few aligned reads.
+
+    A small head of the file is fetched when it is opened, and the tail
+    (ID3v1, APE tags, an MP4 moov written last) the first time a parser looks
+    there. A parser reading on past the head makes it grow, at least doubling
+    each time, so a large ID3 tag or EXIF block costs a few reads and a plain
+    JPEG header only one small one. Anything further in is fetched as an
+    aligned window around the requested range, which also doubles while a
+    parser keeps reading on from it. The bytes and reads actually fetched
+    are charged to media_stats when the file is closed.
+    """
+
+    def __init__(self, path, head=HEAD_SIZE, tail=TAIL_SIZE, align=ALIGN):
+        super().__init__()
+        self.name = os.fspath(path)
+        self._raw = io.FileIO(self.name, 'rb')
+        self.size = os.fstat(self._raw.fileno()).st_size
+        self._pos = 0
+        self._align = align
+        self._tail_size = tail
+        self._fetched = 0
+        self._fetches = 0
+        self._head = self._fetch(0, min(self.size, self._align_up(head)))
+        self._tail = None
+        self._window = None
+        self._tail_loaded = self.size <= len(self._head)
+
+    def _align_down(self, n):
+        return n // self._align * self._align
+
+    def _align_up(self, n):
+        return -(-n // self._align) * self._align
+
+    def _fetch(self, start, length):
+        self._raw.seek(start)
+        data = self._raw.read(length) or b''
+        self._fetched += len(data)
+        self._fetches += 1
+        return data
+
+    def _segment_for(self, pos):
+        if pos < len(self._head):
+            return 0, self._head
+        for segment in (self._tail, self._window):
+            if segment is not None and segment[0] <= pos < segment[0] + len(segment[1]):
+                return segment
+        return None
+
+    def _load(self, pos, length):
+        """Fetch the tail, more of the head or an aligned window covering pos; returns its segment."""
+        head_end = len(self._head)
+        end = min(self.size, self._align_up(pos + length))
+        if not self._tail_loaded and pos >= self.size - self._tail_size:
+            start = max(head_end, self._align_down(self.size - self._tail_size))
+            self._tail = (start, self._fetch(start, self.size - start))
+            self._tail_loaded = True
+            return self._tail
+        if pos < 2 * head_end:
+            new_end = min(self.size, max(2 * head_end, end))
+            if self._tail is not None and pos < self._tail[0]:
+                new_end = min(new_end, self._tail[0])
+            self._head += self._fetch(head_end, new_end - head_end)
+            return 0, self._head
+        start = self._align_down(pos)
+        size = max(end - start, MIN_READ)
+        if self._window is not None and start == self._window[0] + len(self._window[1]):
+            size = max(size, 2 * len(self._window[1]))
+        self._window = (start, self._fetch(start, min(size, self.size - start)))
+        return self._window
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._pos = offset
+        return self._pos
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        wanted = min(len(view), max(self.size - self._pos, 0))
+        filled = 0
+        while filled < wanted:
+            pos = self._pos + filled
+            segment = self._segment_for(pos) or self._load(pos, wanted - filled)
+            start, data = segment
+            chunk = data[pos - start:pos - start + wanted - filled]
+            if not chunk:
+                break
+            view[filled:filled + len(chunk)] = chunk
+            filled += len(chunk)
+        self._pos += filled
+        return filled
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+            media_stats.add_file_fetch(self._fetched, self._fetches)
+        super().close()
+
+def open_bounded(path, head=HEAD_SIZE, tail=TAIL_SIZE):
+    """Open a file for metadata parsing with a small head read that grows on demand, and a tail read if needed."""
+    return BoundedReader(path, head=head, tail=tail)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Find MKV/MP4 files carrying Dolby Atmos, as TrueHD Atmos or E-AC3 JOC
+(replaces Check_Atmos.ps1).
+
+Audio stream descriptors come from one ffprobe JSON call per file,
+files are probed concurrently, and the results are cached in the media
+catalog so later runs only probe new or changed files. --report lists the
+cached results without probing anything.
+
+Usage:
+    python check_atmos.py "library_directory" --csv atmos.csv
+    python check_atmos.py "library_directory" --report --only truehd
+"""
+
+import os
+import csv
+import json
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import media_stats
+from media_catalog import open_catalog, load_results, store_results
+from check_videos_for_transcoding import find_videos
+
+TOOL_NAME = 'atmos'
+ATMOS_EXTENSIONS = ('.mkv', '.mp4')
+LABELS = {'truehd': 'TrueHD Atmos', 'eac3': 'E-AC3 Atmos'}
+
+def probe_audio_streams(file_path):
+    """Return the audio streams reported by a single ffprobe call, or None if it failed."""
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'a',
+        '-show_entries', 'stream=index,codec_name,profile,channels:stream_tags=title,language',
+        '-of', 'json', file_path
+    ]
+    with media_stats.stage('metadata'):
+        result = media_stats.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    if result.returncode != 0:
+        return None
+    try:
+        return json.loads(result.stdout or '{}').get('streams', [])
+    except json.JSONDecodeError:
+        return None
+
+def atmos_kind(stream):
+    """'truehd' or 'eac3' when the stream carries Atmos, otherwise None."""
+    codec = stream.get('codec_name', '')
+    # Recent ffprobe reports Atmos in the profile ("Dolby TrueHD + Dolby Atmos");
+    # remuxed files often only say so in the track title
+    text = ' '.join([stream.get('profile', ''), stream.get('tags', {}).get('title', '')])
+    if codec == 'truehd' and 'Atmos' in text:
+        return 'truehd'
+    if codec == 'eac3' and ('JOC' in text or 'Atmos' in text):
+        return 'eac3'
+    return None
+
+def check_file(job):
+    """Worker: probe one file and return (path, size, mtime_ns, result)."""
+    path, size, mtime_ns = job
+    streams = probe_audio_streams(path)
+    if streams is None:
+        return path, size, mtime_ns, {'error': 'ffprobe failed'}
+    tracks = []
+    for stream in streams:
+        kind = atmos_kind(stream)
+        if kind:
+            tracks.append({
+                'index': stream.get('index'),
+                'kind': kind,
+                'channels': stream.get('channels'),
+                'language': stream.get('tags', {}).get('language', ''),
+            })
+    return path, size, mtime_ns, {'atmos': sorted({t['kind'] for t in tracks}), 'tracks': tracks}
+
+def scan_library(conn, library_path, workers=4, recheck=False):
+    """Probe new or changed files and return the cached results for the whole library."""
+    cached = {} if recheck else load_results(conn, TOOL_NAME, library_path)
+    # Failures cached by older versions are probed again
+    cached = {path: entry for path, entry in cached.items() if 'error' not in entry[2]}
+    files = list(find_videos(library_path, ATMOS_EXTENSIONS))
+    jobs = [job for job in files if cached.get(job[0], (None, None))[:2] != job[1:]]
+    print(f"Found {len(files)} files, {len(files) - len(jobs)} unchanged since the last scan")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        batch = []
+        for path, size, mtime_ns, result in executor.map(check_file, jobs):
+            if 'error' in result:
+                # Not cached, so the file is probed again on the next scan
+                print(f"Could not probe: {path}")
+                failed += 1
+                continue
+            batch.append((path, size, mtime_ns, result))
+            if len(batch) >= 100:
+                store_results(conn, TOOL_NAME, batch)
+                batch = []
+        store_results(conn, TOOL_NAME, batch)
+
+    if failed:
+        print(f"{failed} files could not be probed and will be retried on the next scan")
+
+    # Only report files that still exist, from a result for their current version
+    present = {path: (size, mtime_ns) for path, size, mtime_ns in files}
+    return {path: row for path, row in load_results(conn, TOOL_NAME, library_path).items()
+            if present.get(path) == row[:2] and 'error' not in row[2]}
+
+def print_report(results, only=None, csv_path=None):
+    rows = []
+    for path in sorted(results):
+        result = results[path][2]
+        for kind in result.get('atmos', ()):
+            if only is None or kind == only:
+                rows.append((path, kind))
+                print(f"{path} contains {LABELS[kind]}")
+
+    if csv_path:
+        with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['path', 'atmos'])
+            writer.writerows((path, LABELS[kind]) for path, kind in rows)
+        print(f"\nResults written to {csv_path}")
+
+    truehd = sum(1 for _, kind in rows if kind == 'truehd')
+    print(f"\n{len(results)} files checked: {truehd} with TrueHD Atmos, {len(rows) - truehd} with E-AC3 Atmos")
+
+def main():
+    parser = argparse.ArgumentParser(description="Find MKV/MP4 files with Dolby Atmos audio.")
+    parser.add_argument("directory", nargs="?", default=".", help="Media library path")
+    parser.add_argument("--db", default="media_catalog.db", help="Media catalog database holding the scan cache")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel ffprobe processes")
+    parser.add_argument("--recheck", action="store_true", help="Ignore cached results and probe every file")
+    parser.add_argument("--report", action="store_true", help="Only list cached results, without probing")
+    parser.add_argument("--only", choices=sorted(LABELS), help="Only list one kind of Atmos track")
+    parser.add_argument("--csv", help="Write the Atmos files to a CSV file")
+    media_stats.add_arguments(parser)
+    args = parser.parse_args()
+    media_stats.configure(args)
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: Directory not found - {args.directory}")
+        return
+
+    conn = open_catalog(args.db)
+    if args.report:
+        results = load_results(conn, TOOL_NAME, args.directory)
+    elif shutil.which('ffprobe') is None:
+        print("Error: ffprobe not found on PATH")
+        conn.close()
+        return
+    else:
+        print("Checking for files with Dolby Atmos (TrueHD Atmos or E-AC3 Atmos)...")
+        results = scan_library(conn, args.directory, workers=args.workers, recheck=args.recheck)
+    conn.close()
+
+    print_report(results, only=args.only, csv_path=args.csv)
+    media_stats.report(args)
+
+if __name__ == "__main__":
+    main()
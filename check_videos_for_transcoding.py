@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Find videos that will need transcoding on common players (Python port of
+Check-VideosForTranscoding-v3.ps1).
+
+Each video is probed once with ffprobe's JSON output instead of once per
+property, probes run in a bounded worker pool, and unchanged files (same
+size and mtime) are skipped using the results cached in the media catalog.
+
+Usage:
+    python check_videos_for_transcoding.py "library_directory" --log transcoding_needed.log
+"""
+
+import os
+import json
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import media_stats
+from media_catalog import open_catalog, load_results, store_results
+
+TOOL_NAME = 'transcoding'
+VIDEO_EXTENSIONS = ('.mkv', '.mp4', '.avi', '.mov')
+SUPPORTED_CODECS = {'h264', 'hevc', 'mpeg4', 'mpeg2video', 'vp9'}
+MAX_H264_LEVEL = 5.2
+BAD_DV_PROFILES = {4, 5, 7}
+
+def probe_video(file_path):
+    """Return the first video stream as reported by a single ffprobe call, or None."""
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_streams', '-of', 'json', file_path
+    ]
+    with media_stats.stage('metadata'):
+        result = media_stats.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        streams = json.loads(result.stdout or '{}').get('streams', [])
+    except json.JSONDecodeError:
+        return None
+    return streams[0] if streams else None
+
+def media_info(stream):
+    """Reduce an ffprobe stream to the properties the compatibility check needs."""
+    codec = stream.get('codec_name', 'N/A')
+    pix_fmt = stream.get('pix_fmt', 'N/A')
+
+    bit_depth = stream.get('bits_per_raw_sample')
+    if not bit_depth:
+        # Fallback bit depth detection
+        if '10le' in pix_fmt or '10be' in pix_fmt:
+            bit_depth = '10'
+        elif pix_fmt.startswith('yuv'):
+            bit_depth = '8'
+        else:
+            bit_depth = 'N/A'
+
+    # ffprobe reports H.264 levels as integers (51 means 5.1)
+    level = stream.get('level')
+    level = level / 10 if codec == 'h264' and isinstance(level, int) and level > 0 else None
+
+    dv_profile = None
+    for side_data in stream.get('side_data_list', []):
+        if 'dv_profile' in side_data:
+            dv_profile = side_data['dv_profile']
+        elif 'dolby_vision_profile' in side_data:
+            dv_profile = side_data['dolby_vision_profile']
+
+    return {
+        'codec': codec,
+        'bit_depth': str(bit_depth),
+        'chroma': pix_fmt,
+        'level': level,
+        'dv_profile': dv_profile,
+    }
+
+def transcoding_reasons(info):
+    """Every reason the video would need transcoding; empty when it plays as is."""
+    reasons = []
+    if info['codec'] not in SUPPORTED_CODECS:
+        reasons.append('unsupported codec')
+    if info['codec'] == 'h264' and info['bit_depth'] == '10':
+        reasons.append('10-bit H.264')
+    if info['level'] is not None and info['level'] > MAX_H264_LEVEL:
+        reasons.append('H.264 level above 5.2')
+    if '422' in info['chroma']:
+        reasons.append('4:2:2 chroma')
+    if info['dv_profile'] is not None and int(info['dv_profile']) in BAD_DV_PROFILES:
+        reasons.append('incompatible Dolby Vision profile')
+    return reasons
+
+def check_video(job):
+    """Worker: probe one file and return (path, size, mtime_ns, result)."""
+    path, size, mtime_ns = job
+    stream = probe_video(path)
+    if stream is None:
+        return path, size, mtime_ns, {'error': 'no video stream'}
+    info = media_info(stream)
+    info['reasons'] = transcoding_reasons(info)
+    return path, size, mtime_ns, info
+
+def format_result(path, info):
+    level = f"{info['level']:.1f}" if info['level'] is not None else 'N/A'
+    dv_profile = info['dv_profile'] if info['dv_profile'] is not None else 'N/A'
+    return (f"Unsupported: Codec={info['codec']}, BitDepth={info['bit_depth']}, Chroma={info['chroma']}, "
+            f"Level={level}, DVProfile={dv_profile} ({'; '.join(info['reasons'])}) -> {path}")
+
+def find_videos(library_path, extensions=VIDEO_EXTENSIONS):
+    """Yield (path, size, mtime_ns) for every video below library_path."""
+    for root, _, files in media_stats.walk(os.path.abspath(library_path)):
+        for file in files:
+            if file.lower().endswith(extensions):
+                path = os.path.join(root, file)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime_ns
+
+def scan_library(library_path, catalog_path, log_path, workers=4, recheck=False):
+    conn = open_catalog(catalog_path)
+    cached = {} if recheck else load_results(conn, TOOL_NAME, library_path)
+    # Failures cached by older versions are probed again
+    cached = {path: entry for path, entry in cached.items() if 'error' not in entry[2]}
+
+    videos = list(find_videos(library_path))
+    jobs = [job for job in videos if cached.get(job[0], (None, None))[:2] != job[1:]]
+    print(f"Found {len(videos)} videos, {len(videos) - len(jobs)} unchanged since the last scan")
+
+    needing = 0
+    completed = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor, open(log_path, 'a', encoding='utf-8') as log:
+        batch = []
+        for path, size, mtime_ns, info in executor.map(check_video, jobs):
+            completed += 1
+            if 'error' in info:
+                # Not cached, so the file is probed again on the next scan
+                print(f"Could not probe: {path}")
+                failed += 1
+                continue
+            if info['reasons']:
+                needing += 1
+                message = format_result(path, info)
+                print(message)
+                log.write(message + '\n')
+            batch.append((path, size, mtime_ns, info))
+            if len(batch) >= 100:
+                store_results(conn, TOOL_NAME, batch)
+                batch = []
+                print(f"Processed {completed} of {len(jobs)} files")
+        store_results(conn, TOOL_NAME, batch)
+
+    conn.close()
+    if failed:
+        print(f"{failed} files could not be probed and will be retried on the next scan")
+    print(f"Scan completed. {needing} of {len(jobs)} checked files need transcoding. Results logged to {log_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Find videos that need transcoding.")
+    parser.add_argument("directory", nargs="?", default=".", help="Media library path")
+    parser.add_argument("--db", default="media_catalog.db", help="Media catalog database holding the scan cache")
+    parser.add_argument("--log", default="transcoding_needed.log", help="Log of files that need transcoding")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel ffprobe processes (4-8 recommended)")
+    parser.add_argument("--recheck", action="store_true", help="Ignore cached results and probe every file")
+    media_stats.add_arguments(parser)
+    args = parser.parse_args()
+    media_stats.configure(args)
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: Directory not found - {args.directory}")
+        return
+    if shutil.which('ffprobe') is None:
+        print("Error: ffprobe not found on PATH")
+        return
+
+    scan_library(args.directory, args.db, args.log, workers=args.workers, recheck=args.recheck)
+    media_stats.report(args)
+
+if __name__ == "__main__":
+    main()
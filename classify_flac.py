@@ -1,38 +1,39 @@
 import os
-import subprocess
 import argparse
 from collections import defaultdict
+import media_stats
+from media_headers import map_file, flac_streaminfo
+from shards import parse_shard, path_in_shard, walk_shard, write_partial, read_partials
+
+SHARD_TOOL = 'classify_flac'
 
 def get_flac_info(file_path):
     """Extract bit depth, sample rate, and check for lossy artifacts."""
     try:
-        cmd = [
-            'ffprobe', '-v', 'error', '-select_streams', 'a:0',
-            '-show_entries', 'stream=bits_per_raw_sample,sample_rate',
-            '-of', 'default=noprint_wrappers=1:nokey=1', file_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        bits, sample_rate = result.stdout.strip().split('\n')[:2]
-        bits = int(bits) if bits.isdigit() else 16  # Default to 16-bit if missing
+        with media_stats.stage('metadata'), map_file(file_path) as buf:
+            sample_rate, _, bits, _ = flac_streaminfo(buf)
         
         # Simplified lossy check (replace with Spek/LosslessAudioChecker for accuracy)
         is_lossy = False
-        if int(sample_rate) >= 44100 and bits == 16:
+        if sample_rate >= 44100 and bits == 16:
             is_lossy = "Maybe (verify with Spek)"
         
         return {
             "file": file_path,
             "bit_depth": bits,
-            "sample_rate": sample_rate,
+            "sample_rate": str(sample_rate),
             "is_lossy": is_lossy,
         }
     except Exception as e:
         return {"file": file_path, "error": str(e)}
 
-def scan_directory(path):
-    """Scan for FLAC files and group by album directory."""
+def scan_directory(path, shard=None):
+    """Scan for FLAC files and group by album directory.
+
+    With shard=(i, N) only the top-level directories of that shard are scanned.
+    """
     albums = defaultdict(list)
-    for root, _, files in os.walk(path):
+    for root, _, files in walk_shard(path, shard):
         flac_files = [f for f in files if f.lower().endswith('.flac')]
         if flac_files:
             album_path = os.path.relpath(root, start=path)
@@ -41,6 +42,40 @@ def scan_directory(path):
                 albums[album_path].append(get_flac_info(full_path))
     return albums
 
+def scan_catalog(catalog_path, path, shard=None):
+    """Group catalogued FLAC stream info by album directory instead of probing files."""
+    from media_catalog import open_catalog, query_streams
+
+    albums = defaultdict(list)
+    conn = open_catalog(catalog_path)
+    try:
+        for file_path, bits, sample_rate in query_streams(conn, path):
+            if not path_in_shard(file_path, path, shard):
+                continue
+            bits = bits or 16  # Default to 16-bit if missing
+            album_path = os.path.relpath(os.path.dirname(file_path), start=os.path.abspath(path))
+            albums[album_path].append({
+                "file": file_path,
+                "bit_depth": bits,
+                "sample_rate": str(sample_rate),
+                "is_lossy": "Maybe (verify with Spek)" if sample_rate >= 44100 and bits == 16 else False,
+            })
+    finally:
+        conn.close()
+    return albums
+
+def write_shard(albums, output_file, path, shard):
+    """Write one shard's per-track results for a later merge."""
+    records = ({'album': album, **track} for album, tracks in albums.items() for track in tracks)
+    return write_partial(output_file, SHARD_TOOL, path, shard, records)
+
+def merge_shards(shard_files):
+    """Regroup the per-track results of a complete set of shard files by album."""
+    albums = defaultdict(list)
+    for record in read_partials(shard_files, SHARD_TOOL):
+        albums[record.pop('album')].append(record)
+    return dict(sorted(albums.items()))
+
 def consolidate_album(album_tracks):
     """Check if all tracks in an album share the same metadata."""
     if not album_tracks:
@@ -85,9 +120,33 @@ def print_results(albums, output_format):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Classify FLAC files by album, consolidating identical metadata.")
-    parser.add_argument("directory", help="Directory to scan recursively")
+    parser.add_argument("directory", nargs="?", help="Directory to scan recursively")
     parser.add_argument("--format", choices=["list", "csv"], default="list", help="Output format (list or CSV)")
+    parser.add_argument("--catalog", help="Read stream info from a media catalog database instead of probing files")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N", help="Scan only shard i of N (by top-level directory)")
+    parser.add_argument("--shard-output", help="With --shard, write the track results here instead of printing albums")
+    parser.add_argument("--merge", nargs="+", metavar="SHARD_FILE", help="Roll up the albums of a complete set of shard files")
+    media_stats.add_arguments(parser)
     args = parser.parse_args()
+    media_stats.configure(args)
+
+    if args.merge:
+        try:
+            albums = merge_shards(args.merge)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    elif not args.directory:
+        parser.error("a directory is required unless --merge is given")
+    elif args.shard and not args.shard_output:
+        parser.error("--shard needs --shard-output")
+    elif args.catalog:
+        albums = scan_catalog(args.catalog, args.directory, args.shard)
+    else:
+        albums = scan_directory(args.directory, args.shard)
 
-    albums = scan_directory(args.directory)
-    print_results(albums, args.format)
\ No newline at end of file
+    if args.shard and not args.merge:
+        count = write_shard(albums, args.shard_output, args.directory, args.shard)
+        print(f"Shard file with {count} tracks saved to {args.shard_output}")
+    else:
+        print_results(albums, args.format)
+    media_stats.report(args)
\ No newline at end of file
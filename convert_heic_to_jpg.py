@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Convert HEIC photos to JPEG in parallel (replaces Convert-HeicToJpg.ps1).
+
+HEIC files are decoded with the pillow-heif plugin and written as JPEG at
+the chosen quality with their EXIF block (GPS, DateTimeOriginal, ...) and
+colour profile carried straight across. Conversions run in a process pool
+sized to the CPU count. A JPEG gets its HEIC's mtime, which is how a rerun
+recognises it as done; with --db each converted source is also recorded in
+the media catalog.
+
+Usage:
+    python convert_heic_to_jpg.py "C:/Photos" --quality 95
+    python convert_heic_to_jpg.py "/photos" --keep-originals --workers 8 --db media_catalog.db
+"""
+
+import os
+import stat
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import media_stats
+from media_catalog import open_catalog, load_results, store_results
+
+TOOL_NAME = 'heic_to_jpg'
+HEIC_EXTENSIONS = ('.heic', '.heif')
+EXIF_HEADER = b'Exif\x00\x00'
+
+def init_worker():
+    """Pool initializer: load Pillow and the HEIF plugin once per worker, not at import."""
+    from pillow_heif import register_heif_opener
+
+    media_stats.init_worker()
+    register_heif_opener()
+
+def convert_file(job):
+    """Worker: decode one HEIC and write it as JPEG. Returns (src, dst, error, stats)."""
+    from PIL import Image
+
+    src, dst, quality = job
+    temp_path = None
+    try:
+        with media_stats.stage('convert'), Image.open(src) as img:
+            exif = img.info.get('exif')
+            icc_profile = img.info.get('icc_profile')
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            save_args = {'quality': quality}
+            if exif:
+                # Pillow writes the APP1 payload as given, so it needs the Exif header
+                save_args['exif'] = exif if exif.startswith(EXIF_HEADER) else EXIF_HEADER + exif
+            if icc_profile:
+                save_args['icc_profile'] = icc_profile
+
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(dst), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as out:
+                img.save(out, 'JPEG', **save_args)
+
+        st = os.stat(src)
+        media_stats.add_bytes_read(st.st_size)
+        media_stats.add_bytes_written(os.path.getsize(temp_path))
+        # mkstemp creates the file owner-only; give the JPEG the HEIC's permissions
+        os.chmod(temp_path, stat.S_IMODE(st.st_mode))
+        os.utime(temp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(temp_path, dst)
+        return src, dst, None, media_stats.take()
+    except Exception as e:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return src, dst, str(e), media_stats.take()
+
+def output_path(src, mtime_ns, previous=None):
+    """JPEG path for src: its earlier conversion, or the next free name next to it.
+
+    A JPEG with the HEIC's mtime (convert_file copies it across) is an
+    earlier conversion of this file and is reused rather than creating _1,
+    _2... copies; previous is the JPEG the catalog recorded for it. Any other
+    existing JPEG belongs to another photo and is never overwritten.
+    """
+    if previous and os.path.exists(previous):
+        return previous
+    base = os.path.splitext(src)[0]
+    dst = base + '.jpg'
+    counter = 1
+    while os.path.exists(dst) and os.stat(dst).st_mtime_ns != mtime_ns:
+        dst = f"{base}_{counter}.jpg"
+        counter += 1
+    return dst
+
+def unique_path(path):
+    base, ext = os.path.splitext(path)
+    counter = 1
+    while os.path.exists(path):
+        path = f"{base}_{counter}{ext}"
+        counter += 1
+    return path
+
+def find_heic_files(target_dir, exclude_dir=None):
+    """Yield (path, size, mtime_ns) for every HEIC file, skipping the backup folder."""
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    for root, dirs, files in media_stats.walk(os.path.abspath(target_dir)):
+        if exclude_dir:
+            dirs[:] = [d for d in dirs if os.path.join(root, d) != exclude_dir]
+        for file in files:
+            if file.lower().endswith(HEIC_EXTENSIONS):
+                path = os.path.join(root, file)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime_ns
+
+def plan_conversions(target_dir, cached, backup_dir=None):
+    """Split the HEIC files into (path, size, mtime_ns, jpg) jobs and already-converted ones."""
+    jobs = []
+    skipped = 0
+    for path, size, mtime_ns in find_heic_files(target_dir, backup_dir):
+        entry = cached.get(path)
+        if entry and entry[:2] == (size, mtime_ns) and os.path.exists(entry[2]['jpg']):
+            skipped += 1
+            continue
+        jpg = os.path.splitext(path)[0] + '.jpg'
+        # Same rule as the PowerShell script: a JPEG at least as new as the HEIC means done
+        if os.path.exists(jpg) and os.stat(jpg).st_mtime_ns >= mtime_ns:
+            skipped += 1
+            continue
+        dst = output_path(path, mtime_ns, entry[2]['jpg'] if entry else None)
+        if os.path.exists(dst) and os.stat(dst).st_mtime_ns == mtime_ns:
+            skipped += 1
+            continue
+        jobs.append((path, size, mtime_ns, dst))
+    return jobs, skipped
+
+def convert_directory(target_dir, catalog_path=None, quality=95, workers=None, backup_dir=None):
+    conn = open_catalog(catalog_path) if catalog_path else None
+    cached = load_results(conn, TOOL_NAME, target_dir) if conn else {}
+    jobs, skipped = plan_conversions(target_dir, cached, backup_dir)
+    print(f"Found {len(jobs) + skipped} HEIC files: {len(jobs)} to convert, {skipped} already converted")
+    print(f"Using JPG quality: {quality}")
+    if backup_dir:
+        print(f"Backup location: {backup_dir}\n")
+
+    details = {path: (size, mtime_ns) for path, size, mtime_ns, _ in jobs}
+    tasks = [(path, dst, quality) for path, _, _, dst in jobs]
+    converted = failed = 0
+    batch = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        for src, dst, error, stats in executor.map(convert_file, tasks, chunksize=4):
+            media_stats.merge(stats)
+            if error:
+                failed += 1
+                media_stats.count('failed')
+                print(f"Failed to process {src}: {error}")
+                continue
+
+            converted += 1
+            media_stats.count('converted')
+            print(f"Converted: {src} -> {dst}")
+            if backup_dir:
+                backup = unique_path(os.path.join(backup_dir, os.path.relpath(src, target_dir)))
+                os.makedirs(os.path.dirname(backup), exist_ok=True)
+                shutil.move(src, backup)
+            elif conn:
+                size, mtime_ns = details[src]
+                batch.append((src, size, mtime_ns, {'jpg': dst}))
+                if len(batch) >= 100:
+                    store_results(conn, TOOL_NAME, batch)
+                    batch = []
+    if conn:
+        store_results(conn, TOOL_NAME, batch)
+        conn.close()
+
+    print("\nConversion summary:")
+    print(f"Processed: {converted} files")
+    print(f"Skipped: {skipped} files (already converted)")
+    print(f"Failed: {failed} files")
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert HEIC files to JPG, keeping their metadata.")
+    parser.add_argument("directory", help="Directory to search for HEIC files")
+    parser.add_argument("--quality", type=int, default=95, choices=range(1, 101), metavar="1-100", help="JPG quality")
+    parser.add_argument("--workers", type=int, default=None, help="Conversion processes (default: one per CPU)")
+    parser.add_argument("--backup-dir", help="Where to move converted originals (default: <directory>/heic_backup)")
+    parser.add_argument("--keep-originals", action="store_true", help="Leave the HEIC files in place")
+    parser.add_argument("--db", help="Media catalog database to record conversions in (default: none)")
+    media_stats.add_arguments(parser)
+    args = parser.parse_args()
+    media_stats.configure(args)
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: Directory not found - {args.directory}")
+        return
+
+    backup_dir = None
+    if not args.keep_originals:
+        backup_dir = os.path.abspath(args.backup_dir or os.path.join(args.directory, 'heic_backup'))
+
+    convert_directory(os.path.abspath(args.directory), args.db, quality=args.quality,
+                      workers=args.workers, backup_dir=backup_dir)
+    media_stats.report(args)
+
+if __name__ == "__main__":
+    main()
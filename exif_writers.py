@@ -0,0 +1,378 @@
+import os
+import zlib
+import shutil
+import struct
+import tempfile
+import subprocess
+
+# piexif is imported by the functions that use it, so importing the PNG/HEIC
+# writers or the ExifTool batch does not load it.
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+EXIF_HEADER = b'Exif\x00\x00'
+HEIF_BRANDS = {b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1', b'avif'}
+
+class UnsupportedLayout(Exception):
+    """The file is valid but its layout cannot be updated in place by the native writers."""
+
+def decimal_to_dms(decimal):
+    """Convert decimal degrees to EXIF-friendly degrees, minutes, seconds format."""
+    degrees = int(decimal)
+    remainder = abs(decimal - degrees) * 60
+    minutes = int(remainder)
+    seconds = (remainder - minutes) * 60
+    return ((degrees, 1), (minutes, 1), (int(seconds * 1000), 1000))
+
+def clean_exif_dict(exif_dict):
+    """Clean problematic tags from EXIF dictionary"""
+    if "Exif" in exif_dict and 41729 in exif_dict["Exif"]:
+        del exif_dict["Exif"][41729]
+    return exif_dict
+
+def set_gps(exif_dict, lat, lon):
+    """Replace the GPS IFD of a piexif dictionary."""
+    import piexif
+
+    exif_dict = clean_exif_dict(exif_dict)
+    exif_dict["GPS"] = {
+        piexif.GPSIFD.GPSLatitudeRef: 'N' if lat >= 0 else 'S',
+        piexif.GPSIFD.GPSLatitude: decimal_to_dms(abs(lat)),
+        piexif.GPSIFD.GPSLongitudeRef: 'E' if lon >= 0 else 'W',
+        piexif.GPSIFD.GPSLongitude: decimal_to_dms(abs(lon)),
+    }
+    return exif_dict
+
+def _load_or_new(data):
+    import piexif
+
+    try:
+        return piexif.load(data)
+    except Exception as e:
+        print(f"Creating new EXIF data: {str(e)}")
+        return {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}}
+
+def gps_exif(tiff, lat, lon):
+    """Existing TIFF-structured EXIF (or None) with its GPS IFD replaced; returns the new TIFF bytes."""
+    import piexif
+
+    exif_dict = _load_or_new(tiff) if tiff else {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}}
+    exif_dict = set_gps(exif_dict, lat, lon)
+    # The thumbnail IFD needs its image data, which piexif only keeps for JPEGs
+    if exif_dict.get("thumbnail") is None:
+        exif_dict["1st"] = {}
+    return piexif.dump(exif_dict)[len(EXIF_HEADER):]
+
+# --- JPEG --------------------------------------------------------------------
+
+def write_jpeg_gps(path, lat, lon):
+    """Set GPS in a JPEG's APP1 segment with piexif."""
+    import piexif
+
+    exif_dict = set_gps(_load_or_new(path), lat, lon)
+    piexif.insert(piexif.dump(exif_dict), path)
+
+# --- PNG ---------------------------------------------------------------------
+
+def _png_chunks(f):
+    """Yield (type, data) for each chunk of an open PNG positioned after the signature."""
+    while True:
+        header = f.read(8)
+        if not header:
+            return
+        if len(header) < 8:
+            raise ValueError("truncated PNG chunk header")
+        length, chunk_type = struct.unpack('>I4s', header)
+        data = f.read(length)
+        if len(data) < length or len(f.read(4)) < 4:
+            raise ValueError("truncated PNG chunk")
+        yield chunk_type, data
+        if chunk_type == b'IEND':
+            return
+
+def _png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+def write_png_gps(path, lat, lon):
+    """Set GPS in a PNG's eXIf chunk, placed before the image data as the spec requires."""
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError("not a PNG file")
+        chunks = list(_png_chunks(f))
+
+    old = next((data for chunk_type, data in chunks if chunk_type == b'eXIf'), None)
+    if old is not None and old.startswith(EXIF_HEADER):
+        old = old[len(EXIF_HEADER):]
+    exif = _png_chunk(b'eXIf', gps_exif(old, lat, lon))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(PNG_SIGNATURE)
+            for chunk_type, data in chunks:
+                if chunk_type == b'eXIf':
+                    continue
+                if chunk_type in (b'IDAT', b'IEND') and exif is not None:
+                    out.write(exif)
+                    exif = None
+                out.write(_png_chunk(chunk_type, data))
+        # mkstemp creates the file owner-only; keep the original's permissions
+        shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+# --- HEIC/HEIF ---------------------------------------------------------------
+
+def _boxes(data, start=0, end=None):
+    """Yield (type, payload_start, box_end) for the ISO BMFF boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError(f"malformed {box_type!r} box")
+        yield box_type, pos + header, pos + size
+        pos += size
+
+def _read_top_level(f):
+    """Return {type: (offset, size)} for the top-level boxes, the raw meta box bytes, the file size
+    and the offset of a last box whose size field is 0 ("to the end of the file"), or None.
+    """
+    boxes = {}
+    meta = None
+    open_ended = None
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        size, box_type = struct.unpack('>I4s', f.read(8))
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+        elif size == 0:
+            size = file_size - pos
+            open_ended = pos
+        if size < 8:
+            raise ValueError("malformed top-level box")
+        boxes.setdefault(box_type, (pos, size))
+        if box_type == b'meta':
+            f.seek(pos)
+            meta = f.read(size)
+        pos += size
+    return boxes, meta, file_size, open_ended
+
+def _uint(data, pos, size):
+    return int.from_bytes(data[pos:pos + size], 'big') if size else 0
+
+def _exif_item_id(meta, iinf_start, iinf_end):
+    version = meta[iinf_start]
+    pos = iinf_start + 4
+    pos += 2 if version == 0 else 4
+    for box_type, start, _ in _boxes(meta, pos, iinf_end):
+        if box_type != b'infe' or meta[start] < 2:
+            continue
+        id_size = 2 if meta[start] == 2 else 4
+        item_id = _uint(meta, start + 4, id_size)
+        item_type = meta[start + 4 + id_size + 2:start + 4 + id_size + 6]
+        if item_type == b'Exif':
+            return item_id
+    return None
+
+def _iloc_entry(meta, iloc_start, iloc_end, wanted):
+    """Locate the fields of one iloc item: returns a dict of (position, size) pairs within meta."""
+    version = meta[iloc_start]
+    pos = iloc_start + 4
+    offset_size, length_size = meta[pos] >> 4, meta[pos] & 0x0F
+    base_offset_size, index_size = meta[pos + 1] >> 4, meta[pos + 1] & 0x0F
+    if version == 0:
+        index_size = 0
+    pos += 2
+    id_size = 2 if version < 2 else 4
+    item_count = _uint(meta, pos, id_size)
+    pos += id_size
+
+    for _ in range(item_count):
+        item_id = _uint(meta, pos, id_size)
+        pos += id_size
+        construction_method = 0
+        if version in (1, 2):
+            construction_method = _uint(meta, pos, 2) & 0x0F
+            pos += 2
+        data_reference_index = _uint(meta, pos, 2)
+        pos += 2
+        base_offset = (pos, base_offset_size)
+        pos += base_offset_size
+        extent_count = _uint(meta, pos, 2)
+        pos += 2
+        extents = []
+        for _ in range(extent_count):
+            pos += index_size
+            extents.append(((pos, offset_size), (pos + offset_size, length_size)))
+            pos += offset_size + length_size
+        if pos > iloc_end:
+            raise ValueError("malformed iloc box")
+        if item_id == wanted:
+            return {
+                'construction_method': construction_method,
+                'data_reference_index': data_reference_index,
+                'base_offset': base_offset,
+                'extents': extents,
+            }
+    return None
+
+def write_heic_gps(path, lat, lon):
+    """Set GPS in a HEIC/HEIF file's Exif item.
+
+    The new Exif block is appended in its own mdat box and the item's iloc
+    extent is repointed at it, so no other offset in the file moves. Files
+    without an Exif item raise UnsupportedLayout.
+    """
+    with open(path, 'r+b') as f:
+        head = f.read(12)
+        if len(head) < 12 or head[4:8] != b'ftyp' or head[8:12] not in HEIF_BRANDS:
+            raise ValueError("not a HEIF file")
+        boxes, meta, file_size, open_ended = _read_top_level(f)
+        if meta is None:
+            raise ValueError("HEIF file without a meta box")
+
+        children = {box_type: (start, end) for box_type, start, end in _boxes(meta, 12)}
+        if b'iinf' not in children or b'iloc' not in children:
+            raise ValueError("HEIF meta box without iinf/iloc")
+        item_id = _exif_item_id(meta, *children[b'iinf'])
+        if item_id is None:
+            raise UnsupportedLayout("no Exif item to update")
+        entry = _iloc_entry(meta, *children[b'iloc'], item_id)
+        if entry is None or entry['construction_method'] != 0 or entry['data_reference_index'] != 0 \
+                or len(entry['extents']) != 1:
+            raise UnsupportedLayout("Exif item is not a single extent in this file")
+        (offset_pos, offset_size), (length_pos, length_size) = entry['extents'][0]
+        base_pos, base_size = entry['base_offset']
+
+        # Read the current Exif block: a 4-byte offset to the TIFF header, then the data
+        base = _uint(meta, base_pos, base_size)
+        f.seek(base + _uint(meta, offset_pos, offset_size))
+        payload = f.read(_uint(meta, length_pos, length_size))
+        tiff = None
+        if len(payload) >= 4:
+            skip = struct.unpack_from('>I', payload)[0]
+            tiff = payload[4 + skip:] or None
+
+        payload = struct.pack('>I', len(EXIF_HEADER)) + EXIF_HEADER + gps_exif(tiff, lat, lon)
+        data_start = file_size + 8
+        if base_size:
+            new_base, new_offset = data_start, 0
+        else:
+            new_base, new_offset = 0, data_start
+        if (offset_size == 0 and new_offset) or new_offset >= 1 << (8 * offset_size) \
+                or new_base >= 1 << (8 * max(base_size, 1)) or length_size == 0 \
+                or len(payload) >= 1 << (8 * length_size):
+            raise UnsupportedLayout("iloc fields too small for the new Exif location")
+        if open_ended is not None and file_size - open_ended >= 1 << 32:
+            raise UnsupportedLayout("last box runs to the end of the file and is too large to close")
+
+        meta_start = boxes[b'meta'][0]
+        if open_ended is not None:
+            # The appended mdat would land inside a box that extends to EOF; give it its real size first
+            f.seek(open_ended)
+            f.write(struct.pack('>I', file_size - open_ended))
+        f.seek(file_size)
+        f.write(struct.pack('>I4s', len(payload) + 8, b'mdat') + payload)
+        f.flush()
+        for pos, size, value in ((base_pos, base_size, new_base), (offset_pos, offset_size, new_offset),
+                                 (length_pos, length_size, len(payload))):
+            if size:
+                f.seek(meta_start + pos)
+                f.write(value.to_bytes(size, 'big'))
+
+def is_heif(path):
+    with open(path, 'rb') as f:
+        head = f.read(12)
+    return len(head) == 12 and head[4:8] == b'ftyp' and head[8:12] in HEIF_BRANDS
+
+# --- exiftool fallback -------------------------------------------------------
+
+class ExifToolBatch:
+    """One stay-open exiftool process that writes GPS for any format it supports.
+
+    Commands are queued with add() and sent in batches: every command of a
+    batch is written before any reply is read, and exiftool answers each
+    with a numbered {ready} marker.
+    """
+
+    def __init__(self, executable='exiftool', batch_size=50):
+        self.executable = executable
+        self.batch_size = batch_size
+        self.pending = []
+        self.results = {}
+        self.process = None
+        self._next_id = 0
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            [self.executable, '-stay_open', 'True', '-@', '-'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, encoding='utf-8', errors='replace')
+
+    def add(self, path, lat, lon):
+        """Queue a GPS write; results[path] is True/False once its batch has run."""
+        self.pending.append((path, lat, lon))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        if self.process is None:
+            try:
+                self._start()
+            except OSError as e:
+                print(f"Cannot start {self.executable}: {e}")
+                self.results.update((path, False) for path, _, _ in batch)
+                return
+
+        commands = []
+        for path, lat, lon in batch:
+            self._next_id += 1
+            commands.append((self._next_id, path))
+            args = [
+                '-overwrite_original', '-n',
+                f'-GPSLatitude={abs(lat)}', f"-GPSLatitudeRef={'N' if lat >= 0 else 'S'}",
+                f'-GPSLongitude={abs(lon)}', f"-GPSLongitudeRef={'E' if lon >= 0 else 'W'}",
+                path, f'-execute{self._next_id}',
+            ]
+            self.process.stdin.write('\n'.join(args) + '\n')
+        self.process.stdin.flush()
+
+        for command_id, path in commands:
+            marker = f'{{ready{command_id}}}'
+            output = []
+            for line in self.process.stdout:
+                if line.strip() == marker:
+                    break
+                output.append(line.strip())
+            else:
+                print("exiftool exited unexpectedly")
+                self.results.update((p, False) for _, p in commands if p not in self.results)
+                self.process = None
+                return
+            ok = any('image files updated' in line and not line.startswith('0') for line in output)
+            if not ok:
+                print(f"exiftool could not update {path}: {' '.join(output)}")
+            self.results[path] = ok
+
+    def close(self):
+        self.flush()
+        if self.process is not None:
+            self.process.stdin.write('-stay_open\nFalse\n')
+            self.process.stdin.flush()
+            self.process.wait()
+            self.process = None
@@ -1,14 +1,17 @@
 import os
 import csv
 import argparse
-from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
 from datetime import datetime
+import media_stats
+from bounded_io import open_bounded
 
 def get_exif_data(image_path):
     """Get EXIF data from image file"""
+    from PIL import Image
+    from PIL.ExifTags import TAGS
+
     try:
-        with Image.open(image_path) as img:
+        with media_stats.stage('metadata'), open_bounded(image_path) as f, Image.open(f) as img:
             exif_data = img._getexif()
             if exif_data is not None:
                 return {TAGS.get(tag, tag): value for tag, value in exif_data.items()}
@@ -46,30 +49,61 @@ def scan_directory_for_jpgs_without_gps(root_dir, output_csv):
         writer = csv.writer(csvfile)
         writer.writerow(['path', 'datetime'])  # Write header
         
-        for root, _, files in os.walk(root_dir):
+        for root, _, files in media_stats.walk(root_dir):
             for file in files:
                 if file.lower().endswith(('.jpg', '.jpeg')):
                     file_path = os.path.join(root, file)
                     exif_data = get_exif_data(file_path)
+                    media_stats.count('images')
                     
                     if not has_gps_data(exif_data):
                         dt = format_datetime(exif_data)
-                        writer.writerow([file_path, dt])
+                        with media_stats.stage('write'):
+                            writer.writerow([file_path, dt])
+                        media_stats.count('without_gps')
+
+def scan_catalog_for_jpgs_without_gps(catalog_path, root_dir, output_csv):
+    """Write JPGs without GPS data to CSV using the media catalog instead of the disk
+
+    The catalog keeps the same answers the disk scan reads (any GPS block, the
+    first usable datetime tag), so both write the same rows; the catalog's
+    are ordered by path.
+    """
+    from media_catalog import open_catalog, query_gps_presence
+
+    conn = open_catalog(catalog_path)
+    try:
+        with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['path', 'datetime'])  # Write header
+
+            for path, dt, has_gps_ifd in query_gps_presence(conn, root_dir, ('.jpg', '.jpeg')):
+                if not has_gps_ifd:
+                    writer.writerow([path, dt])
+    finally:
+        conn.close()
 
 def main():
     parser = argparse.ArgumentParser(description='Find JPG files without GPS metadata')
     parser.add_argument('directory', help='Directory to scan for JPG files')
     parser.add_argument('output_csv', help='Output CSV filename')
+    parser.add_argument('--catalog', help='Query a media catalog database instead of reading the files')
+    media_stats.add_arguments(parser)
     
     args = parser.parse_args()
+    media_stats.configure(args)
     
     if not os.path.isdir(args.directory):
         print(f"Error: Directory '{args.directory}' does not exist")
         return
     
     print(f"Scanning {args.directory} for JPGs without GPS data...")
-    scan_directory_for_jpgs_without_gps(args.directory, args.output_csv)
+    if args.catalog:
+        scan_catalog_for_jpgs_without_gps(args.catalog, args.directory, args.output_csv)
+    else:
+        scan_directory_for_jpgs_without_gps(args.directory, args.output_csv)
     print(f"Results saved to {args.output_csv}")
+    media_stats.report(args)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
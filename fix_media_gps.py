@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Find photos without GPS and fix them in one pass over the library.
+
+This replaces running find_no_gps_media.py, update_media_gps-csv.py extract
+and update one after the other, which parsed every photo three times and
+looked each one up on disk twice. Here every file is found once and parsed
+once, and a single record per file flows through a chain of generator
+stages:
+
+    walk -> parse -> classify (has / no GPS) -> proxy GPS -> write EXIF
+
+Each stage takes the records of the one before it and updates them in
+place, so nothing is copied between stages, and a stage only runs when the
+next one asks for a record. The proxy stage is the one exception: the
+closest photo with GPS may be found anywhere in the walk, so files that
+need a proxy wait there until the walk is done. They are placed with the
+same rule as 'extract' (closest fix within an hour). Only the fixes' times
+and positions and the waiting records are kept in memory.
+
+--audit writes one CSV row per file as it leaves the pipeline: where its
+GPS came from and what happened to it.
+
+Usage:
+    python fix_media_gps.py "X:/Photos" --audit gps-audit.csv
+    python fix_media_gps.py "X:/Photos" --all --dry-run --audit preview.csv
+"""
+
+import os
+import csv
+import argparse
+
+import media_stats
+from mediatools import load_script
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.heic', '.tiff')
+VIDEO_EXTENSIONS = ('.mov', '.mp4', '.avi', '.mkv')
+AUDIT_FIELDS = ['path', 'datetime', 'latitude', 'longitude', 'gps_source', 'status']
+
+gps_tool = load_script('update_media_gps-csv.py')
+
+class MediaRecord:
+    """One file on its way through the pipeline; every stage updates the same object."""
+    __slots__ = ('path', 'is_video', 'datetime', 'gps', 'source', 'status')
+
+    def __init__(self, path, is_video=False):
+        self.path = path
+        self.is_video = is_video
+        self.datetime = None
+        self.gps = None
+        self.source = None
+        self.status = None
+
+    def __repr__(self):
+        return f"MediaRecord({self.path!r}, gps={self.gps!r}, source={self.source!r}, status={self.status!r})"
+
+def walk_media(directory, process_videos=False):
+    """Stage 1: a record for every image (and video, with process_videos) below directory."""
+    for root, _, files in media_stats.walk(directory):
+        for file in files:
+            lower_file = file.lower()
+            if lower_file.endswith(IMAGE_EXTENSIONS):
+                yield MediaRecord(os.path.join(root, file))
+            elif process_videos and lower_file.endswith(VIDEO_EXTENSIONS):
+                yield MediaRecord(os.path.join(root, file), is_video=True)
+
+def parse_media(records):
+    """Stage 2: read capture time and GPS, parsing each file once."""
+    for record in records:
+        print(f"Processing {'video' if record.is_video else 'image'}: {record.path}")
+        record.datetime, record.gps = gps_tool.read_media(record.path, record.is_video)
+        yield record
+
+def classify(records):
+    """Stage 3: mark each record as having its own GPS fix or not."""
+    for record in records:
+        media_stats.count('media_files')
+        if record.gps is not None:
+            media_stats.count('with_gps')
+            record.source, record.status = 'original', 'has_gps'
+        else:
+            record.status = 'no_gps'
+        yield record
+
+def assign_proxy(records, time_window_hours=1):
+    """Stage 4: give files without GPS the position of the closest fix in time.
+
+    Records that are done pass straight through. Those waiting for a proxy
+    are held until the input is exhausted, then placed together with
+    assign_proxy_gps, exactly as 'extract' places them.
+    """
+    table = gps_tool.MediaTable()
+    waiting = []
+    for record in records:
+        if record.status == 'has_gps' and record.datetime is not None:
+            table.append(record.path, record.datetime, record.gps)
+        elif record.status == 'no_gps' and record.datetime is not None:
+            waiting.append((len(table), record))
+            table.append(record.path, record.datetime, None)
+            continue
+        yield record
+
+    with media_stats.stage('match'):
+        media_stats.count('proxy_assigned', gps_tool.assign_proxy_gps(table, time_window_hours))
+    for row, record in waiting:
+        if table.has_gps[row]:
+            record.gps, record.source, record.status = table.gps(row), 'proxy', 'proxy'
+        yield record
+
+def write_gps(records, exiftool='exiftool', dry_run=False):
+    """Stage 5: write proxy positions into the images.
+
+    Formats without a native writer are queued on one stay-open exiftool
+    process; their records move on as soon as their batch has run.
+    """
+    fallback = gps_tool.ExifToolBatch(exiftool)
+    queued = []
+    try:
+        for record in records:
+            if record.status == 'proxy':
+                if record.is_video:
+                    # extract never wrote videos to its CSV, so update never touched them
+                    record.status = 'video_not_written'
+                elif dry_run:
+                    record.status = 'would_write'
+                elif not gps_tool.is_valid_media(record.path):
+                    record.status = 'invalid'
+                else:
+                    success = gps_tool.update_image_gps(record.path, record.gps[0], record.gps[1], fallback)
+                    if success is None:
+                        record.status = 'queued'
+                        queued.append(record)
+                    else:
+                        record.status = 'written' if success else 'failed'
+            if record.status != 'queued':
+                yield record
+            if queued and queued[0].path in fallback.results:
+                yield from _finish_queued(queued, fallback)
+                queued = []
+    finally:
+        # Also when an earlier stage fails or the consumer stops, so exiftool does not linger
+        fallback.close()
+    yield from _finish_queued(queued, fallback)
+
+def _finish_queued(queued, fallback):
+    for record in queued:
+        record.status = 'written' if fallback.results.get(record.path) else 'failed'
+        yield record
+
+def audit_tap(records, output_file):
+    """Optional tap: write a CSV row for every record passing through, then pass it on."""
+    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=AUDIT_FIELDS)
+        writer.writeheader()
+        for record in records:
+            lat, lon = record.gps if record.gps is not None else ('', '')
+            writer.writerow({
+                'path': record.path,
+                'datetime': record.datetime.isoformat() if record.datetime else '',
+                'latitude': lat,
+                'longitude': lon,
+                'gps_source': record.source or '',
+                'status': record.status,
+            })
+            yield record
+
+def fix_directory(directory, process_videos=False, audit_file=None, exiftool='exiftool', dry_run=False):
+    """Run the whole pipeline over directory; returns {status: number of files}."""
+    records = write_gps(assign_proxy(classify(parse_media(walk_media(directory, process_videos)))),
+                        exiftool, dry_run)
+    if audit_file:
+        records = audit_tap(records, audit_file)
+
+    totals = {}
+    for record in records:
+        totals[record.status] = totals.get(record.status, 0) + 1
+    for status in ('written', 'failed'):
+        media_stats.count(status, totals.get(status, 0))
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Find media without GPS and write proxy GPS in one streaming pass.")
+    parser.add_argument("directory", help="Directory to scan for media files")
+    parser.add_argument("--all", action='store_true', help="Also read videos, as GPS fixes for nearby photos")
+    parser.add_argument("--audit", help="Write a CSV row per file with its GPS, source and outcome")
+    parser.add_argument("--dry-run", action='store_true', help="Assign proxy GPS but do not write any file")
+    parser.add_argument("--exiftool", default="exiftool", help="exiftool executable used for formats without a native writer")
+    media_stats.add_arguments(parser)
+    args = parser.parse_args()
+    media_stats.configure(args)
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: Directory not found - {args.directory}")
+        return
+
+    totals = fix_directory(args.directory, process_videos=args.all, audit_file=args.audit,
+                           exiftool=args.exiftool, dry_run=args.dry_run)
+    print(f"\nProcessed {sum(totals.values())} media files:")
+    for status, count in sorted(totals.items()):
+        print(f"- {status}: {count}")
+    if args.audit:
+        print(f"Audit saved to {args.audit}")
+    media_stats.report(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import os
+import re
+import json
+from array import array
+from datetime import datetime, timezone
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+TRACK_EXTENSIONS = ('.gpx', '.kml', '.geojson', '.json')
+GPX_POINTS = ('trkpt', 'rtept', 'wpt')
+OFFSET_RE = re.compile(r'^([+-])?(\d+)(?::(\d{1,2})(?::(\d{1,2}))?|([hms]))$', re.IGNORECASE)
+UNIT_SECONDS = {'h': 3600, 'm': 60, 's': 1}
+
+def _local(tag):
+    """Tag name without its XML namespace."""
+    return tag.rsplit('}', 1)[-1]
+
+def _epoch(text):
+    """ISO 8601 timestamp to POSIX seconds; naive times are taken as UTC."""
+    dt = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+class TrackSeries:
+    """GPS fixes as three parallel float64 arrays sorted by time (POSIX seconds)."""
+
+    def __init__(self, times, lats, lons):
+        order = np.argsort(times, kind='stable')
+        self.times = np.asarray(times, dtype=np.float64)[order]
+        self.lats = np.asarray(lats, dtype=np.float64)[order]
+        self.lons = np.asarray(lons, dtype=np.float64)[order]
+
+    def __len__(self):
+        return len(self.times)
+
+    @classmethod
+    def from_files(cls, paths):
+        """Load and merge any number of GPX, KML and GeoJSON files."""
+        times, lats, lons = array('d'), array('d'), array('d')
+        for path in paths:
+            reader = READERS.get(os.path.splitext(path)[1].lower())
+            if reader is None:
+                print(f"Skipping (unrecognized track format): {path}")
+                continue
+            before = len(times)
+            try:
+                reader(path, times, lats, lons)
+            except (OSError, ET.ParseError, ValueError) as e:
+                print(f"Error reading track {path}: {e}")
+                del times[before:], lats[before:], lons[before:]
+                continue
+            print(f"Loaded {len(times) - before} track points from {path}")
+        return cls(np.frombuffer(times), np.frombuffer(lats), np.frombuffer(lons))
+
+    def locate(self, timestamps, max_gap_seconds=300):
+        """Positions at the given POSIX times as (lats, lons, valid).
+
+        A time between two fixes less than max_gap_seconds apart is
+        interpolated linearly; otherwise the nearest fix is used if it is
+        within max_gap_seconds. valid is False where neither applies.
+        """
+        t = np.asarray(timestamps, dtype=np.float64)
+        if len(self.times) == 0:
+            empty = np.full(t.shape, np.nan)
+            return empty, empty.copy(), np.zeros(t.shape, dtype=bool)
+
+        last = len(self.times) - 1
+        hi = np.clip(np.searchsorted(self.times, t), 0, last)
+        lo = np.clip(hi - 1, 0, last)
+        before = t - self.times[lo]
+        after = self.times[hi] - t
+        span = self.times[hi] - self.times[lo]
+
+        nearest = np.where(np.abs(before) <= np.abs(after), 0.0, 1.0)
+        interpolate = (span > 0) & (span <= max_gap_seconds) & (before >= 0) & (after >= 0)
+        frac = np.where(interpolate, before / np.where(span > 0, span, 1.0), nearest)
+
+        lats = self.lats[lo] + (self.lats[hi] - self.lats[lo]) * frac
+        lons = self.lons[lo] + (self.lons[hi] - self.lons[lo]) * frac
+        valid = interpolate | (np.minimum(np.abs(before), np.abs(after)) <= max_gap_seconds)
+        valid &= ~np.isnan(t)
+        return lats, lons, valid
+
+def _iter_elements(path, records):
+    """Yield each XML element as it ends; the record elements are then detached so memory stays flat."""
+    stack = []
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        yield elem
+        if stack and _local(elem.tag) in records:
+            del stack[-1][-1]
+
+def read_gpx(path, times, lats, lons):
+    """Append the timed <trkpt>/<rtept>/<wpt> points of a GPX file."""
+    for elem in _iter_elements(path, GPX_POINTS):
+        if _local(elem.tag) not in GPX_POINTS:
+            continue
+        when = next((child.text for child in elem if _local(child.tag) == 'time'), None)
+        if when:
+            times.append(_epoch(when))
+            lats.append(float(elem.get('lat')))
+            lons.append(float(elem.get('lon')))
+
+def read_kml(path, times, lats, lons):
+    """Append <gx:Track> samples and timestamped Point placemarks of a KML file."""
+    whens, coords, coordinates, point = [], [], None, None
+    for elem in _iter_elements(path, ('when', 'coord', 'Placemark')):
+        name = _local(elem.tag)
+        if name == 'when':
+            whens.append(elem.text or '')
+        elif name == 'coord':
+            coords.append(elem.text or '')
+        elif name == 'coordinates':
+            coordinates = elem.text
+        elif name == 'Point':
+            point = coordinates
+        elif name == 'Track':
+            for when, coord in zip(whens, coords):
+                lon, lat = coord.split()[:2]
+                times.append(_epoch(when))
+                lats.append(float(lat))
+                lons.append(float(lon))
+            whens, coords = [], []
+        elif name == 'Placemark':
+            # A Point placemark with a single <TimeStamp><when>
+            if point and len(whens) == 1:
+                lon, lat = point.strip().split(',')[:2]
+                times.append(_epoch(whens[0]))
+                lats.append(float(lat))
+                lons.append(float(lon))
+            whens, coords, point = [], [], None
+
+def read_geojson(path, times, lats, lons):
+    """Append LineStrings carrying a 'coordTimes' property and Points with a 'time' property."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    features = data.get('features', [data]) if isinstance(data, dict) else []
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        properties = feature.get('properties') or {}
+        kind = geometry.get('type')
+        if kind == 'Point':
+            when = properties.get('time') or properties.get('timestamp')
+            if when:
+                lon, lat = geometry['coordinates'][:2]
+                times.append(_epoch(when))
+                lats.append(float(lat))
+                lons.append(float(lon))
+            continue
+        if kind == 'LineString':
+            lines, line_times = [geometry['coordinates']], [properties.get('coordTimes') or []]
+        elif kind == 'MultiLineString':
+            lines, line_times = geometry['coordinates'], properties.get('coordTimes') or []
+        else:
+            continue
+        for line, stamps in zip(lines, line_times):
+            for position, when in zip(line, stamps):
+                times.append(_epoch(when))
+                lats.append(float(position[1]))
+                lons.append(float(position[0]))
+
+READERS = {
+    '.gpx': read_gpx,
+    '.kml': read_kml,
+    '.geojson': read_geojson,
+    '.json': read_geojson,
+}
+
+def find_track_files(paths):
+    """Expand directories into the track files they contain, each listed once."""
+    found = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for f in sorted(files):
+                    if f.lower().endswith(TRACK_EXTENSIONS):
+                        found.setdefault(os.path.abspath(os.path.join(root, f)), None)
+        else:
+            found.setdefault(os.path.abspath(path), None)
+    return list(found)
+
+def parse_clock_offset(spec):
+    """'[CAMERA=]±H:MM[:SS]' or '[CAMERA=]±N' with a unit h, m or s to (camera or None, seconds).
+
+    The offset is how far the camera clock is ahead of UTC, so a camera set
+    to UTC+2 local time without a zone is '+2:00' or '+2h'. A bare number is
+    rejected: '+2' reads as hours but used to mean two seconds.
+    """
+    camera, _, value = spec.rpartition('=')
+    match = OFFSET_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid clock offset: {spec} (use +H:MM, or a number with h, m or s, e.g. +2h)")
+    sign, first, minutes, seconds, unit = match.groups()
+    if unit is not None:
+        total = int(first) * UNIT_SECONDS[unit.lower()]
+    else:
+        total = int(first) * 3600 + int(minutes) * 60 + int(seconds or 0)
+    return camera.strip() or None, -total if sign == '-' else total
@@ -0,0 +1,367 @@
+import os
+import json
+import time
+import struct
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import media_stats
+
+AUDIO_EXTENSIONS = ('.mp3', '.flac', '.m4a', '.ogg', '.wav', '.aac', '.wma')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.heic', '.tiff')
+VIDEO_EXTENSIONS = ('.mov', '.mp4', '.avi', '.mkv')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    ext TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audio_streams (
+    file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+    bit_depth INTEGER,
+    sample_rate INTEGER,
+    channels INTEGER,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+    artist TEXT,
+    album TEXT,
+    albumartist TEXT,
+    title TEXT,
+    track TEXT,
+    disc TEXT
+);
+CREATE TABLE IF NOT EXISTS exif (
+    file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+    datetime TEXT NOT NULL,
+    taken_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS exif_presence (
+    file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+    any_datetime TEXT,
+    has_gps_ifd INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gps (
+    file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    tool TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (tool, path)
+);
+CREATE INDEX IF NOT EXISTS idx_tags_artist ON tags(artist);
+CREATE INDEX IF NOT EXISTS idx_tags_album ON tags(album);
+CREATE INDEX IF NOT EXISTS idx_exif_taken_at ON exif(taken_at);
+"""
+
+def open_catalog(db_path):
+    """Open (and create if needed) the catalog database."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def file_kind(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in AUDIO_EXTENSIONS:
+        return 'audio'
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in VIDEO_EXTENSIONS:
+        return 'video'
+    return None
+
+def _exif_time(text):
+    try:
+        return datetime.strptime(str(text).strip(), '%Y:%m:%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+def read_exif(file_path):
+    """Return (datetime, (lat, lon), any_datetime, has_gps_ifd) from a single EXIF parse.
+
+    datetime is DateTimeOriginal and gps a usable fix; either may be None.
+    any_datetime falls back to DateTimeDigitized and DateTime, and
+    has_gps_ifd is True whenever a GPS block is present, as
+    find_no_gps_media reads the file.
+    """
+    import exifread
+    from bounded_io import open_bounded
+    from media_headers import map_file, exif_fields
+
+    fields = None
+    if file_path.lower().endswith(('.jpg', '.jpeg', '.tif', '.tiff')):
+        try:
+            with map_file(file_path) as buf:
+                fields = exif_fields(buf)
+        except (OSError, struct.error, ValueError):
+            fields = None
+    if fields is not None:
+        texts = (fields['datetime_original'], fields['datetime_digitized'], fields['datetime'])
+        gps, has_gps_ifd = fields['gps'], fields['has_gps_ifd']
+    else:
+        with open_bounded(file_path) as f:
+            tags = exifread.process_file(f, details=False)
+        texts = tuple(tags.get(key) for key in ('EXIF DateTimeOriginal', 'EXIF DateTimeDigitized', 'Image DateTime'))
+        has_gps_ifd = 'Image GPSInfo' in tags
+        gps = None
+        try:
+            lat = tags['GPS GPSLatitude'].values
+            lon = tags['GPS GPSLongitude'].values
+            lat = float(lat[0]) + float(lat[1])/60 + float(lat[2])/3600
+            lon = float(lon[0]) + float(lon[1])/60 + float(lon[2])/3600
+            if str(tags['GPS GPSLatitudeRef']) == 'S':
+                lat = -lat
+            if str(tags['GPS GPSLongitudeRef']) == 'W':
+                lon = -lon
+            gps = (lat, lon)
+        except (KeyError, AttributeError, IndexError, ValueError, TypeError, ZeroDivisionError):
+            pass
+
+    # (0,0) is what broken writers leave behind, not a real fix
+    if gps is not None and abs(gps[0]) < 0.0001 and abs(gps[1]) < 0.0001:
+        gps = None
+    times = [_exif_time(text) if text else None for text in texts]
+    dt = times[0]
+    any_dt = next((t for t in times if t is not None), None)
+    return dt, gps, any_dt, has_gps_ifd
+
+def _scan_file(job):
+    """Worker: parse one file and return its catalog rows."""
+    path, size, mtime_ns = job
+    kind = file_kind(path)
+    record = {'path': path, 'size': size, 'mtime_ns': mtime_ns, 'kind': kind, 'tags': None,
+              'stream': None, 'datetime': None, 'gps': None, 'presence': None, 'error': None}
+    started = time.perf_counter()
+    try:
+        if kind == 'audio':
+            from audio_tags import read_tags, read_flac
+            if path.lower().endswith('.flac'):
+                tags, info = read_flac(path)
+                record['stream'] = (info.bits_per_sample, info.sample_rate, info.channels, info.length)
+            else:
+                tags = read_tags(path)
+            if tags is not None:
+                record['tags'] = (tags.artist, tags.album, tags.albumartist, tags.title, tags.track, tags.disc)
+        elif kind == 'image':
+            record['datetime'], record['gps'], any_dt, has_gps_ifd = read_exif(path)
+            record['presence'] = (any_dt.isoformat() if any_dt else None, int(has_gps_ifd))
+    except Exception as e:
+        # Not stored, so the file is parsed again on the next scan
+        record['error'] = str(e)
+    media_stats.STATS.add_time('metadata', time.perf_counter() - started)
+    # This runs in a pool process; the parent merges these into its own stats
+    record['stats'] = media_stats.take()
+    return record
+
+def _below(root, column='path'):
+    """SQL condition (and its parameters) selecting paths below root.
+
+    A range on the path is exact and case-sensitive, unlike LIKE, and uses
+    the path index.
+    """
+    prefix = os.path.join(os.path.abspath(root), '')
+    return f"{column} >= ? AND {column} < ?", [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+
+def scan_into_catalog(conn, root, workers=None):
+    """Walk root once and (re)parse every new or changed media file in parallel."""
+    below, params = _below(root, 'f.path')
+    # Images catalogued before exif_presence existed count as changed, so they get its row
+    known = {
+        path: (size, mtime_ns) if kind != 'image' or has_presence else None
+        for path, size, mtime_ns, kind, has_presence in conn.execute(
+            f"""SELECT f.path, f.size, f.mtime_ns, f.kind, p.file_id IS NOT NULL
+                FROM files f LEFT JOIN exif_presence p ON p.file_id = f.id WHERE {below}""", params)
+    }
+
+    jobs = []
+    seen = set()
+    for dirpath, _, filenames in os.walk(os.path.abspath(root)):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if file_kind(path) is None:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            seen.add(path)
+            if known.get(path) != (st.st_size, st.st_mtime_ns):
+                jobs.append((path, st.st_size, st.st_mtime_ns))
+
+    removed = [(path,) for path in known if path not in seen]
+    with conn:
+        conn.executemany("DELETE FROM files WHERE path = ?", removed)
+
+    print(f"Cataloguing {len(jobs)} new or changed files ({len(seen) - len(jobs)} unchanged, {len(removed)} removed)")
+    if not jobs:
+        return 0
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=media_stats.init_worker) as executor, conn:
+        for record in executor.map(_scan_file, jobs, chunksize=64):
+            media_stats.merge(record['stats'])
+            if record['error'] is not None:
+                print(f"Error cataloguing {record['path']}: {record['error']}")
+                # Drop any row from an older version of the file so nobody reads stale data
+                conn.execute("DELETE FROM files WHERE path = ?", (record['path'],))
+                failed += 1
+                continue
+            _store(conn, record)
+    if failed:
+        print(f"{failed} files could not be parsed and will be retried on the next scan")
+    return len(jobs) - failed
+
+def _store(conn, record):
+    path = record['path']
+    conn.execute("DELETE FROM files WHERE path = ?", (path,))
+    file_id = conn.execute(
+        "INSERT INTO files (path, ext, kind, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+        (path, os.path.splitext(path)[1].lower(), record['kind'], record['size'], record['mtime_ns'])
+    ).lastrowid
+    if record['stream']:
+        conn.execute("INSERT INTO audio_streams VALUES (?, ?, ?, ?, ?)", (file_id, *record['stream']))
+    if record['tags']:
+        conn.execute("INSERT INTO tags VALUES (?, ?, ?, ?, ?, ?, ?)", (file_id, *record['tags']))
+    if record['datetime']:
+        dt = record['datetime']
+        conn.execute("INSERT INTO exif VALUES (?, ?, ?)", (file_id, dt.isoformat(), dt.timestamp()))
+    if record['gps']:
+        conn.execute("INSERT INTO gps VALUES (?, ?, ?)", (file_id, *record['gps']))
+    if record['presence']:
+        conn.execute("INSERT INTO exif_presence VALUES (?, ?, ?)", (file_id, *record['presence']))
+
+def _ext_clause(extensions):
+    return f"f.ext IN ({', '.join('?' for _ in extensions)})", [e.lower() for e in extensions]
+
+def query_paths(conn, root, extensions):
+    """All catalogued paths below root with one of the given extensions."""
+    clause, params = _ext_clause(extensions)
+    below, below_params = _below(root, 'f.path')
+    rows = conn.execute(
+        f"SELECT f.path FROM files f WHERE {below} AND {clause} ORDER BY f.path",
+        below_params + params)
+    return [path for (path,) in rows]
+
+def query_tags(conn, root, extensions=AUDIO_EXTENSIONS):
+    """Yield AudioTags records for catalogued audio files below root that have tags."""
+    from audio_tags import AudioTags
+
+    clause, params = _ext_clause(extensions)
+    below, below_params = _below(root, 'f.path')
+    rows = conn.execute(
+        f"""SELECT f.path, t.artist, t.album, t.albumartist, t.title, t.track, t.disc
+            FROM files f JOIN tags t ON t.file_id = f.id
+            WHERE {below} AND {clause} ORDER BY f.path""",
+        below_params + params)
+    for row in rows:
+        yield AudioTags(*row)
+
+def query_streams(conn, root, extensions=('.flac',)):
+    """Yield (path, bit_depth, sample_rate) for catalogued audio streams below root."""
+    clause, params = _ext_clause(extensions)
+    below, below_params = _below(root, 'f.path')
+    yield from conn.execute(
+        f"""SELECT f.path, s.bit_depth, s.sample_rate
+            FROM files f JOIN audio_streams s ON s.file_id = f.id
+            WHERE {below} AND {clause} ORDER BY f.path""",
+        below_params + params)
+
+def query_media(conn, root, extensions=IMAGE_EXTENSIONS):
+    """Yield {'path', 'datetime', 'gps'} dicts for catalogued files below root, ordered by capture time."""
+    clause, params = _ext_clause(extensions)
+    below, below_params = _below(root, 'f.path')
+    rows = conn.execute(
+        f"""SELECT f.path, e.datetime, g.latitude, g.longitude
+            FROM files f
+            LEFT JOIN exif e ON e.file_id = f.id
+            LEFT JOIN gps g ON g.file_id = f.id
+            WHERE {below} AND {clause}
+            ORDER BY e.taken_at""",
+        below_params + params)
+    for path, dt, lat, lon in rows:
+        yield {
+            'path': path,
+            'datetime': datetime.fromisoformat(dt) if dt else None,
+            'gps': (lat, lon) if lat is not None else None,
+        }
+
+def query_gps_presence(conn, root, extensions=IMAGE_EXTENSIONS):
+    """Yield (path, any_datetime, has_gps_ifd) for catalogued images below root, ordered by path.
+
+    These are the answers find_no_gps_media reads from the files: the first of
+    DateTimeOriginal, DateTimeDigitized and DateTime, and whether any GPS
+    block is present.
+    """
+    clause, params = _ext_clause(extensions)
+    below, below_params = _below(root, 'f.path')
+    rows = conn.execute(
+        f"""SELECT f.path, p.any_datetime, p.has_gps_ifd
+            FROM files f JOIN exif_presence p ON p.file_id = f.id
+            WHERE {below} AND {clause} ORDER BY f.path""",
+        below_params + params)
+    for path, any_dt, has_gps_ifd in rows:
+        yield path, any_dt, bool(has_gps_ifd)
+
+def load_results(conn, tool, root=None):
+    """Cached per-file results of a tool: {path: (size, mtime_ns, result)}."""
+    query = "SELECT path, size, mtime_ns, result FROM results WHERE tool = ?"
+    params = [tool]
+    if root is not None:
+        below, below_params = _below(root)
+        query += f" AND {below}"
+        params += below_params
+    return {path: (size, mtime_ns, json.loads(result)) for path, size, mtime_ns, result in conn.execute(query, params)}
+
+def store_results(conn, tool, rows):
+    """Cache (path, size, mtime_ns, result) rows for a tool; results must be JSON-serialisable."""
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO results (tool, path, size, mtime_ns, result) VALUES (?, ?, ?, ?, ?)",
+            [(tool, path, size, mtime_ns, json.dumps(result)) for path, size, mtime_ns, result in rows])
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect the shared media catalog.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scan_parser = subparsers.add_parser('scan', help='Scan a directory into the catalog')
+    scan_parser.add_argument("directory", help="Directory to scan")
+    scan_parser.add_argument("--db", default="media_catalog.db", help="Catalog database file")
+    scan_parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+
+    stats_parser = subparsers.add_parser('stats', help='Summarise the catalog contents')
+    stats_parser.add_argument("--db", default="media_catalog.db", help="Catalog database file")
+
+    args = parser.parse_args()
+    conn = open_catalog(args.db)
+
+    if args.command == 'scan':
+        if not os.path.isdir(args.directory):
+            print(f"Error: Directory '{args.directory}' does not exist")
+            return
+        scan_into_catalog(conn, args.directory, workers=args.workers)
+        print(f"Catalog updated: {args.db}")
+    elif args.command == 'stats':
+        for kind, count in conn.execute("SELECT kind, COUNT(*) FROM files GROUP BY kind ORDER BY kind"):
+            print(f"{kind}: {count} files")
+        for table in ('tags', 'audio_streams', 'exif', 'gps'):
+            count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            print(f"- {count} with {table}")
+
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import os
+import csv
+import mmap
+import hashlib
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+EDGE_BYTES = 64 * 1024
+
+def _new_hasher():
+    """xxh3-128 when the xxhash package is installed, BLAKE2b otherwise."""
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=20)
+
+def _hash_file(path, partial):
+    """Hash a whole file, or only its first and last EDGE_BYTES, through a read-only mmap."""
+    hasher = _new_hasher()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return hasher.digest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            if partial and size > 2 * EDGE_BYTES:
+                hasher.update(view[:EDGE_BYTES])
+                hasher.update(view[size - EDGE_BYTES:])
+            else:
+                hasher.update(view)
+    return hasher.digest()
+
+def partial_hash(path):
+    return _hash_file(path, partial=True)
+
+def full_hash(path):
+    return _hash_file(path, partial=False)
+
+def _safe_map(executor, func, paths):
+    """Map func over paths, dropping files that cannot be read."""
+    def call(path):
+        try:
+            return path, func(path)
+        except OSError as e:
+            print(f"Could not hash {path}: {e}")
+            return path, None
+    return [(path, digest) for path, digest in executor.map(call, paths) if digest is not None]
+
+def _split(groups, executor, func):
+    """Refine each candidate group by a hash function, keeping only groups that still collide."""
+    refined = []
+    for group in groups:
+        by_digest = defaultdict(list)
+        for path, digest in _safe_map(executor, func, group):
+            by_digest[digest].append(path)
+        refined.extend(g for g in by_digest.values() if len(g) > 1)
+    return refined
+
+def find_duplicates(paths, workers=None):
+    """Group paths with identical content: by size, then edge hash, then full hash."""
+    by_size = defaultdict(list)
+    for path in paths:
+        try:
+            by_size[os.path.getsize(path)].append(path)
+        except OSError:
+            continue
+
+    candidates = [group for size, group in by_size.items() if len(group) > 1]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        candidates = _split(candidates, executor, partial_hash)
+        # For small files the edge hash already covered every byte
+        small = [g for g in candidates if os.path.getsize(g[0]) <= 2 * EDGE_BYTES]
+        large = [g for g in candidates if os.path.getsize(g[0]) > 2 * EDGE_BYTES]
+        return small + _split(large, executor, full_hash)
+
+def iter_files(roots, extensions=None):
+    for root in roots:
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if extensions is None or filename.lower().endswith(extensions):
+                    yield os.path.join(dirpath, filename)
+
+class ContentIndex:
+    """Answers "is this content already present?" for a set of files, hashing lazily.
+
+    Files are indexed by size only; edge and full hashes are computed the first
+    time a candidate of the same size is checked, and then cached.
+    """
+
+    def __init__(self, roots=(), extensions=None, workers=None):
+        self.by_size = defaultdict(list)
+        self._partial = {}
+        self._full = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        for path in iter_files(roots, extensions):
+            self.add(path)
+
+    def add(self, path):
+        try:
+            self.by_size[os.path.getsize(path)].append(os.path.abspath(path))
+        except OSError:
+            pass
+
+    def _digests(self, cache, func, paths):
+        missing = [p for p in paths if p not in cache]
+        for path, digest in _safe_map(self._executor, func, missing):
+            cache[path] = digest
+        return {p: cache[p] for p in paths if p in cache}
+
+    def find(self, path):
+        """Return an indexed path with the same content as path, or None."""
+        path = os.path.abspath(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        candidates = [p for p in self.by_size.get(size, ()) if p != path]
+        if not candidates:
+            return None
+
+        digests = self._digests(self._partial, partial_hash, candidates + [path])
+        candidates = [p for p in candidates if p in digests and digests[p] == digests.get(path)]
+        if not candidates or size <= 2 * EDGE_BYTES:
+            return candidates[0] if candidates else None
+
+        digests = self._digests(self._full, full_hash, candidates + [path])
+        for candidate in candidates:
+            if candidate in digests and digests[candidate] == digests.get(path):
+                return candidate
+        return None
+
+    def close(self):
+        self._executor.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Report files with identical content.")
+    parser.add_argument("directories", nargs='+', help="Directories to scan")
+    parser.add_argument("--ext", action='append', help="Only consider this extension (repeatable, e.g. --ext .flac)")
+    parser.add_argument("--csv", help="Write the duplicate groups to a CSV file")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing threads")
+    args = parser.parse_args()
+
+    extensions = tuple(e.lower() for e in args.ext) if args.ext else None
+    paths = list(iter_files(args.directories, extensions))
+    print(f"Checking {len(paths)} files for duplicates...")
+    groups = find_duplicates(paths, workers=args.workers)
+
+    wasted = 0
+    for number, group in enumerate(groups, 1):
+        size = os.path.getsize(group[0])
+        wasted += size * (len(group) - 1)
+        print(f"\n[{number}] {len(group)} copies, {size:,} bytes each:")
+        for path in sorted(group):
+            print(f"  {path}")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['group', 'size', 'path'])
+            for number, group in enumerate(groups, 1):
+                size = os.path.getsize(group[0])
+                for path in sorted(group):
+                    writer.writerow([number, size, path])
+        print(f"\nResults written to {args.csv}")
+
+    print(f"\n{len(groups)} duplicate groups, {wasted / (1024 * 1024):.1f} MB reclaimable")
+
+if __name__ == '__main__':
+    main()
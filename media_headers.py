@@ -0,0 +1,228 @@
+import mmap
+import struct
+from contextlib import contextmanager
+
+# Bytes per value of each TIFF field type
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+TAG_MODEL = 0x0110
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_GPS_IFD = 0x8825
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+GPS_LAT_REF, GPS_LAT, GPS_LON_REF, GPS_LON = 1, 2, 3, 4
+
+ID3_ENCODINGS = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}
+ID3_TEXT_FRAMES = ('TPE1', 'TALB', 'TPE2', 'TIT2', 'TRCK', 'TPOS')
+# Frame flags that change how the payload is stored (compression, encryption, unsynchronisation, ...)
+ID3_ENCODED_FLAGS = {3: 0x00E0, 4: 0x004F}
+
+@contextmanager
+def map_file(path):
+    """Map a file read-only and yield a memoryview over it (empty for empty files).
+
+    Only the pages the parsers touch are read. Callers must not keep slices of
+    the view beyond the with block.
+    """
+    with open(path, 'rb', buffering=0) as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield memoryview(b'')
+            return
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+            mapped.close()
+
+# --- EXIF (JPEG APP1 or bare TIFF) --------------------------------------------
+
+def find_tiff_header(buf):
+    """Offset of the TIFF header in a JPEG's Exif segment or a TIFF file, or None."""
+    if buf[:4] in (b'II*\x00', b'MM\x00*'):
+        return 0
+    if buf[:2] != b'\xff\xd8':
+        return None
+    pos, end = 2, len(buf)
+    while pos + 4 <= end:
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):
+            return None  # end of image or start of scan: no Exif before the pixels
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            pos += 2
+            continue
+        (length,) = struct.unpack_from('>H', buf, pos + 2)
+        if marker == 0xE1 and buf[pos + 4:pos + 10] == b'Exif\x00\x00':
+            return pos + 10
+        pos += 2 + length
+    return None
+
+def ifd_entries(buf, tiff, offset, endian):
+    """{tag: (type, count, value_offset)} of one IFD; offsets are absolute positions in buf."""
+    start = tiff + offset
+    (count,) = struct.unpack_from(endian + 'H', buf, start)
+    entries = {}
+    for pos in range(start + 2, start + 2 + 12 * count, 12):
+        tag, kind, n = struct.unpack_from(endian + 'HHI', buf, pos)
+        size = TIFF_TYPE_SIZES.get(kind, 1) * n
+        value = pos + 8 if size <= 4 else tiff + struct.unpack_from(endian + 'I', buf, pos + 8)[0]
+        entries[tag] = (kind, n, value)
+    return entries
+
+def _ascii(buf, entry):
+    if entry is None or entry[0] != 2:
+        return None
+    _, n, offset = entry
+    text = bytes(buf[offset:offset + n]).split(b'\x00', 1)[0].decode('ascii', 'replace').strip()
+    return text or None
+
+def _degrees(buf, entry, endian):
+    if entry is None or entry[0] != 5 or entry[1] < 3:
+        return None
+    values = struct.unpack_from(endian + '6I', buf, entry[2])
+    d, m, s = (num / den if den else 0.0 for num, den in zip(values[::2], values[1::2]))
+    return d + m / 60 + s / 3600
+
+def _sub_ifd(buf, tiff, entries, tag, endian):
+    entry = entries.get(tag)
+    if entry is None:
+        return {}
+    (offset,) = struct.unpack_from(endian + 'I', buf, entry[2])
+    return ifd_entries(buf, tiff, offset, endian)
+
+def parse_exif(buf):
+    """(DateTimeOriginal text, (lat, lon) or None, camera model) from a JPEG/TIFF buffer.
+
+    Returns None when buf is not a layout this parser handles, so callers can
+    fall back to exifread.
+    """
+    fields = exif_fields(buf)
+    if fields is None:
+        return None
+    return fields['datetime_original'], fields['gps'], fields['model']
+
+def exif_fields(buf):
+    """The EXIF fields the tools read, as a dict, or None for layouts this parser does not handle.
+
+    Besides parse_exif's values it holds DateTimeDigitized, the IFD0
+    DateTime and has_gps_ifd, which is True whenever a GPS IFD is present,
+    complete or not.
+    """
+    tiff = find_tiff_header(buf)
+    if tiff is None:
+        return None
+    endian = {b'II': '<', b'MM': '>'}.get(bytes(buf[tiff:tiff + 2]))
+    if endian is None:
+        return None
+    (ifd0,) = struct.unpack_from(endian + 'I', buf, tiff + 4)
+    entries = ifd_entries(buf, tiff, ifd0, endian)
+    exif = _sub_ifd(buf, tiff, entries, TAG_EXIF_IFD, endian)
+    gps_ifd = _sub_ifd(buf, tiff, entries, TAG_GPS_IFD, endian)
+
+    gps = None
+    lat, lon = _degrees(buf, gps_ifd.get(GPS_LAT), endian), _degrees(buf, gps_ifd.get(GPS_LON), endian)
+    lat_ref, lon_ref = _ascii(buf, gps_ifd.get(GPS_LAT_REF)), _ascii(buf, gps_ifd.get(GPS_LON_REF))
+    if lat is not None and lon is not None and lat_ref and lon_ref:
+        gps = (-lat if lat_ref == 'S' else lat, -lon if lon_ref == 'W' else lon)
+    return {
+        'datetime_original': _ascii(buf, exif.get(TAG_DATETIME_ORIGINAL)),
+        'datetime_digitized': _ascii(buf, exif.get(TAG_DATETIME_DIGITIZED)),
+        'datetime': _ascii(buf, entries.get(TAG_DATETIME)),
+        'gps': gps,
+        'has_gps_ifd': TAG_GPS_IFD in entries,
+        'model': _ascii(buf, entries.get(TAG_MODEL)),
+    }
+
+# --- FLAC STREAMINFO ------------------------------------------------------------
+
+def _id3_length(buf):
+    """Size of a leading ID3v2 tag including its header, 0 when there is none."""
+    if len(buf) < 10 or buf[:3] != b'ID3':
+        return 0
+    size = _synchsafe(buf, 6)
+    return 10 + size + (10 if buf[5] & 0x10 else 0)
+
+def flac_streaminfo(buf):
+    """(sample_rate, channels, bits_per_sample, total_samples) from a FLAC STREAMINFO block."""
+    start = _id3_length(buf)
+    if buf[start:start + 4] != b'fLaC' or buf[start + 4] & 0x7F != 0:
+        raise ValueError("not a FLAC stream")
+    # 20-bit rate, 3-bit channels-1, 5-bit bits-1 and 36-bit sample count after the block sizes
+    (packed,) = struct.unpack_from('>Q', buf, start + 18)
+    return (packed >> 44, ((packed >> 41) & 0x7) + 1, ((packed >> 36) & 0x1F) + 1, packed & 0xFFFFFFFFF)
+
+# --- ID3v2 text frames ------------------------------------------------------------
+
+def _synchsafe(buf, offset):
+    b0, b1, b2, b3 = struct.unpack_from('4B', buf, offset)
+    return (b0 << 21) | (b1 << 14) | (b2 << 7) | b3
+
+def id3_frames(buf):
+    """{frame_id: (offset, size, flags)} of the first copy of each frame in a leading ID3v2.3/2.4 tag.
+
+    Returns None when there is no tag or it needs a full parser (ID3v2.2 or a
+    tag-wide unsynchronisation).
+    """
+    if len(buf) < 10 or buf[:3] != b'ID3':
+        return None
+    version, flags = buf[3], buf[5]
+    if version not in (3, 4) or flags & 0x80:
+        return None
+    end = min(10 + _synchsafe(buf, 6), len(buf))
+    pos = 10
+    if flags & 0x40:
+        if version == 4:
+            pos += _synchsafe(buf, pos)
+        else:
+            pos += 4 + struct.unpack_from('>I', buf, pos)[0]
+
+    frames = {}
+    while pos + 10 <= end:
+        frame_id = bytes(buf[pos:pos + 4])
+        if not frame_id.strip(b'\x00'):
+            break  # padding
+        size = _synchsafe(buf, pos + 4) if version == 4 else struct.unpack_from('>I', buf, pos + 4)[0]
+        (frame_flags,) = struct.unpack_from('>H', buf, pos + 8)
+        if pos + 10 + size > end:
+            break
+        frames.setdefault(frame_id.decode('latin-1'), (pos + 10, size, frame_flags))
+        pos += 10 + size
+    return frames
+
+def id3_text(buf, offset, size):
+    """First non-empty value of an ID3 text frame payload."""
+    if size < 1:
+        return None
+    encoding = ID3_ENCODINGS.get(buf[offset])
+    if encoding is None:
+        return None
+    text = bytes(buf[offset + 1:offset + size]).decode(encoding, 'replace')
+    for value in text.split('\x00'):
+        value = value.strip()
+        if value:
+            return value
+    return None
+
+def read_id3_text(buf):
+    """{frame_id: text} of the tag fields the music tools use, or None to defer to mutagen."""
+    frames = id3_frames(buf)
+    if frames is None:
+        return None
+    encoded = ID3_ENCODED_FLAGS[buf[3]]
+    values = {}
+    for frame_id in ID3_TEXT_FRAMES:
+        frame = frames.get(frame_id)
+        if frame is None:
+            continue
+        offset, size, flags = frame
+        if flags & encoded:
+            return None
+        values[frame_id] = id3_text(buf, offset, size)
+    return values
@@ -0,0 +1,257 @@
+import io
+import os
+import sys
+import json
+import time
+import subprocess
+import threading
+from contextlib import contextmanager
+
+STAGES = ('walk', 'metadata', 'match', 'write', 'copy')
+
+class RunStats:
+    """Counters, per-stage timers, byte totals and subprocess timings for one run."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.clear()
+        self.profile_stage = None
+        self.profiler = None
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """Zero the totals, keeping the start time and profiler."""
+        self.timers = {}
+        self.counters = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files_fetched = 0
+        self.bytes_fetched = 0
+        self.reads_fetched = 0
+        self.max_fetched = 0
+        self.subprocess_calls = 0
+        self.subprocess_seconds = 0.0
+
+    def add_time(self, name, seconds, calls=1):
+        with self.lock:
+            total, n = self.timers.get(name, (0.0, 0))
+            self.timers[name] = (total + seconds, n + calls)
+
+    def as_dict(self):
+        return {
+            'wall_seconds': time.perf_counter() - self.started,
+            'stages': {name: {'seconds': total, 'calls': n} for name, (total, n) in self.timers.items()},
+            'counters': dict(self.counters),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'fetched': {'files': self.files_fetched, 'bytes': self.bytes_fetched,
+                        'reads': self.reads_fetched, 'max_bytes': self.max_fetched},
+            'subprocess': {'calls': self.subprocess_calls, 'seconds': self.subprocess_seconds},
+        }
+
+STATS = RunStats()
+
+@contextmanager
+def stage(name):
+    """Time a block as part of the named stage."""
+    profiler = None
+    if STATS.profile_stage == name and threading.current_thread() is threading.main_thread():
+        profiler = STATS.profiler
+    if profiler is not None:
+        profiler.enable()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STATS.add_time(name, time.perf_counter() - started)
+        if profiler is not None:
+            profiler.disable()
+
+def count(name, n=1):
+    with STATS.lock:
+        STATS.counters[name] = STATS.counters.get(name, 0) + n
+
+def add_bytes_read(n):
+    with STATS.lock:
+        STATS.bytes_read += n
+
+def add_file_fetch(nbytes, reads):
+    """Record what parsing one file pulled from disk (or over the network)."""
+    with STATS.lock:
+        STATS.bytes_read += nbytes
+        STATS.files_fetched += 1
+        STATS.bytes_fetched += nbytes
+        STATS.reads_fetched += reads
+        STATS.max_fetched = max(STATS.max_fetched, nbytes)
+
+def add_bytes_written(n):
+    with STATS.lock:
+        STATS.bytes_written += n
+
+def init_worker():
+    """Pool initializer: start a worker process from zero, not from the totals it forked with."""
+    STATS.reset()
+
+def take():
+    """The totals this process gathered since the last take(), which zeroes them.
+
+    Process pool workers return this with each result and the parent
+    merge()s it, so work done in other processes still shows in the report.
+    """
+    with STATS.lock:
+        delta = {
+            'timers': STATS.timers,
+            'counters': STATS.counters,
+            'bytes_read': STATS.bytes_read,
+            'bytes_written': STATS.bytes_written,
+            'fetched': (STATS.files_fetched, STATS.bytes_fetched, STATS.reads_fetched, STATS.max_fetched),
+            'subprocess': (STATS.subprocess_calls, STATS.subprocess_seconds),
+        }
+        STATS.clear()
+    return delta
+
+def merge(delta):
+    """Add a worker's take() to this process's totals."""
+    with STATS.lock:
+        for name, (seconds, calls) in delta['timers'].items():
+            total, n = STATS.timers.get(name, (0.0, 0))
+            STATS.timers[name] = (total + seconds, n + calls)
+        for name, n in delta['counters'].items():
+            STATS.counters[name] = STATS.counters.get(name, 0) + n
+        STATS.bytes_read += delta['bytes_read']
+        STATS.bytes_written += delta['bytes_written']
+        files, nbytes, reads, largest = delta['fetched']
+        STATS.files_fetched += files
+        STATS.bytes_fetched += nbytes
+        STATS.reads_fetched += reads
+        STATS.max_fetched = max(STATS.max_fetched, largest)
+        calls, seconds = delta['subprocess']
+        STATS.subprocess_calls += calls
+        STATS.subprocess_seconds += seconds
+
+def walk(top, **kwargs):
+    """os.walk that charges its own directory listing time to the 'walk' stage."""
+    iterator = os.walk(top, **kwargs)
+    while True:
+        started = time.perf_counter()
+        try:
+            entry = next(iterator)
+        except StopIteration:
+            STATS.add_time('walk', time.perf_counter() - started)
+            return
+        STATS.add_time('walk', time.perf_counter() - started)
+        count('files_seen', len(entry[2]))
+        yield entry
+
+class _CountingFileIO(io.FileIO):
+    fetched = 0
+    reads = 0
+
+    def readinto(self, buffer):
+        n = super().readinto(buffer)
+        if n:
+            self.fetched += n
+        self.reads += 1
+        return n
+
+    def readall(self):
+        data = super().readall()
+        self.fetched += len(data)
+        self.reads += 1
+        return data
+
+    def close(self):
+        if not self.closed:
+            add_file_fetch(self.fetched, self.reads)
+        super().close()
+
+def open_counted(path, buffering=io.DEFAULT_BUFFER_SIZE):
+    """Open a file for binary reading, charging the bytes actually read from disk."""
+    return io.BufferedReader(_CountingFileIO(os.fspath(path), 'rb'), buffer_size=buffering)
+
+def run(cmd, **kwargs):
+    """subprocess.run that records the number and latency of spawned processes."""
+    started = time.perf_counter()
+    try:
+        return subprocess.run(cmd, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        with STATS.lock:
+            STATS.subprocess_calls += 1
+            STATS.subprocess_seconds += elapsed
+
+def copy_file(src, dst):
+    """shutil.copy2 charged to the 'copy' stage and the byte counters."""
+    import shutil
+
+    with stage('copy'):
+        shutil.copy2(src, dst)
+    size = os.path.getsize(dst)
+    add_bytes_read(size)
+    add_bytes_written(size)
+
+def add_arguments(parser):
+    """Add the shared --stats options to an argparse parser."""
+    parser.add_argument("--stats", action="store_true", help="Print a per-stage timing and I/O summary")
+    parser.add_argument("--stats-json", metavar="PATH", help="Write run metrics as JSON ('-' for stderr)")
+    parser.add_argument("--profile-stage", choices=STAGES, help="Capture a cProfile of one stage")
+    parser.add_argument("--profile-output", metavar="PATH", help="Where to dump the stage profile (default: <stage>.prof)")
+
+def configure(args):
+    """Reset the counters and start stage profiling if requested."""
+    STATS.reset()
+    if getattr(args, 'profile_stage', None):
+        import cProfile
+
+        STATS.profile_stage = args.profile_stage
+        STATS.profiler = cProfile.Profile()
+
+def _megabytes(n):
+    return n / (1024 * 1024)
+
+def format_report():
+    data = STATS.as_dict()
+    lines = [f"\n{'stage':12} {'calls':>9} {'total s':>10} {'mean ms':>10}"]
+    for name, timer in sorted(data['stages'].items(), key=lambda item: -item[1]['seconds']):
+        mean_ms = timer['seconds'] / timer['calls'] * 1000 if timer['calls'] else 0.0
+        lines.append(f"{name:12} {timer['calls']:>9} {timer['seconds']:>10.3f} {mean_ms:>10.2f}")
+    for name, value in sorted(data['counters'].items()):
+        lines.append(f"{name}: {value}")
+    lines.append(f"bytes read: {_megabytes(data['bytes_read']):.1f} MB, written: {_megabytes(data['bytes_written']):.1f} MB")
+    fetched = data['fetched']
+    if fetched['files']:
+        lines.append(f"fetched per file: {fetched['bytes'] / fetched['files'] / 1024:.1f} KB mean, "
+                     f"{fetched['max_bytes'] / 1024:.1f} KB max, {fetched['reads'] / fetched['files']:.1f} reads "
+                     f"({fetched['files']} files)")
+    calls = data['subprocess']['calls']
+    if calls:
+        lines.append(f"subprocesses: {calls}, {data['subprocess']['seconds']:.3f}s total, "
+                     f"{data['subprocess']['seconds'] / calls * 1000:.1f} ms mean")
+    lines.append(f"wall time: {data['wall_seconds']:.3f}s")
+    return "\n".join(lines)
+
+def report(args):
+    """Print or write whatever the --stats options asked for."""
+    if STATS.profiler is not None:
+        import pstats
+
+        profile_path = args.profile_output or f"{STATS.profile_stage}.prof"
+        STATS.profiler.dump_stats(profile_path)
+        print(f"\nProfile of stage '{STATS.profile_stage}' saved to {profile_path}")
+        pstats.Stats(STATS.profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(15)
+
+    if getattr(args, 'stats', False):
+        print(format_report())
+
+    stats_json = getattr(args, 'stats_json', None)
+    if stats_json:
+        payload = json.dumps(STATS.as_dict(), indent=2)
+        if stats_json == '-':
+            # stdout may be a CSV or other output being piped on
+            print(payload, file=sys.stderr)
+        else:
+            with open(stats_json, 'w', encoding='utf-8') as f:
+                f.write(payload)
@@ -0,0 +1,117 @@
+import os
+import sys
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+
+# gps_source values, stored as one byte per file
+SOURCES = (None, 'original', 'proxy', 'track', 'event')
+SOURCE_CODES = {name: code for code, name in enumerate(SOURCES)}
+
+class MediaTable:
+    """Scan results stored column-wise, one row per file.
+
+    Directories are interned once and file names packed into one UTF-8
+    buffer; capture times are int64 POSIX seconds and coordinates float64,
+    each with a validity mask. The numeric columns are exposed as numpy
+    views, so matching code reads and writes them in place.
+    """
+
+    def __init__(self):
+        self.dirs = []
+        self._dir_ids = {}
+        self._dir = array('I')
+        self._names = bytearray()
+        self._name_ends = array('q')
+        self._taken = array('q')
+        self._has_time = bytearray()
+        self._lat = array('d')
+        self._lon = array('d')
+        self._has_gps = bytearray()
+        self._source = bytearray()
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a table from {'path', 'datetime', 'gps'} dicts, as the catalog returns them."""
+        table = cls()
+        for record in records:
+            table.append(record['path'], record['datetime'], record['gps'])
+        return table
+
+    def append(self, path, taken_at, gps):
+        """Add one file; taken_at is an aware datetime or None, gps a (lat, lon) tuple or None."""
+        directory, name = os.path.split(path)
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self.dirs)
+            self.dirs.append(sys.intern(directory))
+        self._dir.append(dir_id)
+        self._names += name.encode('utf-8', 'surrogateescape')
+        self._name_ends.append(len(self._names))
+
+        self._taken.append(int(taken_at.timestamp()) if taken_at is not None else 0)
+        self._has_time.append(taken_at is not None)
+        self._lat.append(gps[0] if gps is not None else np.nan)
+        self._lon.append(gps[1] if gps is not None else np.nan)
+        self._has_gps.append(gps is not None)
+        self._source.append(SOURCE_CODES['original'] if gps is not None else 0)
+
+    def __len__(self):
+        return len(self._taken)
+
+    # Numeric columns as numpy views; writes through them change the table
+    @property
+    def taken(self):
+        return np.frombuffer(self._taken, dtype=np.int64)
+
+    @property
+    def has_time(self):
+        return np.frombuffer(self._has_time, dtype=np.bool_)
+
+    @property
+    def lat(self):
+        return np.frombuffer(self._lat, dtype=np.float64)
+
+    @property
+    def lon(self):
+        return np.frombuffer(self._lon, dtype=np.float64)
+
+    @property
+    def has_gps(self):
+        return np.frombuffer(self._has_gps, dtype=np.bool_)
+
+    @property
+    def source(self):
+        return np.frombuffer(self._source, dtype=np.uint8)
+
+    def path(self, i):
+        start = self._name_ends[i - 1] if i else 0
+        name = self._names[start:self._name_ends[i]].decode('utf-8', 'surrogateescape')
+        return os.path.join(self.dirs[self._dir[i]], name)
+
+    def datetime(self, i):
+        return datetime.fromtimestamp(self._taken[i], timezone.utc) if self._has_time[i] else None
+
+    def gps(self, i):
+        return (self._lat[i], self._lon[i]) if self._has_gps[i] else None
+
+    def source_name(self, i):
+        return SOURCES[self._source[i]]
+
+    def set_gps(self, rows, lats, lons, source):
+        """Assign coordinates to the given rows and record where they came from."""
+        self.lat[rows] = lats
+        self.lon[rows] = lons
+        self.has_gps[rows] = True
+        self.source[rows] = SOURCE_CODES[source]
+
+    def count(self, source):
+        return int(np.count_nonzero(self.source == SOURCE_CODES[source]))
+
+    def nbytes(self):
+        """Approximate memory held by the table, including the interned directory strings."""
+        buffers = (self._dir, self._names, self._name_ends, self._taken, self._has_time,
+                   self._lat, self._lon, self._has_gps, self._source)
+        return (sum(sys.getsizeof(b) for b in buffers) + sys.getsizeof(self.dirs) + sys.getsizeof(self._dir_ids)
+                + sum(sys.getsizeof(d) for d in self.dirs))
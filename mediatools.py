@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the mediatools scripts.
+
+Each subcommand runs one of the scripts in this folder with the remaining
+arguments, exactly as if it had been started directly. Nothing beyond the
+standard library is imported until a subcommand is chosen, and the scripts
+themselves import their heavy dependencies (PIL, exifread, mutagen, ...)
+only in the code paths that use them, so --help and no-op incremental runs
+start quickly.
+
+Usage:
+    python mediatools.py --help
+    python mediatools.py gps extract "X:/Photos" --output proxy.csv
+    python mediatools.py audit "/music" --albums-only
+"""
+
+import os
+import sys
+import runpy
+import importlib.util
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# subcommand -> (script, one-line description)
+COMMANDS = {
+    'audit': ('audio_tag_audit.py', "Audit album, artist, track and disc tags"),
+    'atmos': ('check_atmos.py', "Find MKV/MP4 files with Dolby Atmos audio"),
+    'catalog': ('media_catalog.py', "Build and inspect the shared media catalog"),
+    'classify-flac': ('classify_flac.py', "Classify FLAC albums by bit depth and sample rate"),
+    'dedupe': ('media_dedupe.py', "Report files with identical content"),
+    'find-no-gps': ('find_no_gps_media.py', "List JPG files without GPS metadata"),
+    'gps': ('update_media_gps-csv.py', "Extract proxy GPS to CSV, merge shards or write GPS back"),
+    'gps-fix': ('fix_media_gps.py', "Find media without GPS and write proxy GPS in one streaming pass"),
+    'gps-place': ('update_media_gps.py', "Geocode a place and write its coordinates into media files"),
+    'heic-to-jpg': ('convert_heic_to_jpg.py', "Convert HEIC photos to JPEG in parallel"),
+    'music-finder': ('music_finder.py', "Find music files matching a tracklist"),
+    'music-service': ('music_finder_service.py', "Serve tracklist matches from an in-memory index"),
+    'multidisc': ('plex_multidisc_organizer.py', "Flatten multi-disc albums into Plex folders"),
+    'places': ('reverse_geocoder.py', "Add city, region and country columns to a CSV of coordinates, offline"),
+    'plex-music': ('plex_music_organizer.py', "Copy music into the Plex folder layout"),
+    'rename': ('ren.py', "Rename or copy album tracks according to a tracklist"),
+    'speaker-test': ('organize_speaker_test_songs.py', "Organize FLAC speaker test songs as Artist - Title"),
+    'transcoding': ('check_videos_for_transcoding.py', "Find videos that need transcoding for Plex"),
+    'watch': ('watch_inbox.py', "Process new photos and music as they land in inbox folders"),
+}
+
+def load_script(filename):
+    """Import a script from this folder by file name (some names contain hyphens)."""
+    path = os.path.join(HERE, filename)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(filename)[0].replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def print_help():
+    print("usage: mediatools.py <command> [args...]\n")
+    print("commands:")
+    for name, (script, description) in COMMANDS.items():
+        print(f"  {name:15} {description} ({script})")
+    print("\nRun 'mediatools.py <command> --help' for the options of a command.")
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print_help()
+        return 0
+    command = COMMANDS.get(argv[0])
+    if command is None:
+        print(f"mediatools.py: unknown command '{argv[0]}'\n")
+        print_help()
+        return 2
+
+    script = os.path.join(HERE, command[0])
+    sys.argv = [f"mediatools.py {argv[0]}"] + argv[1:]
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    runpy.run_path(script, run_name='__main__')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
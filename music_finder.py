@@ -1,8 +1,9 @@
 import os
 import re
-import shutil
 from difflib import SequenceMatcher
 from typing import List, Dict, Tuple, Optional
+from audio_tags import read_tags
+import media_stats
 
 def read_tracklist(tracklist_path: str) -> List[Tuple[str, str]]:
     """Read the tracklist file and return a list of (artist, title) tuples."""
@@ -25,18 +26,29 @@ def read_tracklist(tracklist_path: str) -> List[Tuple[str, str]]:
     
     return tracks
 
+MUSIC_EXTENSIONS = ('.m4a', '.mp3', '.flac')
+
 def find_music_files(root_dir: str) -> List[str]:
     """Recursively find all music files in the directory tree."""
     music_files = []
-    extensions = ('.m4a', '.mp3', '.flac')
     
-    for dirpath, _, filenames in os.walk(root_dir):
+    for dirpath, _, filenames in media_stats.walk(root_dir):
         for filename in filenames:
-            if filename.lower().endswith(extensions):
+            if filename.lower().endswith(MUSIC_EXTENSIONS):
                 music_files.append(os.path.join(dirpath, filename))
     
     return music_files
 
+def build_tag_index(music_files: List[str]) -> Dict[str, str]:
+    """Read tags once per file and return a map of path -> 'artist title'."""
+    tag_index = {}
+    for filepath in music_files:
+        with media_stats.stage('metadata'):
+            tags = read_tags(filepath)
+        if tags is not None and tags.title:
+            tag_index[filepath] = f"{tags.artist or ''} {tags.title}".strip()
+    return tag_index
+
 def normalize_string(s: str) -> str:
     """Normalize a string for comparison by removing special characters and lowercase."""
     s = s.lower()
@@ -48,7 +60,8 @@ def similar(a: str, b: str) -> float:
     """Return a similarity ratio between two strings."""
     return SequenceMatcher(None, normalize_string(a), normalize_string(b)).ratio()
 
-def find_best_match(track: Tuple[str, str], music_files: List[str], min_similarity: float = 0.7) -> Optional[str]:
+def find_best_match(track: Tuple[str, str], music_files: List[str], min_similarity: float = 0.7,
+                    tag_index: Optional[Dict[str, str]] = None) -> Optional[str]:
     """Find the best matching music file for the given track."""
     artist, title = track
     best_match = None
@@ -66,6 +79,10 @@ def find_best_match(track: Tuple[str, str], music_files: List[str], min_similari
         
         # Use the higher of the two similarity scores
         current_score = max(filename_similarity, title_similarity)
+
+        # Also compare against the file's own tags when they were indexed
+        if tag_index and filepath in tag_index:
+            current_score = max(current_score, similar(tag_index[filepath], track_pattern))
         
         if current_score > best_score and current_score >= min_similarity:
             best_score = current_score
@@ -73,6 +90,23 @@ def find_best_match(track: Tuple[str, str], music_files: List[str], min_similari
     
     return best_match if best_score >= min_similarity else None
 
+def query_service(server_url: str, tracks: List[Tuple[str, str]], root: str, min_similarity: float = 0.7,
+                  match_tags: bool = False) -> List[Optional[str]]:
+    """Match a tracklist against a running music_finder_service; one path or None per track."""
+    import json
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+
+    payload = json.dumps({'tracks': tracks, 'root': os.path.abspath(root),
+                          'min_similarity': min_similarity, 'match_tags': match_tags}).encode('utf-8')
+    request = Request(server_url.rstrip('/') + '/match', data=payload,
+                      headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(request) as response:
+            return json.loads(response.read())['matches']
+    except HTTPError as e:
+        raise RuntimeError(json.loads(e.read()).get('error', str(e)))
+
 def ask_user_permission(source_path: str, dest_folder: str) -> bool:
     """Ask user whether to copy the file or skip."""
     filename = os.path.basename(source_path)
@@ -89,10 +123,16 @@ def ask_user_permission(source_path: str, dest_folder: str) -> bool:
             return False
         print("Please answer 'y' or 'n'")
 
-def copy_file_with_overwrite_check(source_path: str, dest_folder: str) -> bool:
+def copy_file_with_overwrite_check(source_path: str, dest_folder: str, content_index=None) -> bool:
     """Copy file to destination with overwrite check."""
     filename = os.path.basename(source_path)
     dest_path = os.path.join(dest_folder, filename)
+
+    if content_index is not None:
+        existing = content_index.find(source_path)
+        if existing:
+            print(f"Skipping: same content already present as {existing}")
+            return False
     
     if os.path.exists(dest_path):
         print(f"Warning: {filename} already exists in destination!")
@@ -105,8 +145,10 @@ def copy_file_with_overwrite_check(source_path: str, dest_folder: str) -> bool:
             print("Please answer 'y' or 'n'")
     
     try:
-        shutil.copy2(source_path, dest_path)
+        media_stats.copy_file(source_path, dest_path)
         print(f"Successfully copied to {dest_path}")
+        if content_index is not None:
+            content_index.add(dest_path)
         return True
     except Exception as e:
         print(f"Error copying file: {e}")
@@ -123,8 +165,17 @@ def main():
                        help='Minimum similarity threshold (0.0-1.0)')
     parser.add_argument('--auto-copy', action='store_true',
                        help='Automatically copy files without asking (use with caution)')
+    parser.add_argument('--match-tags', action='store_true',
+                       help='Also match against artist/title tags, not just filenames')
+    parser.add_argument('--catalog', help='Query a media catalog database instead of walking the directory')
+    parser.add_argument('--server', metavar='URL',
+                       help='Match against a running music_finder_service (e.g. http://127.0.0.1:8765) instead of walking the directory')
+    parser.add_argument('--skip-duplicates', action='store_true',
+                       help='Do not copy files whose content is already in the tracklist folder')
+    media_stats.add_arguments(parser)
     
     args = parser.parse_args()
+    media_stats.configure(args)
     
     # Get the folder containing the tracklist file
     tracklist_folder = os.path.dirname(os.path.abspath(args.tracklist))
@@ -133,24 +184,63 @@ def main():
     tracks = read_tracklist(args.tracklist)
     print(f"Found {len(tracks)} tracks in the tracklist.")
     
-    print(f"Searching for music files in {args.directory}...")
-    music_files = find_music_files(args.directory)
-    print(f"Found {len(music_files)} music files to search through.")
+    tag_index = None
+    music_files = []
+    service_matches = None
+    if args.server:
+        print(f"Matching against the index served at {args.server}...")
+        try:
+            with media_stats.stage('match'):
+                service_matches = query_service(args.server, tracks, args.directory,
+                                                args.min_similarity, args.match_tags)
+        except (OSError, RuntimeError) as e:
+            print(f"Error: matcher service failed: {e}")
+            return
+    elif args.catalog:
+        from media_catalog import open_catalog, query_paths, query_tags
+
+        print(f"Querying catalog {args.catalog} for music files in {args.directory}...")
+        conn = open_catalog(args.catalog)
+        music_files = query_paths(conn, args.directory, MUSIC_EXTENSIONS)
+        if args.match_tags:
+            tag_index = {tags.path: f"{tags.artist or ''} {tags.title}".strip()
+                         for tags in query_tags(conn, args.directory, MUSIC_EXTENSIONS) if tags.title}
+        conn.close()
+    else:
+        print(f"Searching for music files in {args.directory}...")
+        music_files = find_music_files(args.directory)
+        if args.match_tags:
+            print("Reading tags...")
+            tag_index = build_tag_index(music_files)
+    if service_matches is None:
+        print(f"Found {len(music_files)} music files to search through.")
+    if tag_index is not None:
+        print(f"Read tags from {len(tag_index)} files.")
     
+    content_index = None
+    if args.skip_duplicates:
+        from media_dedupe import ContentIndex
+
+        content_index = ContentIndex([tracklist_folder], MUSIC_EXTENSIONS)
+
     print("\nMatching tracks to files:")
     results = []
     copied_files = 0
     
-    for artist, title in tracks:
+    for i, (artist, title) in enumerate(tracks):
         track = (artist, title)
-        match = find_best_match(track, music_files, args.min_similarity)
+        if service_matches is not None:
+            match = service_matches[i]
+        else:
+            with media_stats.stage('match'):
+                match = find_best_match(track, music_files, args.min_similarity, tag_index)
         
         if match:
             status = f"FOUND: {match}"
             results.append(f"{artist} - {title}: {match}")
             
             if args.auto_copy or ask_user_permission(match, tracklist_folder):
-                if copy_file_with_overwrite_check(match, tracklist_folder):
+                if copy_file_with_overwrite_check(match, tracklist_folder, content_index):
                     copied_files += 1
         else:
             status = "NOT FOUND"
@@ -158,12 +248,16 @@ def main():
         
         print(f"{artist} - {title}: {status}")
     
+    if content_index is not None:
+        content_index.close()
+
     if args.output:
         with open(args.output, 'w', encoding='utf-8') as f:
             f.write("\n".join(results))
         print(f"\nResults written to {args.output}")
     
     print(f"\nOperation complete. Copied {copied_files} files to {tracklist_folder}")
+    media_stats.report(args)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Keep a music library index in memory and match tracklists against it over HTTP.
+
+music_finder.py walks the whole library before it can match a single line.
+This service walks it once, keeps each file's normalized name (and tags, with
+--match-tags) in memory and rescans incrementally in the background: a
+directory whose mtime is unchanged is not listed again, and tags are only
+re-read for new or modified files. Names are also indexed by character
+trigram, so a match only scores the files sharing some of its text instead
+of the whole library. music_finder.py --server sends its
+tracklist here and gets the matches back without touching the library.
+
+The service listens on localhost only.
+
+Usage:
+    python music_finder_service.py "/mnt/nas/Music" --port 8765 --rescan-interval 600
+    python music_finder.py "/mnt/nas/Music" --tracklist list.txt --server http://127.0.0.1:8765
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+from difflib import SequenceMatcher
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import media_stats
+from audio_tags import read_tags
+from music_finder import MUSIC_EXTENSIONS, normalize_string
+
+DEFAULT_PORT = 8765
+
+def trigrams(text):
+    """The distinct three-character substrings of a normalized name, padded with a space each side."""
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class LibraryIndex:
+    """Normalized file names (and tags) of every music file below root, kept current by rescans."""
+
+    def __init__(self, root, match_tags=False):
+        self.root = os.path.abspath(root)
+        self.match_tags = match_tags
+        # directory -> (mtime_ns, subdirectories, music file names)
+        self._dirs = {}
+        # path -> (size, mtime_ns, normalized stem, normalized 'artist title' or None)
+        self._files = {}
+        self.entries = []
+        # trigram -> numpy array of entry numbers, rebuilt with entries
+        self.postings = {}
+        self.scanned_at = None
+        self._rescan_lock = threading.Lock()
+
+    def _list_dir(self, directory):
+        """Subdirectories and music files of a directory, reusing the last listing if it is unchanged."""
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return [], []
+        cached = self._dirs.get(directory)
+        if cached is not None and cached[0] == mtime_ns:
+            media_stats.count('dirs_unchanged')
+            return cached[1], cached[2]
+
+        subdirs, files = [], []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.name.lower().endswith(MUSIC_EXTENSIONS):
+                        files.append(entry.name)
+        except OSError:
+            return [], []
+        media_stats.count('dirs_listed')
+        self._dirs[directory] = (mtime_ns, subdirs, files)
+        return subdirs, files
+
+    def _entry(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        cached = self._files.get(path)
+        if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+            return cached
+
+        tag_text = None
+        if self.match_tags:
+            with media_stats.stage('metadata'):
+                tags = read_tags(path)
+            if tags is not None and tags.title:
+                tag_text = normalize_string(f"{tags.artist or ''} {tags.title}".strip())
+        media_stats.count('files_indexed')
+        return (st.st_size, st.st_mtime_ns, normalize_string(os.path.splitext(os.path.basename(path))[0]), tag_text)
+
+    def rescan(self):
+        """Bring the index up to date; returns the number of files in it."""
+        with self._rescan_lock:
+            started = time.perf_counter()
+            files = {}
+            dirs_seen = set()
+            stack = [self.root]
+            # Depth-first in listing order, like os.walk, so equal scores resolve to the same file as the CLI
+            while stack:
+                directory = stack.pop()
+                dirs_seen.add(directory)
+                subdirs, names = self._list_dir(directory)
+                for name in names:
+                    path = os.path.join(directory, name)
+                    entry = self._entry(path)
+                    if entry is not None:
+                        files[path] = entry
+                stack.extend(os.path.join(directory, d) for d in reversed(subdirs))
+
+            self._dirs = {d: listing for d, listing in self._dirs.items() if d in dirs_seen}
+            self._files = files
+            entries = [(path, stem, tag_text) for path, (_, _, stem, tag_text) in files.items()]
+            # An unchanged library, the usual case for a periodic rescan, keeps its trigram index
+            postings = self.postings if entries == self.entries else self._build_postings(entries)
+            # Swapped in one assignment so matches running meanwhile see either the old or the new index
+            self.entries, self.postings = entries, postings
+            self.scanned_at = time.time()
+            print(f"Indexed {len(self.entries)} music files in {time.perf_counter() - started:.1f}s")
+            return len(self.entries)
+
+    @staticmethod
+    def _build_postings(entries):
+        import numpy as np
+
+        postings = {}
+        for i, (_, stem, tag_text) in enumerate(entries):
+            grams = trigrams(stem)
+            if tag_text is not None:
+                grams |= trigrams(tag_text)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        return {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    @staticmethod
+    def _shortlist(entries, postings, grams):
+        """Numbers of the entries sharing one of grams, those sharing the most first."""
+        import numpy as np
+
+        lists = [postings[gram] for gram in grams if gram in postings]
+        if not lists:
+            return []
+        shared = np.bincount(np.concatenate(lists), minlength=len(entries))
+        candidates = np.flatnonzero(shared)
+        # Likely matches first, so best_score rises early and quick_ratio rejects the rest
+        return candidates[np.argsort(-shared[candidates], kind='stable')].tolist()
+
+    def match(self, artist, title, min_similarity=0.7, match_tags=False, root=None):
+        """The music_finder.find_best_match result for one track, against the in-memory index.
+
+        Only files sharing a trigram with the track are scored; a name with
+        none in common is far below any useful similarity threshold. Of equally good
+        files the first in listing order wins, as in the CLI.
+        """
+        entries, postings = self.entries, self.postings
+        prefix = os.path.join(os.path.abspath(root), '') if root else None
+        pattern = SequenceMatcher(None, '', normalize_string(f"{artist} {title}"))
+        title_only = SequenceMatcher(None, '', normalize_string(title))
+        tag_pattern = SequenceMatcher(None, '', pattern.b)
+
+        best_match, best_score, best_i = None, 0, len(entries)
+        for i in self._shortlist(entries, postings, trigrams(pattern.b) | trigrams(title_only.b)):
+            path, stem, tag_text = entries[i]
+            if prefix and not path.startswith(prefix):
+                continue
+            candidates = [(pattern, stem), (title_only, stem)]
+            if match_tags and tag_text is not None:
+                candidates.append((tag_pattern, tag_text))
+            for matcher, text in candidates:
+                matcher.set_seq1(text)
+                # real_quick_ratio and quick_ratio are upper bounds of ratio, so most files are rejected
+                # from their lengths or letters without the full diff
+                floor = max(best_score, min_similarity)
+                if matcher.real_quick_ratio() < floor or matcher.quick_ratio() < floor:
+                    continue
+                score = matcher.ratio()
+                if score >= min_similarity and (score > best_score or (score == best_score and i < best_i)):
+                    best_score, best_match, best_i = score, path, i
+        return best_match
+
+class MatchHandler(BaseHTTPRequestHandler):
+    """JSON endpoints: GET /status, POST /match and POST /rescan."""
+
+    index = None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/status':
+            self._send(404, {'error': 'not found'})
+            return
+        self._send(200, {'root': self.index.root, 'files': len(self.index.entries),
+                         'match_tags': self.index.match_tags, 'scanned_at': self.index.scanned_at})
+
+    def do_POST(self):
+        if self.path == '/rescan':
+            self._send(200, {'files': self.index.rescan()})
+            return
+        if self.path != '/match':
+            self._send(404, {'error': 'not found'})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            tracks = request['tracks']
+            min_similarity = float(request.get('min_similarity', 0.7))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {'error': f"bad request: {e}"})
+            return
+
+        match_tags = bool(request.get('match_tags'))
+        if match_tags and not self.index.match_tags:
+            self._send(400, {'error': 'the service was started without --match-tags'})
+            return
+        root = request.get('root')
+        if root and os.path.commonpath([os.path.abspath(root), self.index.root]) != self.index.root:
+            self._send(400, {'error': f"{root} is outside the indexed library {self.index.root}"})
+            return
+
+        started = time.perf_counter()
+        matches = [self.index.match(artist, title, min_similarity, match_tags, root) for artist, title in tracks]
+        self._send(200, {'matches': matches, 'seconds': time.perf_counter() - started})
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} {format % args}")
+
+def rescan_periodically(index, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            index.rescan()
+        except Exception as e:
+            print(f"Rescan failed: {e}")
+
+def serve(index, port=DEFAULT_PORT, rescan_interval=600):
+    index.rescan()
+    if rescan_interval:
+        threading.Thread(target=rescan_periodically, args=(index, rescan_interval), daemon=True).start()
+
+    handler = type('BoundMatchHandler', (MatchHandler,), {'index': index})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    print(f"Serving matches for {index.root} on http://127.0.0.1:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve music_finder tracklist matches from an in-memory library index.")
+    parser.add_argument("directory", help="Music library to index")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on (localhost only)")
+    parser.add_argument("--rescan-interval", type=float, default=600,
+                        help="Seconds between incremental rescans (0 to rescan only on POST /rescan)")
+    parser.add_argument("--match-tags", action="store_true", help="Also index artist/title tags")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: Directory not found - {args.directory}")
+        return
+
+    serve(LibraryIndex(args.directory, match_tags=args.match_tags), port=args.port,
+          rescan_interval=args.rescan_interval)
+
+if __name__ == "__main__":
+    main()
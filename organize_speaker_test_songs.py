@@ -7,11 +7,9 @@ Usage:
 """
 
 import os
-import shutil
 import re
-from fuzzywuzzy import fuzz
 from datetime import datetime
-import mutagen.flac
+import media_stats
 
 # Bang & Olufsen recommended songs by category
 GROUPINGS = {
@@ -53,8 +51,11 @@ def clean_filename(name):
 
 def get_audio_quality(file_path):
     """Get quality metrics from FLAC file."""
+    import mutagen.flac
+
     try:
-        audio = mutagen.flac.FLAC(file_path)
+        with media_stats.stage('metadata'):
+            audio = mutagen.flac.FLAC(file_path)
         return {
             'bit_depth': audio.info.bits_per_sample,
             'sample_rate': audio.info.sample_rate,
@@ -67,11 +68,13 @@ def get_audio_quality(file_path):
 
 def find_best_flac_matches(source_dir):
     """Find best quality FLAC matches for recommended songs."""
+    from fuzzywuzzy import fuzz
+
     song_matches = {}
     
     # First pass: find all potential matches
     potential_matches = {}
-    for root, _, files in os.walk(source_dir):
+    for root, _, files in media_stats.walk(source_dir):
         for file in files:
             if file.lower().endswith('.flac'):
                 file_path = os.path.join(root, file)
@@ -160,7 +163,7 @@ def organize_flac_songs(matches, destination_dir):
                 dest_path = os.path.join(group_folder, new_filename)
                 
                 # Copy file with new name
-                shutil.copy2(match['original_path'], dest_path)
+                media_stats.copy_file(match['original_path'], dest_path)
                 
                 # Write to reference file
                 f.write(f"\n* {match['artist']} - {match['title']}\n")
@@ -178,14 +181,20 @@ def organize_flac_songs(matches, destination_dir):
 
 def main():
     import sys
+    import argparse
     
-    if len(sys.argv) != 3:
-        print('Usage: python organize_speaker_test_songs.py "source_directory" "destination_directory"')
-        print('Note: Paths with spaces or special characters must be quoted')
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Organize FLAC speaker test songs with standardized naming (Artist - Title).",
+        epilog="Note: Paths with spaces or special characters must be quoted"
+    )
+    parser.add_argument("source_directory", help="Directory to search for FLAC files")
+    parser.add_argument("destination_directory", help="Directory the organized selection is written to")
+    media_stats.add_arguments(parser)
+    args = parser.parse_args()
+    media_stats.configure(args)
     
-    source_dir = os.path.abspath(sys.argv[1])
-    destination_dir = os.path.abspath(sys.argv[2])
+    source_dir = os.path.abspath(args.source_directory)
+    destination_dir = os.path.abspath(args.destination_directory)
     
     if not os.path.isdir(source_dir):
         print(f"Error: Source directory does not exist: {source_dir}")
@@ -204,6 +213,7 @@ def main():
     print("\nOrganization complete!")
     print(f"Results saved to: {output_dir}")
     print("Quality reference file created: 00_Quality_Reference.txt")
+    media_stats.report(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
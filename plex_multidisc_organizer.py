@@ -1,45 +1,44 @@
 import os
 import re
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from mutagen import File
-from mutagen.easyid3 import EasyID3
-from mutagen.flac import FLAC
-from mutagen.mp4 import MP4
+from audio_tags import read_tags, write_album
+import media_stats
 
 def is_music_file(filename):
     music_extensions = {'.mp3', '.flac', '.m4a', '.wav', '.aac', '.ogg', '.wma'}
     return Path(filename).suffix.lower() in music_extensions
 
+DISC_SUFFIX_PATTERNS = [
+    re.compile(r'\s*\(?\s*(CD|Disc)\s*\d+\s*\)?', re.IGNORECASE),
+    re.compile(r'\s*\[?\s*(CD|Disc)\s*\d+\s*\]?', re.IGNORECASE),
+    re.compile(r'\s*-\s*(CD|Disc)\s*\d+', re.IGNORECASE),
+    re.compile(r'\s*(CD|Disc)\s*\d+', re.IGNORECASE),
+]
+
 def clean_album_name(album_name):
-    patterns = [
-        r'\s*\(?\s*(CD|Disc)\s*\d+\s*\)?',
-        r'\s*\[?\s*(CD|Disc)\s*\d+\s*\]?',
-        r'\s*-\s*(CD|Disc)\s*\d+',
-        r'\s*(CD|Disc)\s*\d+'
-    ]
-    for pattern in patterns:
-        album_name = re.sub(pattern, '', album_name, flags=re.IGNORECASE)
+    for pattern in DISC_SUFFIX_PATTERNS:
+        album_name = pattern.sub('', album_name)
     return album_name.strip()
 
-def clean_album_metadata(file_path):
+def _rewrite_album(job):
+    file_path, album = job
     try:
-        audio = File(file_path, easy=True)
-        if audio is None:
-            print(f"Unsupported format: {file_path}")
-            return None
-
-        album_tag = audio.get('album', [None])[0]
-        if album_tag:
-            cleaned_album = clean_album_name(album_tag)
-            if cleaned_album != album_tag:
-                print(f"Updating album tag: '{album_tag}' -> '{cleaned_album}'")
-                audio['album'] = cleaned_album
-                audio.save()
-            return cleaned_album
+        with media_stats.stage('write'):
+            write_album(file_path, album)
+        print(f"Updated album tag: {file_path.name} -> '{album}'")
+        return True
     except Exception as e:
         print(f"Failed to clean album tag for {file_path}: {e}")
-    return None
+        return False
+
+def rewrite_album_tags(jobs, max_workers=None):
+    """Write (path, album) pairs across a thread pool; returns the number written."""
+    if not jobs:
+        return 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return sum(executor.map(_rewrite_album, jobs))
 
 def plex_compliant_filename(track_number, title, disc_number=None):
     invalid_chars = r'[<>:"/\\|?*\x00-\x1f]'
@@ -51,53 +50,169 @@ def plex_compliant_filename(track_number, title, disc_number=None):
     else:
         return f"{track_num} - {title}"
 
-def process_disc_folder(disc_path, dest_album_path, disc_number):
-    for file in disc_path.iterdir():
-        if file.is_file() and is_music_file(file.name):
-            cleaned_album_name = clean_album_metadata(file)
-            if not cleaned_album_name:
-                continue
+DISC_FOLDER_RE = re.compile(r'(?i)(cd|disc)\s*(\d+)')
+TRACK_FILENAME_RE = re.compile(r'(\d+)\s*[-.]?\s*(.+?)(?:\..+)?$')
 
-            # Try to parse track number and title
-            track_match = re.match(r'(\d+)\s*[-.]?\s*(.+?)(?:\..+)?$', file.stem)
-            if not track_match:
-                print(f"Skipping unrecognized filename: {file.name}")
-                continue
+def plan_disc_folder(disc_path, dest_album_path, disc_number, plan):
+    """Add the placement of every file in a disc folder to the plan."""
+    # Tracks of one disc nearly always share their album tag, so each distinct
+    # value is cleaned once and every file is compared against the result.
+    cleaned_names = {}
 
-            track_number = track_match.group(1)
-            title = track_match.group(2).strip()
-            new_filename = plex_compliant_filename(track_number, title, disc_number) + file.suffix
-            dest_file_path = dest_album_path / new_filename
+    with media_stats.stage('walk'):
+        files = sorted(disc_path.rglob('*'))
 
-            shutil.move(str(file), str(dest_file_path))
-            print(f"Moved: {file.name} -> {new_filename}")
+    for file in files:
+        if not file.is_file():
+            continue
+        # Anything that is not a recognised track keeps its place in the disc folder
+        dest_file_path = dest_album_path / disc_path.name / file.relative_to(disc_path)
+        retag = None
+
+        if file.parent == disc_path and is_music_file(file.name):
+            with media_stats.stage('metadata'):
+                tags = read_tags(file)
+            if tags is None or not tags.album:
+                print(f"Keeping in disc folder (no album tag): {file.name}")
+            else:
+                if tags.album not in cleaned_names:
+                    cleaned_names[tags.album] = clean_album_name(tags.album)
+                if cleaned_names[tags.album] != tags.album:
+                    retag = cleaned_names[tags.album]
+                track_match = TRACK_FILENAME_RE.match(file.stem)
+                if not track_match:
+                    print(f"Skipping unrecognized filename: {file.name}")
+                else:
+                    track_number = track_match.group(1)
+                    title = track_match.group(2).strip()
+                    new_filename = plex_compliant_filename(track_number, title, disc_number) + file.suffix
+                    dest_file_path = dest_album_path / new_filename
+
+        plan.append({'src': file, 'dst': dest_file_path, 'retag': retag})
+
+def plan_album_directory(original_album_path, processed_root):
+    """Compute the full target layout of an album without touching the disk."""
+    dest_album_path = processed_root / original_album_path.name
+    plan = []
+
+    for item in sorted(original_album_path.iterdir()):
+        disc_match = DISC_FOLDER_RE.search(item.name) if item.is_dir() else None
+        if disc_match:
+            plan_disc_folder(item, dest_album_path, disc_match.group(2), plan)
+        elif item.is_dir():
+            for file in sorted(item.rglob('*')):
+                if file.is_file():
+                    plan.append({'src': file, 'dst': dest_album_path / file.relative_to(original_album_path), 'retag': None})
+        elif item.is_file():
+            plan.append({'src': item, 'dst': dest_album_path / item.name, 'retag': None})
+
+    # Two sources must never be placed on the same target
+    seen = {}
+    for step in plan:
+        key = str(step['dst']).lower()
+        if key in seen:
+            print(f"Collision: {step['src']} and {seen[key]} both map to {step['dst']}; keeping the first")
+            step['dst'] = None
+        else:
+            seen[key] = step['src']
+    return [step for step in plan if step['dst'] is not None]
 
+def print_plan(plan):
+    for step in plan:
+        note = f" (album -> '{step['retag']}')" if step['retag'] else ""
+        print(f"  {step['src']} -> {step['dst']}{note}")
+
+def _is_current(src, dst, retag=None):
+    """A target at least as new as its source, with its album tag already cleaned, was placed by a previous run.
+
+    The tag is checked because a copy whose retag failed is just as new as one
+    that succeeded, and must be retried.
+    """
     try:
-        if not any(disc_path.iterdir()):
-            disc_path.rmdir()
-            print(f"Removed empty folder: {disc_path}")
-    except Exception as e:
-        print(f"Could not remove {disc_path}: {e}")
+        if dst.stat().st_mtime < src.stat().st_mtime:
+            return False
+    except FileNotFoundError:
+        return False
+    if retag:
+        tags = read_tags(dst)
+        return tags is not None and tags.album == retag
+    return True
+
+def execute_plan(plan, move=False, max_workers=None):
+    """Carry out a plan with one rename or one copy per file, then rewrite changed album tags."""
+    created_dirs = set()
+    retag_jobs = []
+    for step in plan:
+        src, dst = step['src'], step['dst']
+        if not move and _is_current(src, dst, step['retag']):
+            print(f"Up to date: {dst.name}")
+            continue
+        if move and dst.exists():
+            media_stats.count('target_exists')
+            print(f"Not moving {src}: {dst} already exists")
+            continue
+
+        if dst.parent not in created_dirs:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            created_dirs.add(dst.parent)
+
+        try:
+            if move:
+                with media_stats.stage('copy'):
+                    try:
+                        os.replace(src, dst)
+                    except OSError:
+                        # Different filesystem: fall back to copy and delete
+                        shutil.move(str(src), str(dst))
+                print(f"Moved: {src.name} -> {dst.name}")
+            else:
+                media_stats.copy_file(src, dst)
+                print(f"Copied: {src.name} -> {dst.name}")
+        except OSError as e:
+            print(f"Failed to place {src}: {e}")
+            continue
 
-def process_album_directory(original_album_path, processed_root):
-    relative_path = original_album_path.relative_to(original_album_path.parent)
-    dest_album_path = processed_root / relative_path
+        if step['retag']:
+            retag_jobs.append((dst, step['retag']))
 
-    if dest_album_path.exists():
-        print(f"Removing previous copy at: {dest_album_path}")
-        shutil.rmtree(dest_album_path, onerror=on_rm_error)
+    rewrite_album_tags(retag_jobs, max_workers)
 
-    print(f"Copying album to: {dest_album_path}")
-    shutil.copytree(original_album_path, dest_album_path)
+def remove_empty_dirs(path):
+    """Remove directories left empty after a move, deepest first."""
+    for dirpath in sorted((d for d in path.rglob('*') if d.is_dir()), key=lambda d: len(d.parts), reverse=True):
+        try:
+            if not any(dirpath.iterdir()):
+                dirpath.rmdir()
+                print(f"Removed empty folder: {dirpath}")
+        except Exception as e:
+            print(f"Could not remove {dirpath}: {e}")
+
+def process_album_directory(original_album_path, processed_root, move=False, dry_run=False, max_workers=None):
+    plan = plan_album_directory(original_album_path, processed_root)
+
+    if dry_run:
+        print(f"Planned {len(plan)} file(s) for {original_album_path.name}:")
+        print_plan(plan)
+        return
 
-    for item in dest_album_path.iterdir():
-        if item.is_dir() and re.search(r'(?i)(cd|disc)\s*(\d+)', item.name):
-            disc_number = re.search(r'(?i)(cd|disc)\s*(\d+)', item.name).group(2)
-            print(f"Processing disc folder: {item.name}")
-            process_disc_folder(item, dest_album_path, disc_number)
+    execute_plan(plan, move=move, max_workers=max_workers)
+    if move:
+        remove_empty_dirs(original_album_path)
 
 def main():
-    target_dir = input("Enter the directory path containing albums: ").strip()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Flatten multi-disc albums into Plex-compliant folders.")
+    parser.add_argument("directory", nargs="?", help="Directory containing albums (prompted for if omitted)")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the planned layout")
+    parser.add_argument("--move", action="store_true",
+                        help="Rename files into place instead of copying (the source album is not preserved)")
+    parser.add_argument("--workers", type=int, default=None, help="Threads used to rewrite album tags")
+    media_stats.add_arguments(parser)
+    args = parser.parse_args()
+    media_stats.configure(args)
+
+    target_dir = args.directory or input("Enter the directory path containing albums: ").strip()
     target_path = Path(target_dir)
 
     if not target_path.is_dir():
@@ -105,23 +220,26 @@ def main():
         return
 
     processed_root = target_path / "processed"
-    processed_root.mkdir(exist_ok=True)
+    if not args.dry_run:
+        processed_root.mkdir(exist_ok=True)
 
     for album_dir in target_path.iterdir():
         if not album_dir.is_dir() or album_dir.name.lower() == "processed":
             continue
 
         has_disc_folders = any(
-            d.is_dir() and re.search(r'(?i)(cd|disc)\s*\d+', d.name) for d in album_dir.iterdir()
+            d.is_dir() and DISC_FOLDER_RE.search(d.name) for d in album_dir.iterdir()
         )
 
         if has_disc_folders:
             print(f"\nProcessing album: {album_dir.name}")
-            process_album_directory(album_dir, processed_root)
+            process_album_directory(album_dir, processed_root, move=args.move, dry_run=args.dry_run,
+                                    max_workers=args.workers)
         else:
             print(f"\nSkipping album without disc folders: {album_dir.name}")
 
     print("\nAll processing complete.")
+    media_stats.report(args)
 
 if __name__ == "__main__":
     main()
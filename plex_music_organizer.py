@@ -1,67 +1,270 @@
 import os
-import shutil
-from mutagen import File
-from mutagen.easyid3 import EasyID3
 from pathlib import Path
 import re
+from collections import defaultdict
+from audio_tags import read_tags
+import media_stats
 
 SUPPORTED_FORMATS = ['.mp3', '.flac', '.m4a', '.ogg', '.wav']
+TOOL_NAME = 'plex_organizer'
 
 def sanitize_name(name):
     """Remove invalid characters for filenames."""
     return re.sub(r'[\\/*?:"<>|]', '_', name.strip())
 
 def get_metadata(filepath):
-    """Extract metadata using mutagen."""
-    try:
-        audio = EasyID3(filepath)
-    except Exception:
-        audio = File(filepath)
-        if not audio or not audio.tags:
-            return None
-
-    artist = audio.get('artist', [None])[0]
-    album = audio.get('album', [None])[0]
-    title = audio.get('title', [None])[0]
-    track = audio.get('tracknumber', [None])[0]
-
-    if track:
-        track = track.split('/')[0].zfill(2)
+    """Extract metadata using a single tag parse."""
+    with media_stats.stage('metadata'):
+        tags = read_tags(filepath)
+    if tags is None:
+        return None
+    return metadata_from_tags(tags)
 
+def metadata_from_tags(tags):
+    """Turn an AudioTags record into the organizer's metadata dict."""
+    track = tags.track.zfill(2) if tags.track else None
     return {
-        'artist': sanitize_name(artist) if artist else "Unknown Artist",
-        'album': sanitize_name(album) if album else "Unknown Album",
-        'title': sanitize_name(title) if title else Path(filepath).stem,
-        'track': track if track else "00"
+        'artist': sanitize_name(tags.artist) if tags.artist else "Unknown Artist",
+        'album': sanitize_name(tags.album) if tags.album else "Unknown Album",
+        'title': sanitize_name(tags.title) if tags.title else Path(tags.path).stem,
+        'track': track if track else "00",
+        'disc': tags.disc if tags.disc and tags.disc.isdigit() else None
     }
 
-def organize_music(source_dir, dest_dir):
-    for root, _, files in os.walk(source_dir):
+def iter_source_metadata(source_dir, catalog_path=None):
+    """Yield (path, metadata) for every supported file, from disk or from the catalog."""
+    if catalog_path:
+        from media_catalog import open_catalog, query_tags
+
+        conn = open_catalog(catalog_path)
+        try:
+            for tags in query_tags(conn, source_dir, SUPPORTED_FORMATS):
+                yield tags.path, metadata_from_tags(tags)
+        finally:
+            conn.close()
+        return
+
+    for root, _, files in media_stats.walk(source_dir):
         for file in files:
-            ext = Path(file).suffix.lower()
-            if ext not in SUPPORTED_FORMATS:
+            if Path(file).suffix.lower() not in SUPPORTED_FORMATS:
                 continue
-
             src_file = os.path.join(root, file)
-            metadata = get_metadata(src_file)
+            yield src_file, get_metadata(src_file)
 
-            if not metadata:
-                print(f"Skipping: {src_file} (No metadata)")
-                continue
+def destination_name(metadata, ext, with_disc=False):
+    """Plex file name of a track; with_disc prefixes the disc number as in '101 - Title'."""
+    if with_disc and metadata.get('disc'):
+        return f"{metadata['disc']}{metadata['track']} - {metadata['title']}{ext}"
+    return f"{metadata['track']} - {metadata['title']}{ext}"
+
+def _key(path):
+    # Plex libraries often live on case-insensitive shares
+    return os.path.normcase(path).casefold()
 
-            artist = metadata['artist']
-            album = metadata['album']
-            track = metadata['track']
-            title = metadata['title']
+def _numbered(path, n):
+    base, ext = os.path.splitext(path)
+    return f"{base} ({n}){ext}"
+
+def _is_name_for(name, metadata, ext):
+    """Whether a file name is one plan_destinations could give this track."""
+    for candidate in (destination_name(metadata, ext), destination_name(metadata, ext, with_disc=True)):
+        base = os.path.splitext(candidate)[0]
+        if name == candidate or re.fullmatch(re.escape(base) + r' \(\d+\)' + re.escape(ext), name):
+            return True
+    return False
+
+def plan_destinations(sources, dest_dir, manifest=None):
+    """Map every (src, metadata) to a distinct destination path, returned as {dest: src}.
+
+    Tracks that clean to the same "{track} - {title}" are told apart by their
+    disc number first and by a " (n)" suffix when that is not enough. A track
+    the manifest says was copied earlier keeps that copy's name while it is
+    still valid for the track, so a colliding track added later does not
+    move it.
+    """
+    previous = {}
+    for dest, (_, _, recorded) in (manifest or {}).items():
+        previous[recorded['src']] = dest
+
+    plan = {}
+    taken = set()
+    groups = defaultdict(list)
+    for src, metadata in sources:
+        folder = os.path.join(dest_dir, metadata['artist'], metadata['album'])
+        ext = Path(src).suffix.lower()
+        kept = previous.get(src)
+        if (kept and os.path.dirname(kept) == folder and _key(kept) not in taken
+                and _is_name_for(os.path.basename(kept), metadata, ext) and os.path.exists(kept)):
+            plan[kept] = src
+            taken.add(_key(kept))
+            continue
+        dest = os.path.join(folder, destination_name(metadata, ext))
+        groups[_key(dest)].append((src, metadata, folder, dest))
+
+    colliding = []
+    for key, entries in groups.items():
+        if len(entries) == 1 and key not in taken:
+            src, _, _, dest = entries[0]
+            plan[dest] = src
+            taken.add(key)
+        else:
+            colliding.extend(sorted(entries, key=lambda entry: entry[0]))
+
+    for src, metadata, folder, _ in colliding:
+        media_stats.count('collisions')
+        dest = os.path.join(folder, destination_name(metadata, Path(src).suffix.lower(), with_disc=True))
+        candidate, n = dest, 2
+        while _key(candidate) in taken:
+            candidate, n = _numbered(dest, n), n + 1
+        print(f"Name collision: {src} -> {candidate}")
+        plan[candidate] = src
+        taken.add(_key(candidate))
+    return plan
+
+def _same_content(a, b):
+    from media_dedupe import full_hash
+
+    try:
+        return os.path.getsize(a) == os.path.getsize(b) and full_hash(a) == full_hash(b)
+    except OSError:
+        return False
 
-            dest_path = os.path.join(dest_dir, artist, album)
-            os.makedirs(dest_path, exist_ok=True)
+def _manifest_fresh(entry, src, src_stat, dest_stat):
+    """Whether the manifest says dest is an untouched copy of the unchanged src."""
+    if entry is None:
+        return False
+    dest_size, dest_mtime_ns, recorded = entry
+    return (recorded['src'] == src and (recorded['src_size'], recorded['src_mtime_ns']) == (src_stat.st_size, src_stat.st_mtime_ns)
+            and (dest_size, dest_mtime_ns) == (dest_stat.st_size, dest_stat.st_mtime_ns))
+
+def _same_track(a, b):
+    """Whether two files carry the same artist, album, disc, track and title tags."""
+    fields = lambda tags: (tags.artist, tags.album, tags.disc, tags.track, tags.title)
+    tags_a, tags_b = read_tags(a), read_tags(b)
+    return tags_a is not None and tags_b is not None and fields(tags_a) == fields(tags_b)
+
+def place_file(src, dest, manifest=None, taken=()):
+    """Copy src to dest unless an identical copy is already there.
+
+    A different file already at dest is only overwritten when it is an older
+    copy of this track: the manifest says it was copied from this same
+    source, or, without a manifest, its tags name the same track (a retag or
+    re-rip of the source). Otherwise the copy goes to the first free " (n)"
+    name, skipping names in taken (other planned destinations). Returns
+    (dest, copied); dest is where the content now lives.
+    """
+    has_manifest = manifest is not None
+    manifest = manifest if has_manifest else {}
+    src_stat = os.stat(src)
+    candidate, n = dest, 2
+    while True:
+        if candidate == dest or _key(candidate) not in taken:
+            try:
+                dest_stat = os.stat(candidate)
+            except FileNotFoundError:
+                break
+            entry = manifest.get(candidate)
+            if _manifest_fresh(entry, src, src_stat, dest_stat):
+                media_stats.count('unchanged')
+                return candidate, False
+            if _same_content(src, candidate):
+                media_stats.count('identical')
+                return candidate, False
+            if entry is not None and entry[2]['src'] == src:
+                break  # the source changed since it was copied here
+            if not has_manifest and _same_track(src, candidate):
+                print(f"Replacing older copy: {candidate}")
+                break
+        candidate, n = _numbered(dest, n), n + 1
+
+    if candidate != dest:
+        print(f"Destination taken by another file: {dest} -> {candidate}")
+    os.makedirs(os.path.dirname(candidate), exist_ok=True)
+    print(f"Copying: {src} -> {candidate}")
+    media_stats.copy_file(src, candidate)
+    return candidate, True
+
+def organize_file(src_file, metadata, dest_dir, content_index=None):
+    """Copy one file into its Plex location and return the destination path.
+
+    With a content_index, files whose content is already present are skipped
+    and None is returned.
+    """
+    if content_index is not None:
+        existing = content_index.find(src_file)
+        if existing:
+            print(f"Skipping duplicate: {src_file} (same content as {existing})")
+            return None
+
+    ext = Path(src_file).suffix.lower()
+    dest_file = os.path.join(dest_dir, metadata['artist'], metadata['album'], destination_name(metadata, ext))
+    dest_file, copied = place_file(src_file, dest_file)
+    if copied and content_index is not None:
+        content_index.add(dest_file)
+    return dest_file
+
+def _manifest_row(src, dest):
+    src_stat, dest_stat = os.stat(src), os.stat(dest)
+    return (dest, dest_stat.st_size, dest_stat.st_mtime_ns,
+            {'src': src, 'src_size': src_stat.st_size, 'src_mtime_ns': src_stat.st_mtime_ns})
+
+def organize_music(source_dir, dest_dir, catalog_path=None, skip_duplicates=False, manifest_path=None):
+    """Plan every destination up front, then copy only what is missing or changed.
+
+    With manifest_path, the copies are recorded in that media catalog so that a
+    repeated run recognises them from size and mtime without hashing.
+    """
+    source_dir, dest_dir = os.path.abspath(source_dir), os.path.abspath(dest_dir)
+    sources = []
+    for src_file, metadata in iter_source_metadata(source_dir, catalog_path):
+        if not metadata:
+            print(f"Skipping: {src_file} (No metadata)")
+            continue
+        sources.append((src_file, metadata))
+
+    conn = manifest = None
+    if manifest_path:
+        from media_catalog import open_catalog, load_results, store_results
+
+        conn = open_catalog(manifest_path)
+        manifest = load_results(conn, TOOL_NAME, dest_dir)
+    plan = plan_destinations(sources, dest_dir, manifest)
+
+    content_index = None
+    if skip_duplicates:
+        from media_dedupe import ContentIndex
+
+        content_index = ContentIndex([dest_dir], tuple(SUPPORTED_FORMATS))
+
+    copied = 0
+    taken = {_key(dest) for dest in plan}
+    rows = []
+    try:
+        for dest, src in plan.items():
+            if content_index is not None:
+                existing = content_index.find(src)
+                if existing and _key(existing) != _key(dest):
+                    print(f"Skipping duplicate: {src} (same content as {existing})")
+                    continue
 
-            new_filename = f"{track} - {title}{ext}"
-            dest_file = os.path.join(dest_path, new_filename)
+            placed, was_copied = place_file(src, dest, manifest, taken)
+            taken.add(_key(placed))
+            copied += was_copied
+            if was_copied and content_index is not None:
+                content_index.add(placed)
+            if conn is not None:
+                rows.append(_manifest_row(src, placed))
+                if len(rows) >= 500:
+                    store_results(conn, TOOL_NAME, rows)
+                    rows = []
+    finally:
+        if content_index is not None:
+            content_index.close()
+        if conn is not None:
+            store_results(conn, TOOL_NAME, rows)
+            conn.close()
 
-            print(f"Copying: {src_file} -> {dest_file}")
-            shutil.copy2(src_file, dest_file)
+    print(f"\n{len(plan)} tracks planned, {copied} copied, {len(plan) - copied} already in place or skipped")
 
 if __name__ == "__main__":
     import argparse
@@ -69,6 +272,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Organize music into Plex structure.")
     parser.add_argument("source", help="Source directory with music files")
     parser.add_argument("destination", help="Destination directory to copy structured music")
+    parser.add_argument("--catalog", help="Read tags from a media catalog database instead of the files")
+    parser.add_argument("--skip-duplicates", action="store_true",
+                        help="Do not copy files whose content already exists in the destination")
+    parser.add_argument("--db", help="Media catalog database to record the copies in, so reruns skip them without hashing (default: none)")
+    media_stats.add_arguments(parser)
 
     args = parser.parse_args()
-    organize_music(args.source, args.destination)
+    media_stats.configure(args)
+    organize_music(args.source, args.destination, catalog_path=args.catalog,
+                   skip_duplicates=args.skip_duplicates, manifest_path=args.db)
+    media_stats.report(args)
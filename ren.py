@@ -1,108 +1,255 @@
 import os
+import re
+import json
 import shutil
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
 
-# Specify the source directory containing the files
-source_dir = r"Y:\-- MP3 HQ\VA\The Definitive Horror Music Collection (2009) [320]"
-
-# Define the destination directory
-destination_dir = r"Y:\-- MP3 HQ\Renamed Files"
-
-# Ensure the destination directory exists
-if not os.path.exists(destination_dir):
-    os.makedirs(destination_dir)
-
-# List of CDs and their tracks
-track_list = [
-    ('CD 1', [
-        ('01', 'Drag Me to Hell - End Titles (Original Version)', 'Christopher Young'),
-        ('02', 'Twilight - Edward at Her Bed (Bella\'s Lullaby)', 'Carter Burwell'),
-        ('03', 'Let the Right One In - Eli\'s Theme', 'Johan Söderqvist'),
-        ('04', 'Cloverfield - Roar!', 'Michael Giacchino'),
-        ('05', 'Sunshine - Adagio in D Minor', 'John Murphy'),
-        ('06', 'Zodiac - Graysmith\'s Theme', 'David Shire'),
-        ('07', 'Dexter - Main Title', 'Rolfe Kent'),
-        ('08', 'Pan\'s Labyrinth - The Labyrinth', 'Javier Navarrete'),
-        ('09', 'King Kong - King Kong Suite', 'James Newton Howard'),
-        ('10', 'War of the Worlds - Suite', 'John Williams'),
-        ('11', 'Saw - Hello Zep', 'Charlie Clouser'),
-        ('12', '28 Days Later - In the House - In a Heartbeat', 'John Murphy'),
-        ('13', 'The Ring - This is Going to Hurt', 'Hans Zimmer'),
-        ('14', 'The Mummy Returns - Main Theme', 'Alan Silvestri'),
-        ('15', 'Hannibal - Vide Cor Meum', 'Patrick Cassidy')
-    ]),
-    ('CD 2', [
-        ('01', 'The Mummy - The Sand Volcano Z Love Theme', ''),
-        ('02', 'Sleepy Hollow - End Titles', 'Danny Elfman'),
-        ('03', 'The Haunting - The Carousel Z End Titles', ''),
-        ('04', 'The Sixth Sense - Malcolm is Dead', 'James Newton Howard'),
-        ('05', 'Buffy the Vampire Slayer - Theme', 'Nerf Herder'),
-        ('06', 'Village of the Damned - March of the Children', 'John Carpenter'),
-        ('07', 'Bram Stoker\'s Dracula - The Storm', 'Wojciech Kilar'),
-        ('08', 'Army of Darkness (Evil Dead II - Prologue Z Building the Deathc', ''),
-        ('09', 'The Witches of Eastwick - Dance of the Witches', 'John Williams'),
-        ('10', 'Predator - Main Theme', 'Alan Silvestri'),
-        ('11', 'Hellraiser - Suite', 'Christopher Young'),
-        ('12', 'HellboundZ Hellraiser II - Suite', ''),
-        ('13', 'They Live - Main Theme', 'John Carpenter'),
-        ('14', 'Aliens - Prelude Z Ripley\'s Rescue', ''),
-        ('15', 'Ghostbusters - Main Theme', 'Ray Parker Jr.')
-    ]),
-    ('CD 3', [
-        ('01', 'A Nightmare on Elm Street - Main Theme', 'Charles Bernstein'),
-        ('02', 'Christine - Bad to the Bone', 'George Thorogood & The Destroyers'),
-        ('03', 'Poltergeist - Main Theme', 'Jerry Goldsmith'),
-        ('04', 'The Thing - Main Theme', 'Ennio Morricone'),
-        ('05', 'Halloween II - Main Theme', 'John Carpenter & Alan Howarth'),
-        ('06', 'The Fog - Main Theme', 'John Carpenter'),
-        ('07', 'Dressed to Kill - The Gallery', 'Pino Donaggio'),
-        ('08', 'The Shining - Music for Strings, Percussion', ''),
-        ('09', 'Dracula - Main Titles Z Storm', ''),
-        ('10', 'Phantasm - Main Theme', 'Fred Myrow & Malcolm Seagrave'),
-        ('11', 'Alien - End Title', 'Jerry Goldsmith'),
-        ('12', 'Halloween - Main Theme', 'John Carpenter'),
-        ('13', 'The Fury - Main Theme', 'John Williams'),
-        ('14', 'Suspiria - Main Theme', 'Goblin'),
-        ('15', 'Exorcist IIZ The Heretic - Regan\'s Theme', '')
-    ]),
-    ('CD 4', [
-        ('01', 'The Omen - Ave Satani', 'Jerry Goldsmith'),
-        ('02', 'Young Frankenstein - Transylvanian Lullaby', 'John Morris'),
-        ('03', 'The Exorcist - Tubular Bells', 'Mike Oldfield'),
-        ('04', 'Duel - The Cafe Z Truck Attack', ''),
-        ('05', 'Taste the Blood of Dracula - The Young Lovers Z Ride to the', ''),
-        ('06', 'Rosemary\'s Baby - Lullaby', 'Krzysztof Komeda'),
-        ('07', 'Twisted Nerve - Suite', 'Bernard Herrmann'),
-        ('08', 'The Devil Rides Out - The Power of Evil', 'James Bernard'),
-        ('09', 'Dracula, Prince of Darkness - Suite', 'James Bernard'),
-        ('10', 'The Haunting - The History of Hill House', 'Humphrey Searle'),
-        ('11', 'Dracula - Main Title Z Finale', ''),
-        ('12', 'Horrors of the Black Museum - Main Theme', 'Gerard Schurmann'),
-        ('13', 'The Thing from Another World - Main Theme', 'Dimitri Tiomkin'),
-        ('14', 'Bride of Frankenstein - Creation of the Female Monster', 'Franz Waxman'),
-        ('15', 'Nosferatu - Overture', 'Hans Erdmann')
-    ])
-]
-
-# Iterate over each CD and its tracks
-for cd, tracks in track_list:
-    # Remove the 'CD ' prefix from the cd string (e.g., "CD 1" -> "1")
-    cd_number = cd.replace("CD ", "")
-    
-    for track in tracks:
-        track_number, track_title, composer = track
-        # Correct special characters in track titles (e.g., replace underscores with spaces)
-        track_title = track_title.replace('_', ' ')
-        # Construct the source and destination filenames
-        source_filename = os.path.join(source_dir, f"{cd}\\{track_number}. {track_title}.mp3")
-        destination_filename = os.path.join(destination_dir, f"{cd_number}{track_number} - {track_title} - {composer}.mp3" if composer else f"{cd_number} {track_number} - {track_title}.mp3")
-
-        # Ensure the destination directory exists for each track
-        if not os.path.exists(os.path.dirname(destination_filename)):
-            os.makedirs(os.path.dirname(destination_filename))
-
-        # Copy the file if it exists
-        if os.path.exists(source_filename):
-            shutil.copy(source_filename, destination_filename)
-            print(f"Copied: {source_filename} to {destination_filename}")
+AUDIO_EXTENSIONS = ('.mp3', '.flac', '.m4a', '.ogg', '.wav', '.aac', '.wma')
+
+DISC_RE = re.compile(r'(?i)\b(?:cd|disc|disk)\s*(\d+)')
+TRACK_LINE_RE = re.compile(r'^(\d+)\s*[.)\-]?\s+(.+)$')
+LEADING_NUMBER_RE = re.compile(r'^\s*(\d+)\s*[-.)_]?\s*(.*)$')
+
+def normalize(s):
+    """Lowercase and strip punctuation so titles can be compared loosely."""
+    s = re.sub(r'[^\w\s]', ' ', s.lower())
+    return re.sub(r'\s+', ' ', s).strip()
+
+def _disc(value):
+    """'01', 1 and '1' all name disc '1'; anything else means no disc."""
+    value = str(value or '').strip()
+    return str(int(value)) if value.isdigit() else ''
+
+def _entry(disc, track, title, artist=''):
+    return {'disc': _disc(disc), 'track': int(track), 'title': title.strip(), 'artist': (artist or '').strip()}
+
+def read_text_tracklist(path):
+    """'CD n' / 'Disc n' headers followed by 'NN. Title' lines, optionally '<TAB>Artist'."""
+    entries = []
+    disc = ''
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            header = DISC_RE.fullmatch(line.strip())
+            if header:
+                disc = header.group(1)
+                continue
+            fields = line.split('\t')
+            match = TRACK_LINE_RE.match(fields[0].strip())
+            if not match:
+                print(f"Ignoring tracklist line: {line}")
+                continue
+            entries.append(_entry(disc, match.group(1), match.group(2), fields[1] if len(fields) > 1 else ''))
+    return entries
+
+def read_cue_tracklist(path):
+    """TRACK/TITLE/PERFORMER entries of a CUE sheet; REM DISCNUMBER sets the disc."""
+    entries = []
+    disc = ''
+    album_performer = ''
+    current = None
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if not parts:
+                continue
+            keyword = parts[0].upper()
+            value = parts[1].strip().strip('"') if len(parts) > 1 else ''
+            if keyword == 'REM' and value.upper().startswith('DISCNUMBER'):
+                disc = value.split()[-1]
+            elif keyword == 'TRACK':
+                current = _entry(disc, value.split()[0], '', album_performer)
+                entries.append(current)
+            elif keyword == 'TITLE' and current is not None:
+                current['title'] = value
+            elif keyword == 'PERFORMER':
+                if current is None:
+                    album_performer = value
+                else:
+                    current['artist'] = value
+    return [e for e in entries if e['title']]
+
+def read_json_tracklist(path):
+    """A list of {"disc", "track", "title", "artist"} objects, or {"tracks": [...]}."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('tracks', [])
+    return [_entry(item.get('disc', ''), item['track'], item['title'], item.get('artist', '')) for item in data]
+
+READERS = {
+    'text': read_text_tracklist,
+    'cue': read_cue_tracklist,
+    'json': read_json_tracklist,
+}
+
+def read_tracklist(path, fmt='auto'):
+    if fmt == 'auto':
+        ext = os.path.splitext(path)[1].lower()
+        fmt = {'.cue': 'cue', '.json': 'json'}.get(ext, 'text')
+    return READERS[fmt](path)
+
+def index_source_files(source_dir):
+    """Walk the source once and index audio files by disc, and by (disc, track)."""
+    by_disc = defaultdict(list)
+    by_position = defaultdict(list)
+    for dirpath, _, filenames in os.walk(source_dir):
+        rel_dir = os.path.relpath(dirpath, source_dir)
+        disc_match = DISC_RE.search(rel_dir) if rel_dir != '.' else None
+        disc = _disc(disc_match.group(1)) if disc_match else ''
+        for filename in filenames:
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in AUDIO_EXTENSIONS:
+                continue
+            number_match = LEADING_NUMBER_RE.match(stem)
+            track = int(number_match.group(1)) if number_match else None
+            title = number_match.group(2) if number_match else stem
+            item = {'path': os.path.join(dirpath, filename), 'title': normalize(title), 'ext': ext}
+            by_disc[disc].append(item)
+            if track is not None:
+                by_position[(disc, track)].append(item)
+    return by_disc, by_position
+
+def resolve(entries, by_disc, by_position, min_similarity=0.6):
+    """Map each tracklist entry to a source file; returns (matches, unresolved)."""
+    matches = []
+    unresolved = []
+    used = set()
+
+    for entry in entries:
+        title = normalize(entry['title'])
+        disc = entry['disc']
+        best, best_score = None, 0.0
+
+        # The disc/track position is the strong signal; the title only has to agree loosely
+        for item in by_position.get((disc, entry['track']), ()):
+            score = SequenceMatcher(None, title, item['title']).ratio()
+            if item['path'] not in used and score > best_score:
+                best, best_score = item, score
+        if best is not None and best_score >= min_similarity / 2:
+            best_score = max(best_score, min_similarity)
+        else:
+            best, best_score = None, 0.0
+            # Fall back to a title search within the same disc
+            for item in by_disc.get(disc, ()):
+                if item['path'] in used:
+                    continue
+                score = SequenceMatcher(None, title, item['title']).ratio()
+                if score > best_score:
+                    best, best_score = item, score
+
+        if best is not None and best_score >= min_similarity:
+            used.add(best['path'])
+            matches.append((entry, best))
         else:
-            print(f"File not found: {source_filename}")
+            unresolved.append(entry)
+    return matches, unresolved
+
+def sanitize(name):
+    return re.sub(r'[<>:"/\\|?*\x00-\x1f]', '_', name).strip()
+
+def plan_renames(matches, destination_dir, pattern):
+    """(src, dst) pairs; two entries that format to the same name get _1, _2... suffixes.
+
+    Duplicates are settled here, before any copy starts, since parallel
+    copies to one destination would race and the later one would win.
+    Names are compared case-insensitively, as on Windows and macOS volumes.
+    """
+    plan = []
+    taken = set()
+    for entry, item in matches:
+        fields = {
+            'disc': entry['disc'],
+            'track': f"{entry['track']:02d}",
+            'title': entry['title'],
+            'artist': entry['artist'],
+            'artist_suffix': f" - {entry['artist']}" if entry['artist'] else '',
+        }
+        stem = sanitize(pattern.format(**fields))
+        new_name = stem + item['ext']
+        counter = 1
+        while new_name.lower() in taken:
+            new_name = f"{stem}_{counter}{item['ext']}"
+            counter += 1
+        if counter > 1:
+            print(f"Duplicate name for {item['path']}, using {new_name}")
+        taken.add(new_name.lower())
+        plan.append((item['path'], os.path.join(destination_dir, new_name)))
+    return plan
+
+def _same_volume(src, dst_dir):
+    try:
+        return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+def execute_plan(plan, move=False, overwrite=False, workers=None):
+    """Copy files in parallel, or rename them when moving within one volume."""
+    def place(step):
+        src, dst = step
+        if os.path.exists(dst) and not overwrite:
+            print(f"Exists, skipping: {dst}")
+            return False
+        try:
+            if move and _same_volume(src, os.path.dirname(dst)):
+                os.replace(src, dst)
+            elif move:
+                shutil.move(src, dst)
+            else:
+                shutil.copy2(src, dst)
+        except OSError as e:
+            print(f"Failed: {src} -> {dst}: {e}")
+            return False
+        print(f"{'Moved' if move else 'Copied'}: {src} -> {dst}")
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(place, plan))
+
+def main():
+    parser = argparse.ArgumentParser(description="Rename or copy album tracks according to a tracklist.")
+    parser.add_argument("source", help="Directory containing the tracks (disc folders such as 'CD 1' are recognised)")
+    parser.add_argument("destination", help="Directory the renamed files are written to")
+    parser.add_argument("--tracklist", required=True, help="Tracklist file (.txt, .cue or .json)")
+    parser.add_argument("--format", choices=['auto'] + sorted(READERS), default='auto', help="Tracklist format")
+    parser.add_argument("--pattern", default="{disc}{track} - {title}{artist_suffix}",
+                        help="New file name; fields: disc, track, title, artist, artist_suffix")
+    parser.add_argument("--min-similarity", type=float, default=0.6, help="Title similarity needed for a match (0.0-1.0)")
+    parser.add_argument("--move", action="store_true", help="Move instead of copy (a rename on the same volume)")
+    parser.add_argument("--overwrite", action="store_true", help="Replace files that already exist in the destination")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel copies")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the rename plan")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.source):
+        print(f"Error: Source directory not found - {args.source}")
+        return
+
+    entries = read_tracklist(args.tracklist, args.format)
+    print(f"Read {len(entries)} tracklist entries from {args.tracklist}")
+
+    by_disc, by_position = index_source_files(args.source)
+    matches, unresolved = resolve(entries, by_disc, by_position, args.min_similarity)
+    plan = plan_renames(matches, args.destination, args.pattern)
+
+    for src, dst in plan:
+        print(f"{src} -> {dst}")
+    for entry in unresolved:
+        disc = f"CD {entry['disc']} " if entry['disc'] else ''
+        print(f"File not found: {disc}{entry['track']:02d}. {entry['title']}")
+    print(f"\n{len(plan)} of {len(entries)} entries resolved")
+
+    if args.dry_run or not plan:
+        return
+
+    os.makedirs(args.destination, exist_ok=True)
+    done = execute_plan(plan, move=args.move, overwrite=args.overwrite, workers=args.workers)
+    print(f"\n{done} files {'moved' if args.move else 'copied'} to {args.destination}")
+
+if __name__ == "__main__":
+    main()
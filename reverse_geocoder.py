@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Label coordinates with the nearest city, region and country, offline.
+
+Places come from a GeoNames cities dump (cities500.txt, cities15000.txt,
+...; see https://download.geonames.org/export/dump/). Region and country
+names are taken from admin1CodesASCII.txt and countryInfo.txt when they lie
+next to the cities file; otherwise their codes are used.
+
+Every place is stored as a point on the unit sphere in a k-d tree. The
+straight-line (chord) distance between two points on the sphere grows with
+their great-circle distance, so the nearest point in the tree is also the
+nearest place on the globe, and a whole batch of coordinates is answered by
+one vectorized query.
+
+Usage:
+    python reverse_geocoder.py cities500.txt results.csv --output results-places.csv
+    python update_media_gps-csv.py extract "X:/Photos" --output proxy.csv --places cities500.txt
+"""
+
+import os
+import csv
+import sys
+import argparse
+from array import array
+
+import numpy as np
+
+import media_stats
+
+EARTH_RADIUS_KM = 6371.0088
+# Columns of the GeoNames main table (tab separated, no header)
+COL_NAME, COL_LAT, COL_LON, COL_COUNTRY, COL_ADMIN1 = 1, 4, 5, 8, 10
+ADMIN1_FILE = 'admin1CodesASCII.txt'
+COUNTRY_FILE = 'countryInfo.txt'
+PLACE_FIELDS = ['city', 'region', 'country']
+NO_PLACE = ('', '', '')
+
+def to_unit_xyz(lats, lons):
+    """Degrees to an (n, 3) array of points on the unit sphere."""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def chord_to_km(chord):
+    """Great-circle distance in km for chord lengths on the unit sphere."""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+def km_to_chord(km):
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+def read_admin1(path):
+    """{'US.CA': 'California'} from admin1CodesASCII.txt."""
+    names = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) >= 2:
+                names[fields[0]] = fields[1]
+    return names
+
+def read_countries(path):
+    """{'US': 'United States'} from countryInfo.txt."""
+    names = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) >= 5:
+                names[fields[0]] = fields[4]
+    return names
+
+class ReverseGeocoder:
+    """Nearest place for any number of coordinates.
+
+    City names are kept in a list; regions and countries, repeated across
+    thousands of places, are interned once and referenced by index.
+    """
+
+    def __init__(self, lats, lons, cities, region_ids, regions, country_ids, countries):
+        from scipy.spatial import cKDTree
+
+        self.cities = cities
+        self.region_ids = np.asarray(region_ids, dtype=np.int32)
+        self.regions = regions
+        self.country_ids = np.asarray(country_ids, dtype=np.int32)
+        self.countries = countries
+        self.tree = cKDTree(to_unit_xyz(lats, lons))
+
+    def __len__(self):
+        return len(self.cities)
+
+    @classmethod
+    def from_geonames(cls, cities_file, admin1_file=None, country_file=None):
+        """Load a GeoNames cities file, with region and country names from next to it by default."""
+        folder = os.path.dirname(os.path.abspath(cities_file))
+        if admin1_file is None and os.path.exists(os.path.join(folder, ADMIN1_FILE)):
+            admin1_file = os.path.join(folder, ADMIN1_FILE)
+        if country_file is None and os.path.exists(os.path.join(folder, COUNTRY_FILE)):
+            country_file = os.path.join(folder, COUNTRY_FILE)
+        admin1 = read_admin1(admin1_file) if admin1_file else {}
+        country_names = read_countries(country_file) if country_file else {}
+
+        lats, lons = array('d'), array('d')
+        cities, region_ids, country_ids = [], array('i'), array('i')
+        regions, region_index = [], {}
+        countries, country_index = [], {}
+        with open(cities_file, encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) <= COL_ADMIN1:
+                    continue
+                try:
+                    lat, lon = float(fields[COL_LAT]), float(fields[COL_LON])
+                except ValueError:
+                    continue
+                code = fields[COL_COUNTRY]
+                region = admin1.get(f"{code}.{fields[COL_ADMIN1]}", fields[COL_ADMIN1])
+                country = country_names.get(code, code)
+                if region not in region_index:
+                    region_index[region] = len(regions)
+                    regions.append(region)
+                if country not in country_index:
+                    country_index[country] = len(countries)
+                    countries.append(country)
+                lats.append(lat)
+                lons.append(lon)
+                cities.append(fields[COL_NAME])
+                region_ids.append(region_index[region])
+                country_ids.append(country_index[country])
+        if not cities:
+            raise ValueError(f"No places found in {cities_file}")
+        return cls(np.frombuffer(lats), np.frombuffer(lons), cities, np.frombuffer(region_ids, dtype=np.int32),
+                   regions, np.frombuffer(country_ids, dtype=np.int32), countries)
+
+    def query(self, lats, lons, max_km=None):
+        """(index of the nearest place, distance in km) per coordinate, in one vectorized tree query.
+
+        The index is -1 for missing (NaN) coordinates and where the nearest
+        place is further than max_km.
+        """
+        xyz = to_unit_xyz(lats, lons)
+        found = np.full(len(xyz), -1, dtype=np.int64)
+        km = np.full(len(xyz), np.nan)
+        valid = np.isfinite(xyz).all(axis=1)
+        if valid.any():
+            bound = km_to_chord(max_km) if max_km is not None else np.inf
+            chord, index = self.tree.query(xyz[valid], distance_upper_bound=bound, workers=-1)
+            # Misses come back with an infinite distance and index len(self)
+            hit = np.isfinite(chord)
+            rows = np.flatnonzero(valid)
+            found[rows[hit]] = index[hit]
+            km[rows[hit]] = chord_to_km(chord[hit])
+        return found, km
+
+    def place(self, i):
+        """(city, region, country) of place i; empty strings for -1."""
+        if i < 0:
+            return NO_PLACE
+        return self.cities[i], self.regions[self.region_ids[i]], self.countries[self.country_ids[i]]
+
+    def label(self, lats, lons, max_km=None):
+        """(city, region, country) for every coordinate."""
+        found, _ = self.query(lats, lons, max_km)
+        return [self.place(i) for i in found.tolist()]
+
+def _coordinate(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def label_csv(geocoder, input_file, output_file, max_km=None, chunk_rows=100000):
+    """Copy a CSV with latitude/longitude columns, adding city, region and country.
+
+    Rows are read and looked up chunk_rows at a time, so files of any size
+    run in bounded memory. Returns the number of rows written.
+    """
+    written = 0
+    with open(input_file, newline='', encoding='utf-8') as src, \
+            open(output_file, 'w', newline='', encoding='utf-8') as dst:
+        reader = csv.DictReader(src)
+        fields = reader.fieldnames or []
+        lat_field = 'latitude' if 'latitude' in fields else 'lat'
+        lon_field = 'longitude' if 'longitude' in fields else 'lon'
+        if lat_field not in fields or lon_field not in fields:
+            raise ValueError(f"{input_file} has no latitude/longitude columns")
+        writer = csv.DictWriter(dst, fieldnames=fields + [f for f in PLACE_FIELDS if f not in fields])
+        writer.writeheader()
+
+        while True:
+            rows = [row for _, row in zip(range(chunk_rows), reader)]
+            if not rows:
+                break
+            with media_stats.stage('geocode'):
+                places = geocoder.label([_coordinate(row[lat_field]) for row in rows],
+                                        [_coordinate(row[lon_field]) for row in rows], max_km)
+            for row, place in zip(rows, places):
+                row.update(zip(PLACE_FIELDS, place))
+            with media_stats.stage('write'):
+                writer.writerows(rows)
+            written += len(rows)
+            media_stats.count('rows', len(rows))
+            media_stats.count('labelled', sum(1 for place in places if place is not NO_PLACE))
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Add city, region and country columns to a CSV of coordinates, offline.")
+    parser.add_argument("places", help="GeoNames cities file (e.g. cities500.txt)")
+    parser.add_argument("input", help="CSV with latitude and longitude columns")
+    parser.add_argument("--output", required=True, help="CSV to write")
+    parser.add_argument("--max-km", type=float, default=50,
+                        help="Leave the place empty when the nearest one is further away (0 for no limit)")
+    parser.add_argument("--chunk-rows", type=int, default=100000, help="Rows looked up per batch")
+    media_stats.add_arguments(parser)
+    args = parser.parse_args()
+    media_stats.configure(args)
+
+    try:
+        geocoder = ReverseGeocoder.from_geonames(args.places)
+        print(f"Loaded {len(geocoder)} places from {args.places}")
+        count = label_csv(geocoder, args.input, args.output, args.max_km or None, args.chunk_rows)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Labelled {count} rows, saved to {args.output}")
+    media_stats.report(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import os
+import json
+import zlib
+
+import media_stats
+
+def parse_shard(spec):
+    """Parse an 'i/N' shard spec (1 <= i <= N) into (i, N)."""
+    try:
+        index, total = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected i/N such as 1/4")
+    if total < 1 or not 1 <= index <= total:
+        raise ValueError(f"Invalid shard '{spec}', i must be between 1 and N")
+    return index, total
+
+def shard_of(name, total):
+    """Stable 1-based shard of a top-level directory name, the same on every machine and run."""
+    return zlib.crc32(name.encode('utf-8', 'surrogateescape')) % total + 1
+
+def path_in_shard(path, top, shard):
+    """Whether a path below top falls in shard (i, N); every path does when shard is None."""
+    if shard is None:
+        return True
+    relative = os.path.relpath(path, os.path.abspath(top))
+    parts = relative.split(os.sep)
+    name = parts[0] if len(parts) > 1 else ''
+    return shard_of(name, shard[1]) == shard[0]
+
+def walk_shard(top, shard=None):
+    """media_stats.walk restricted to the top-level directories of one shard.
+
+    Files directly inside top belong to the shard of the empty name.
+    """
+    for root, dirs, files in media_stats.walk(top):
+        if shard is not None and root == top:
+            index, total = shard
+            dirs[:] = [d for d in dirs if shard_of(d, total) == index]
+            if shard_of('', total) != index:
+                files = []
+        yield root, dirs, files
+
+def write_partial(path, tool, root, shard, records):
+    """Write one shard's records as JSON lines, after a header line describing the shard."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'tool': tool, 'root': os.path.abspath(root), 'shard': list(shard)}) + '\n')
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+            count += 1
+    return count
+
+def partial_root(path):
+    """The absolute root directory a shard file was written for, or None."""
+    with open(path, encoding='utf-8') as f:
+        return json.loads(f.readline()).get('root')
+
+def read_partials(paths, tool):
+    """Yield the records of a complete set of shard files, checking they belong together."""
+    headers = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            header = json.loads(f.readline())
+        if header.get('tool') != tool:
+            raise ValueError(f"{path} is not a {tool} shard file")
+        headers[path] = header
+
+    totals = {header['shard'][1] for header in headers.values()}
+    roots = {header['root'] for header in headers.values()}
+    if len(totals) != 1 or len(roots) != 1:
+        raise ValueError("Shard files come from different runs (mixed roots or shard counts)")
+    total = totals.pop()
+    seen = sorted(header['shard'][0] for header in headers.values())
+    if seen != list(range(1, total + 1)):
+        missing = sorted(set(range(1, total + 1)) - set(seen))
+        duplicated = sorted({i for i in seen if seen.count(i) > 1})
+        raise ValueError(f"Incomplete shard set: missing {missing or 'none'}, duplicated {duplicated or 'none'}")
+
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                yield json.loads(line)
@@ -1,34 +1,45 @@
 import os
+import math
+import struct
 import subprocess
 import json
-from PIL import Image, UnidentifiedImageError, ImageFile
-import exifread
-from datetime import datetime, timedelta
-import pytz
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict
 import csv
 import argparse
 import sys
-import piexif
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+import numpy as np
+import media_stats
+from bounded_io import open_bounded
+from media_headers import map_file, parse_exif
+from shards import parse_shard, path_in_shard, walk_shard, write_partial, read_partials, partial_root
+from media_table import MediaTable, SOURCE_CODES
+from exif_writers import (ExifToolBatch, UnsupportedLayout, PNG_SIGNATURE, is_heif,
+                          write_jpeg_gps, write_png_gps, write_heic_gps)
 
-# Allow loading of truncated images
-ImageFile.LOAD_TRUNCATED_IMAGES = True
+SHARD_TOOL = 'gps_extract'
 
-def get_media_datetime(file_path):
-    """Extract datetime from media file."""
+def read_exif_header(file_path):
+    """(DateTimeOriginal, GPS, model) from a JPEG/TIFF header parsed in place, or None to use exifread."""
+    if not file_path.lower().endswith(('.jpg', '.jpeg', '.tif', '.tiff')):
+        return None
     try:
-        # For images
-        with open(file_path, 'rb') as f:
-            tags = exifread.process_file(f, details=False)
-            if 'EXIF DateTimeOriginal' in tags:
-                dt_str = str(tags['EXIF DateTimeOriginal'])
-                return datetime.strptime(dt_str, '%Y:%m:%d %H:%M:%S').replace(tzinfo=pytz.UTC)
-    except Exception:
-        pass
+        with media_stats.stage('metadata'), map_file(file_path) as buf:
+            return parse_exif(buf)
+    except (OSError, struct.error, ValueError):
+        return None
 
-    # For videos
-    metadata = get_video_metadata(file_path)
+def exif_datetime(text):
+    """An EXIF 'YYYY:MM:DD HH:MM:SS' timestamp as an aware UTC datetime, or None."""
+    if not text:
+        return None
+    try:
+        return datetime.strptime(text, '%Y:%m:%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+def video_datetime(metadata):
+    """Creation time from ffprobe metadata, or None."""
     if metadata:
         try:
             tags = metadata.get('format', {}).get('tags', {})
@@ -37,51 +48,100 @@ def get_media_datetime(file_path):
                 return datetime.fromisoformat(creation_time.replace('Z', '+00:00'))
         except Exception:
             pass
-
     return None
 
-def get_media_gps(file_path):
-    """Extract GPS coordinates from media file if available."""
+def get_media_datetime(file_path, tags=None):
+    """Extract datetime from media file (from tags, when exifread has already read them)."""
+    header = read_exif_header(file_path) if tags is None else None
+    dt = exif_datetime(header[0]) if header is not None else None
+    if dt is not None:
+        return dt
+
     try:
-        with open(file_path, 'rb') as f:
-            tags = exifread.process_file(f, details=False)
+        # For images
+        if tags is None:
+            import exifread
+
+            with media_stats.stage('metadata'), open_bounded(file_path) as f:
+                tags = exifread.process_file(f, details=False)
+        if 'EXIF DateTimeOriginal' in tags:
+            dt_str = str(tags['EXIF DateTimeOriginal'])
+            return datetime.strptime(dt_str, '%Y:%m:%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except Exception:
+        pass
+
+    # For videos
+    return video_datetime(get_video_metadata(file_path))
+
+def get_camera_model(file_path):
+    """Camera model from EXIF, used to pick a per-camera clock offset."""
+    header = read_exif_header(file_path)
+    if header is not None:
+        return header[2]
+    try:
+        import exifread
+
+        with media_stats.stage('metadata'), open_bounded(file_path) as f:
+            tags = exifread.process_file(f, details=False, stop_tag='Model')
+        model = tags.get('Image Model')
+        return str(model).strip() if model else None
+    except Exception:
+        return None
+
+def valid_gps(gps):
+    """gps unless it is missing or (0, 0), which cameras write when they have no fix."""
+    if gps is None or (abs(gps[0]) < 0.0001 and abs(gps[1]) < 0.0001):
+        return None
+    return gps
+
+def get_media_gps(file_path, tags=None):
+    """Extract GPS coordinates from media file if available (from tags, when already read)."""
+    header = read_exif_header(file_path) if tags is None else None
+    if header is not None:
+        return valid_gps(header[1])
+    try:
+        if tags is None:
+            import exifread
+
+            with media_stats.stage('metadata'), open_bounded(file_path) as f:
+                tags = exifread.process_file(f, details=False)
             
-            # Check if all required GPS tags exist
-            required_tags = [
-                'GPS GPSLatitude',
-                'GPS GPSLongitude',
-                'GPS GPSLatitudeRef',
-                'GPS GPSLongitudeRef'
-            ]
+        # Check if all required GPS tags exist
+        required_tags = [
+            'GPS GPSLatitude',
+            'GPS GPSLongitude',
+            'GPS GPSLatitudeRef',
+            'GPS GPSLongitudeRef'
+        ]
+        
+        # If any required tag is missing, return None
+        if not all(tag in tags for tag in required_tags):
+            return None
             
-            # If any required tag is missing, return None
-            if not all(tag in tags for tag in required_tags):
-                return None
-                
-            try:
-                lat = tags['GPS GPSLatitude']
-                lon = tags['GPS GPSLongitude']
-                lat_ref = tags['GPS GPSLatitudeRef']
-                lon_ref = tags['GPS GPSLongitudeRef']
-
-                # Convert to decimal degrees
-                lat = float(lat.values[0]) + float(lat.values[1])/60 + float(lat.values[2])/3600
-                lon = float(lon.values[0]) + float(lon.values[1])/60 + float(lon.values[2])/3600
+        try:
+            lat = tags['GPS GPSLatitude']
+            lon = tags['GPS GPSLongitude']
+            lat_ref = tags['GPS GPSLatitudeRef']
+            lon_ref = tags['GPS GPSLongitudeRef']
 
-                if str(lat_ref) == 'S':
-                    lat = -lat
-                if str(lon_ref) == 'W':
-                    lon = -lon
+            # Convert to decimal degrees
+            lat = float(lat.values[0]) + float(lat.values[1])/60 + float(lat.values[2])/3600
+            lon = float(lon.values[0]) + float(lon.values[1])/60 + float(lon.values[2])/3600
 
-                # Check for (0,0) coordinates and treat as invalid
-                if abs(lat) < 0.0001 and abs(lon) < 0.0001:
-                    return None
+            if str(lat_ref) == 'S':
+                lat = -lat
+            if str(lon_ref) == 'W':
+                lon = -lon
 
-                return (lat, lon)
-                
-            except (AttributeError, IndexError, ValueError, TypeError) as e:
-                print(f"Error parsing GPS data in {file_path}: {str(e)}")
+            # Check for (0,0) coordinates and treat as invalid
+            if abs(lat) < 0.0001 and abs(lon) < 0.0001:
                 return None
+
+            return (lat, lon)
+            
+        except (AttributeError, IndexError, ValueError, TypeError) as e:
+            print(f"Error parsing GPS data in {file_path}: {str(e)}")
+            return None
                 
     except Exception as e:
         # Only print errors that aren't about missing tags
@@ -92,18 +152,20 @@ def get_media_gps(file_path):
 def get_video_metadata(file_path):
     """Use ffprobe to extract metadata from video."""
     try:
-        result = subprocess.run([
-            'ffprobe', '-v', 'quiet', '-print_format', 'json',
-            '-show_format', '-show_streams', file_path
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        with media_stats.stage('metadata'):
+            result = media_stats.run([
+                'ffprobe', '-v', 'quiet', '-print_format', 'json',
+                '-show_format', '-show_streams', file_path
+            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         return json.loads(result.stdout)
     except Exception:
         return None
 
-def get_video_gps(file_path):
-    """Extract GPS coordinates from video metadata."""
+def get_video_gps(file_path, metadata=None):
+    """Extract GPS coordinates from video metadata (probed here unless given)."""
     try:
-        metadata = get_video_metadata(file_path)
+        if metadata is None:
+            metadata = get_video_metadata(file_path)
         if metadata:
             # Check format tags first
             format_tags = metadata.get('format', {}).get('tags', {})
@@ -151,37 +213,54 @@ def get_video_gps(file_path):
         print(f"Error extracting video GPS: {e}")
     return None
 
-def scan_directory_for_media(directory, process_videos=False):
-    """Scan a directory and return all media files with their datetime and GPS info."""
-    media_files = []
+def read_exif_tags(file_path):
+    """All EXIF tags exifread finds in a file ({} when it cannot read them)."""
+    try:
+        import exifread
+
+        with media_stats.stage('metadata'), open_bounded(file_path) as f:
+            return exifread.process_file(f, details=False)
+    except Exception as e:
+        print(f"Error processing {file_path}: {str(e)}")
+        return {}
+
+def read_media(file_path, is_video=False):
+    """(datetime, gps) of one file from a single metadata parse where possible.
+
+    JPEG/TIFF headers are parsed in place, other images by exifread once and
+    videos by one ffprobe run.
+    """
+    if is_video:
+        metadata = get_video_metadata(file_path)
+        return video_datetime(metadata), get_video_gps(file_path, metadata)
+    header = read_exif_header(file_path)
+    if header is None:
+        tags = read_exif_tags(file_path)
+        return get_media_datetime(file_path, tags), get_media_gps(file_path, tags)
+    return exif_datetime(header[0]) or get_media_datetime(file_path), valid_gps(header[1])
+
+def scan_directory_for_media(directory, process_videos=False, shard=None):
+    """Scan a directory and return a MediaTable with every media file's datetime and GPS info.
+
+    With shard=(i, N) only the top-level directories of that shard are scanned.
+    """
+    media_files = MediaTable()
     image_extensions = ('.jpg', '.jpeg', '.png', '.heic', '.tiff')
     video_extensions = ('.mov', '.mp4', '.avi', '.mkv')
     
-    for root, _, files in os.walk(directory):
+    for root, _, files in walk_shard(directory, shard):
         for file in files:
             file_path = os.path.join(root, file)
             lower_file = file.lower()
             
             if lower_file.endswith(image_extensions):
                 print(f"Processing image: {file_path}")
-                dt = get_media_datetime(file_path)
-                gps = get_media_gps(file_path)
-                
-                media_files.append({
-                    'path': file_path,
-                    'datetime': dt,
-                    'gps': gps
-                })
+                dt, gps = read_media(file_path)
+                media_files.append(file_path, dt, gps)
             elif process_videos and lower_file.endswith(video_extensions):
                 print(f"Processing video: {file_path}")
-                dt = get_media_datetime(file_path)
-                gps = get_video_gps(file_path)
-                
-                media_files.append({
-                    'path': file_path,
-                    'datetime': dt,
-                    'gps': gps
-                })
+                dt, gps = read_media(file_path, is_video=True)
+                media_files.append(file_path, dt, gps)
             else:
                 print(f"Skipping (unrecognized): {file_path}")
     return media_files
@@ -207,86 +286,301 @@ def find_closest_gps(media_files, target_file, time_window_hours=1):
     
     return closest_gps
 
-def process_directory(directory, process_videos=False):
+def assign_proxy_gps(media_files, time_window_hours=1):
+    """The find_closest_gps rule over a whole MediaTable at once; returns how many files were placed.
+
+    Only files with original GPS serve as fixes, as before.
+    """
+    fixes = np.flatnonzero((media_files.source == SOURCE_CODES['original']) & media_files.has_time)
+    pending = np.flatnonzero(~media_files.has_gps & media_files.has_time)
+    if not len(fixes) or not len(pending):
+        return 0
+
+    taken = media_files.taken
+    fixes = fixes[np.argsort(taken[fixes], kind='stable')]
+    fix_times = taken[fixes]
+    target = taken[pending]
+    hi = np.clip(np.searchsorted(fix_times, target), 0, len(fixes) - 1)
+    lo = np.clip(hi - 1, 0, len(fixes) - 1)
+    nearest = np.where(np.abs(fix_times[hi] - target) < np.abs(target - fix_times[lo]), hi, lo)
+    within = np.abs(fix_times[nearest] - target) <= time_window_hours * 3600
+
+    source_rows = fixes[nearest[within]]
+    media_files.set_gps(pending[within], media_files.lat[source_rows], media_files.lon[source_rows], 'proxy')
+    return int(within.sum())
+
+def distance_km(a, b):
+    """Great-circle distance between two (lat, lon) points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 12742 * math.asin(math.sqrt(h))
+
+def _measured(media_files):
+    """Rows whose GPS was measured (original or from a track) rather than copied."""
+    source = media_files.source
+    return (source == SOURCE_CODES['original']) | (source == SOURCE_CODES['track'])
+
+def split_into_events(media_files, event_gap_hours=3, split_km=25):
+    """Group a MediaTable's rows into events in one pass over the time-sorted files.
+
+    An event ends at a gap longer than event_gap_hours, or halfway in time
+    between two consecutive measured fixes more than split_km apart.
+    Returns a list of row-index lists.
+    """
+    rows = np.flatnonzero(media_files.has_time)
+    rows = rows[np.argsort(media_files.taken[rows], kind='stable')]
+    times = media_files.taken[rows].tolist()
+    is_fix = _measured(media_files)[rows].tolist()
+    lat, lon = media_files.lat, media_files.lon
+    rows = rows.tolist()
+    gap_seconds = event_gap_hours * 3600
+    events = []
+    current = []
+    last_fix = None
+
+    # current and last_fix hold positions in the sorted order
+    for k, row in enumerate(rows):
+        if current and times[k] - times[k - 1] > gap_seconds:
+            events.append(current)
+            current = []
+            last_fix = None
+        if is_fix[k]:
+            if last_fix is not None and distance_km((lat[rows[last_fix]], lon[rows[last_fix]]), (lat[row], lon[row])) > split_km:
+                # Only files since the last fix can move to the new event
+                midpoint = (times[last_fix] + times[k]) / 2
+                cut = len(current)
+                while current[cut - 1] != last_fix and times[current[cut - 1]] >= midpoint:
+                    cut -= 1
+                events.append(current[:cut])
+                current = current[cut:]
+            last_fix = k
+        current.append(k)
+
+    if current:
+        events.append(current)
+    return [[rows[k] for k in event] for event in events]
+
+def dominant_location(fixes, cell_km=1.0):
+    """Mean of the fixes in the most populated grid cell of about cell_km."""
+    cell = cell_km / 111.0
+    cells = defaultdict(list)
+    for lat, lon in fixes:
+        cells[(round(lat / cell), round(lon / cell))].append((lat, lon))
+    best = max(cells.values(), key=len)
+    return (sum(p[0] for p in best) / len(best), sum(p[1] for p in best) / len(best))
+
+def assign_event_gps(media_files, event_gap_hours=3, split_km=25):
+    """Give files still without GPS their event's dominant location; returns how many were placed."""
+    measured = _measured(media_files)
+    has_gps = media_files.has_gps
+    placed = 0
+    for event in split_into_events(media_files, event_gap_hours, split_km):
+        event = np.asarray(event)
+        fixes = event[measured[event]]
+        pending = event[~has_gps[event]]
+        if not len(fixes) or not len(pending):
+            continue
+        lat, lon = dominant_location(zip(media_files.lat[fixes].tolist(), media_files.lon[fixes].tolist()))
+        media_files.set_gps(pending, lat, lon, 'event')
+        placed += len(pending)
+    return placed
+
+def assign_track_gps(media_files, track, clock_offsets=None, max_gap_seconds=300, camera_model=get_camera_model):
+    """Position files without GPS from a logger track; returns how many were placed.
+
+    clock_offsets maps a camera model (or None for every camera) to how many
+    seconds its clock runs ahead of UTC. Video creation times are already UTC.
+    camera_model gives the model of a path; a merge looks it up in the shard
+    records instead of reading the file again.
+    """
+    pending = np.flatnonzero(~media_files.has_gps & media_files.has_time)
+    if not len(pending) or not len(track):
+        return 0
+
+    offsets = np.zeros(len(pending))
+    if clock_offsets:
+        per_camera = {camera.lower(): seconds for camera, seconds in clock_offsets.items() if camera}
+        for i, row in enumerate(pending.tolist()):
+            path = media_files.path(row)
+            if path.lower().endswith(('.mov', '.mp4', '.avi', '.mkv')):
+                continue
+            offsets[i] = clock_offsets.get(None, 0)
+            if per_camera:
+                model = camera_model(path)
+                if model and model.lower() in per_camera:
+                    offsets[i] = per_camera[model.lower()]
+
+    lats, lons, valid = track.locate(media_files.taken[pending] - offsets, max_gap_seconds)
+    media_files.set_gps(pending[valid], lats[valid], lons[valid], 'track')
+    return int(valid.sum())
+
+def scan_catalog_for_media(catalog_path, directory, process_videos=False, shard=None):
+    """Read image datetime and GPS info from the media catalog; videos are still probed."""
+    from media_catalog import open_catalog, query_media, query_paths, IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
+
+    conn = open_catalog(catalog_path)
+    try:
+        records = query_media(conn, directory, IMAGE_EXTENSIONS)
+        media_files = MediaTable.from_records(r for r in records if path_in_shard(r['path'], directory, shard))
+        if process_videos:
+            for file_path in query_paths(conn, directory, VIDEO_EXTENSIONS):
+                if not path_in_shard(file_path, directory, shard):
+                    continue
+                print(f"Processing video: {file_path}")
+                media_files.append(file_path, *read_media(file_path, is_video=True))
+    finally:
+        conn.close()
+    return media_files
+
+def scan_media(directory, process_videos=False, catalog_path=None, shard=None):
+    """Scan the files (or the catalog) into a MediaTable without assigning any GPS."""
+    if catalog_path:
+        media_files = scan_catalog_for_media(catalog_path, directory, process_videos, shard)
+    else:
+        media_files = scan_directory_for_media(directory, process_videos, shard)
+    media_stats.count('media_files', len(media_files))
+    media_stats.count('with_gps', media_files.count('original'))
+    return media_files
+
+def process_directory(directory, process_videos=False, catalog_path=None,
+                      track=None, clock_offsets=None, track_gap=300,
+                      event_gap_hours=None, event_split_km=25):
     """Process media files and assign GPS coordinates."""
-    media_files = scan_directory_for_media(directory, process_videos)
-    gps_files = [m for m in media_files if m['gps'] is not None]
-    
-    for media in media_files:
-        if media['gps'] is None and media['datetime'] is not None:
-            media['gps'] = find_closest_gps(gps_files, media)
-    
+    media_files = scan_media(directory, process_videos, catalog_path)
+    assign_gps(media_files, track, clock_offsets, track_gap, event_gap_hours, event_split_km)
     return media_files
 
-def save_results(media_files, output_file):
-    """Save processed results to CSV, focusing on suggested changes for images without original GPS."""
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+def assign_gps(media_files, track=None, clock_offsets=None, track_gap=300,
+               event_gap_hours=None, event_split_km=25, camera_model=get_camera_model):
+    """Position the files without GPS.
+
+    They are placed from the GPS track first, if one is given, then from the
+    closest photo with GPS and, when event_gap_hours is set, finally from the
+    event they belong to.
+    """
+    with media_stats.stage('match'):
+        if track is not None:
+            media_stats.count('track_assigned',
+                              assign_track_gps(media_files, track, clock_offsets, track_gap, camera_model))
+        media_stats.count('proxy_assigned', assign_proxy_gps(media_files))
+        if event_gap_hours:
+            media_stats.count('event_assigned', assign_event_gps(media_files, event_gap_hours, event_split_km))
+    
+
+def write_shard(media_files, output_file, directory, shard):
+    """Write the scanned file records of one shard, GPS fixes included, for a later merge.
+
+    Paths are stored relative to the root in the header, with '/' separators,
+    so the merge does not depend on the directory extract ran from. Images a
+    track may place also carry their camera model for --clock-offset.
+    """
+    root = os.path.abspath(directory)
+
+    def records():
+        for i in range(len(media_files)):
+            path = media_files.path(i)
+            dt = media_files.datetime(i)
+            record = {'path': os.path.relpath(os.path.abspath(path), root).replace(os.sep, '/'),
+                      'datetime': dt.isoformat() if dt else None, 'gps': media_files.gps(i)}
+            if dt is not None and record['gps'] is None and not path.lower().endswith(('.mov', '.mp4', '.avi', '.mkv')):
+                record['model'] = get_camera_model(path)
+            yield record
+
+    with media_stats.stage('write'):
+        return write_partial(output_file, SHARD_TOOL, directory, shard, records())
+
+def read_shards(shard_files):
+    """Rebuild the full MediaTable from a complete set of shard files.
+
+    Returns it with {path: camera model or None} for the images whose shard
+    record carries the model.
+    """
+    media_files = MediaTable()
+    models = {}
+    root = partial_root(shard_files[0]) or ''
+    for record in read_partials(shard_files, SHARD_TOOL):
+        # Shards from older versions hold absolute paths, which join leaves as they are
+        path = os.path.normpath(os.path.join(root, record['path']))
+        dt = datetime.fromisoformat(record['datetime']) if record['datetime'] else None
+        media_files.append(path, dt, tuple(record['gps']) if record['gps'] else None)
+        if 'model' in record:
+            models[path] = record['model']
+    media_stats.count('media_files', len(media_files))
+    media_stats.count('with_gps', media_files.count('original'))
+    return media_files, models
+
+def save_results(media_files, output_file, geocoder=None, max_km=None):
+    """Save processed results to CSV, focusing on suggested changes for images without original GPS.
+
+    With a ReverseGeocoder, every row also gets city, region and country,
+    looked up for all rows in one batch.
+    """
+    # Only files that had no original GPS and now have a proxy; the
+    # source was recorded when the proxy was assigned.
+    rows = np.flatnonzero(media_files.source > SOURCE_CODES['original'])
+    places = None
+    if geocoder is not None:
+        with media_stats.stage('geocode'):
+            places = geocoder.label(media_files.lat[rows], media_files.lon[rows], max_km)
+
+    with media_stats.stage('write'), open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
         fieldnames = ['path', 'datetime', 'latitude', 'longitude', 'gps_source']
+        if places is not None:
+            from reverse_geocoder import PLACE_FIELDS
+
+            fieldnames += PLACE_FIELDS
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
-        
-        for media in media_files:
+
+        for n, i in enumerate(rows.tolist()):
+            path = media_files.path(i)
             # Skip videos
-            if media['path'].lower().endswith(('.mov', '.mp4', '.avi', '.mkv')):
+            if path.lower().endswith(('.mov', '.mp4', '.avi', '.mkv')):
                 continue
-                
-            # Get original GPS (will be None if not present)
-            original_gps = get_media_gps(media['path'])
-            
-            # Only include files that:
-            # 1. Had no original GPS (original_gps is None)
-            # 2. Now have proxy GPS (media['gps'] is not None)
-            if original_gps is None and media['gps'] is not None:
-                writer.writerow({
-                    'path': media['path'],
-                    'datetime': media['datetime'].isoformat() if media['datetime'] else '',
-                    'latitude': media['gps'][0],
-                    'longitude': media['gps'][1],
-                    'gps_source': 'proxy'
-                })
-
-def decimal_to_dms(decimal):
-    """Convert decimal degrees to EXIF-friendly degrees, minutes, seconds format."""
-    degrees = int(decimal)
-    remainder = abs(decimal - degrees) * 60
-    minutes = int(remainder)
-    seconds = (remainder - minutes) * 60
-    return ((degrees, 1), (minutes, 1), (int(seconds * 1000), 1000))
-
-def _clean_exif_dict(exif_dict):
-    """Clean problematic tags from EXIF dictionary"""
-    if "Exif" in exif_dict and 41729 in exif_dict["Exif"]:
-        del exif_dict["Exif"][41729]
-    return exif_dict
-
-def update_image_gps(image_path, lat, lon):
-    """Update GPS metadata for images using piexif."""
+
+            dt = media_files.datetime(i)
+            lat, lon = media_files.gps(i)
+            row = {
+                'path': path,
+                'datetime': dt.isoformat() if dt else '',
+                'latitude': lat,
+                'longitude': lon,
+                'gps_source': media_files.source_name(i)
+            }
+            if places is not None:
+                row.update(zip(PLACE_FIELDS, places[n]))
+            writer.writerow(row)
+
+def update_image_gps(image_path, lat, lon, fallback=None):
+    """Update GPS metadata for images.
+
+    JPEGs are written with piexif, PNGs get an eXIf chunk and HEIC files an
+    updated Exif item. Anything else is queued on fallback (an ExifToolBatch)
+    when one is given; the return value is then None until the batch runs.
+    """
     try:
         print(f"\nProcessing image: {image_path}")
-        
-        try:
-            exif_dict = piexif.load(image_path)
-        except Exception as e:
-            print(f"Creating new EXIF data: {str(e)}")
-            exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}}
-        
-        # Clean problematic tags
-        exif_dict = _clean_exif_dict(exif_dict)
-        
-        # Create GPS metadata
-        gps_ifd = {
-            piexif.GPSIFD.GPSLatitudeRef: 'N' if lat >= 0 else 'S',
-            piexif.GPSIFD.GPSLatitude: decimal_to_dms(abs(lat)),
-            piexif.GPSIFD.GPSLongitudeRef: 'E' if lon >= 0 else 'W',
-            piexif.GPSIFD.GPSLongitude: decimal_to_dms(abs(lon)),
-        }
-        
-        exif_dict["GPS"] = gps_ifd
-        
-        # Save with new EXIF
-        piexif.insert(piexif.dump(exif_dict), image_path)
+        lower_path = image_path.lower()
+        with media_stats.stage('write'):
+            if lower_path.endswith(('.jpg', '.jpeg')):
+                write_jpeg_gps(image_path, lat, lon)
+            elif lower_path.endswith('.png'):
+                write_png_gps(image_path, lat, lon)
+            elif lower_path.endswith(('.heic', '.heif')):
+                write_heic_gps(image_path, lat, lon)
+            else:
+                raise UnsupportedLayout(f"no native writer for {os.path.splitext(image_path)[1]} files")
+        media_stats.add_bytes_written(os.path.getsize(image_path))
         print(f"Successfully updated GPS for image")
         return True
+
+    except UnsupportedLayout as e:
+        if fallback is None:
+            print(f"Failed to update image: {str(e)}")
+            return False
+        print(f"Queued for exiftool ({str(e)})")
+        fallback.add(image_path, lat, lon)
+        return None
             
     except Exception as e:
         print(f"Failed to update image: {str(e)}")
@@ -310,12 +604,13 @@ def update_video_gps(video_path, lat, lon):
         ]
         
         # Run FFmpeg (hide banner and only show errors)
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+        with media_stats.stage('write'):
+            result = media_stats.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
         
         if result.returncode != 0:
             print(f"FFmpeg error: {result.stderr}")
@@ -334,12 +629,28 @@ def update_video_gps(video_path, lat, lon):
         return False
 
 def is_valid_media(file_path):
-    """Check if file is a valid media file."""
+    """Check if file is a valid media file.
+
+    JPEGs are verified with PIL before piexif rewrites them. PNG and HEIC
+    files only need the right signature: their writers parse every chunk or
+    box they touch and fail cleanly on a damaged file.
+    """
     try:
-        if file_path.lower().endswith(('.jpg', '.jpeg', '.png', '.heic')):
-            with Image.open(file_path) as img:
+        lower_path = file_path.lower()
+        if lower_path.endswith(('.jpg', '.jpeg')):
+            from PIL import Image, ImageFile
+
+            # Allow loading of truncated images
+            ImageFile.LOAD_TRUNCATED_IMAGES = True
+            with media_stats.stage('metadata'), media_stats.open_counted(file_path) as f, Image.open(f) as img:
                 img.verify()
-            return True
+        elif lower_path.endswith('.png'):
+            with open(file_path, 'rb') as f:
+                if f.read(8) != PNG_SIGNATURE:
+                    raise ValueError("not a PNG file")
+        elif lower_path.endswith(('.heic', '.heif')):
+            if not is_heif(file_path):
+                raise ValueError("not a HEIF file")
         return True  # Assume video files are valid
     except Exception as e:
         print(f"Invalid media file: {str(e)}")
@@ -359,78 +670,142 @@ def find_file_path(csv_path, directory):
         return file_path
     
     # Search recursively
-    for root, _, files in os.walk(directory):
+    for root, _, files in media_stats.walk(directory):
         if filename in files:
             return os.path.join(root, filename)
     
     return None
 
-def update_gps_from_csv(csv_file, directory, process_videos=False):
-    """Update GPS data for media files based on CSV coordinates."""
+def update_gps_from_csv(csv_file, directory, process_videos=False, exiftool='exiftool'):
+    """Update GPS data for media files based on CSV coordinates.
+
+    Images without a native writer go to one stay-open exiftool process.
+    """
     print(f"\nStarting GPS update from CSV: {csv_file}")
+    fallback = ExifToolBatch(exiftool)
     
-    with open(csv_file, 'r', encoding='utf-8') as file:
-        csv_reader = csv.DictReader(file)
+    try:
+        with open(csv_file, 'r', encoding='utf-8') as file:
+            csv_reader = csv.DictReader(file)
         
-        processed = 0
-        skipped = 0
+            processed = 0
+            skipped = 0
         
-        for row in csv_reader:
-            try:
-                csv_path = row['path']
-                file_path = find_file_path(csv_path, directory)
+            for row in csv_reader:
+                try:
+                    csv_path = row['path']
+                    file_path = find_file_path(csv_path, directory)
                 
-                if not file_path or not os.path.exists(file_path):
-                    print(f"File not found: {csv_path}")
-                    skipped += 1
-                    continue
+                    if not file_path or not os.path.exists(file_path):
+                        print(f"File not found: {csv_path}")
+                        skipped += 1
+                        continue
                 
-                if not is_valid_media(file_path):
-                    print(f"Skipping invalid media file: {file_path}")
-                    skipped += 1
-                    continue
+                    if not is_valid_media(file_path):
+                        print(f"Skipping invalid media file: {file_path}")
+                        skipped += 1
+                        continue
                 
-                # Get file extension
-                lower_path = file_path.lower()
-                is_video = any(lower_path.endswith(ext) for ext in ('.mov', '.mp4', '.avi', '.mkv'))
+                    # Get file extension
+                    lower_path = file_path.lower()
+                    is_video = any(lower_path.endswith(ext) for ext in ('.mov', '.mp4', '.avi', '.mkv'))
                 
-                # Skip videos unless explicitly allowed
-                if is_video and not process_videos:
-                    print(f"Skipping video (use --all to process): {file_path}")
-                    skipped += 1
-                    continue
+                    # Skip videos unless explicitly allowed
+                    if is_video and not process_videos:
+                        print(f"Skipping video (use --all to process): {file_path}")
+                        skipped += 1
+                        continue
                 
-                # Get coordinates
-                try:
-                    lat = float(row.get('latitude') or row.get('lat'))
-                    lon = float(row.get('longitude') or row.get('lon'))
-                except (ValueError, TypeError):
-                    print(f"Invalid coordinates for {file_path}")
-                    skipped += 1
-                    continue
+                    # Get coordinates
+                    try:
+                        lat = float(row.get('latitude') or row.get('lat'))
+                        lon = float(row.get('longitude') or row.get('lon'))
+                    except (ValueError, TypeError):
+                        print(f"Invalid coordinates for {file_path}")
+                        skipped += 1
+                        continue
                 
-                # Update GPS based on file type
-                success = False
-                if not is_video:
-                    success = update_image_gps(file_path, lat, lon)
-                elif process_videos:
-                    success = update_video_gps(file_path, lat, lon)
+                    # Update GPS based on file type
+                    success = False
+                    if not is_video:
+                        success = update_image_gps(file_path, lat, lon, fallback)
+                    elif process_videos:
+                        success = update_video_gps(file_path, lat, lon)
                 
-                if success:
-                    processed += 1
-                    print(f"Successfully updated {file_path}")
-                else:
-                    skipped += 1
-                    print(f"Failed to update {file_path}")
+                    if success:
+                        processed += 1
+                        print(f"Successfully updated {file_path}")
+                    elif success is None:
+                        continue
+                    else:
+                        skipped += 1
+                        print(f"Failed to update {file_path}")
                     
-            except Exception as e:
-                print(f"Error processing {csv_path}: {str(e)}")
-                skipped += 1
+                except Exception as e:
+                    print(f"Error processing {csv_path}: {str(e)}")
+                    skipped += 1
+    finally:
+        # Also on an error or Ctrl+C, so queued writes are flushed and exiftool exits
+        fallback.close()
+    for file_path, success in fallback.results.items():
+        if success:
+            processed += 1
+            print(f"Successfully updated {file_path} (exiftool)")
+        else:
+            skipped += 1
+            print(f"Failed to update {file_path}")
 
     print(f"\nGPS update complete from CSV!")
     print(f"Successfully processed: {processed} files")
     print(f"Skipped: {skipped} files")
 
+def add_matching_arguments(parser):
+    """Options of the GPS assignment stage, shared by extract and merge."""
+    parser.add_argument("--track", action='append', help="GPX, KML or GeoJSON track file, or a directory of them (repeatable)")
+    parser.add_argument("--clock-offset", action='append', default=[],
+                        help="How far the camera clock runs ahead of UTC, as [MODEL=]+H:MM[:SS] or a number with a unit: +2h, -90m, +30s (repeatable)")
+    parser.add_argument("--track-gap", type=int, default=300,
+                        help="Maximum seconds between a photo and the track points used to place it")
+    parser.add_argument("--event-gap", type=float,
+                        help="Split media into events at gaps longer than this many hours and give files still without GPS the event's main location")
+    parser.add_argument("--event-split-km", type=float, default=25,
+                        help="Also split an event between consecutive fixes further apart than this")
+
+def add_place_arguments(parser):
+    """Options for labelling the output with place names, shared by extract and merge."""
+    parser.add_argument("--places", metavar="CITIES_FILE",
+                        help="GeoNames cities file (e.g. cities500.txt); adds city, region and country columns")
+    parser.add_argument("--places-max-km", type=float, default=50,
+                        help="Leave the place empty when the nearest city is further away")
+
+def load_geocoder(args):
+    """The offline ReverseGeocoder asked for with --places, or None."""
+    if not getattr(args, 'places', None):
+        return None
+    from reverse_geocoder import ReverseGeocoder
+
+    try:
+        geocoder = ReverseGeocoder.from_geonames(args.places)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Loaded {len(geocoder)} places from {args.places}")
+    return geocoder
+
+def load_track(args, parser):
+    """The TrackSeries and per-camera clock offsets asked for on the command line."""
+    if not args.track:
+        return None, {}
+    from gps_tracks import TrackSeries, find_track_files, parse_clock_offset
+
+    try:
+        clock_offsets = dict(parse_clock_offset(spec) for spec in args.clock_offset)
+    except ValueError as e:
+        parser.error(str(e))
+    track = TrackSeries.from_files(find_track_files(args.track))
+    print(f"Loaded {len(track)} track points")
+    return track, clock_offsets
+
 def main():
     parser = argparse.ArgumentParser(
         description="Media GPS Tool - Extract or Update GPS coordinates in media files",
@@ -443,35 +818,74 @@ def main():
     extract_parser.add_argument("directory", help="Directory to scan for media files")
     extract_parser.add_argument("--output", help="Output CSV file to save results", required=True)
     extract_parser.add_argument("--all", help="Process all media files including videos", action='store_true')
+    extract_parser.add_argument("--catalog", help="Read image metadata from a media catalog database instead of the files")
+    extract_parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                                help="Scan only shard i of N (by top-level directory) and write its records to --output for 'merge'")
+    add_matching_arguments(extract_parser)
+    add_place_arguments(extract_parser)
+    media_stats.add_arguments(extract_parser)
+
+    # Merge command
+    merge_parser = subparsers.add_parser('merge', help='Combine the files of a sharded extract and assign GPS')
+    merge_parser.add_argument("shard_files", nargs='+', help="Shard files written by 'extract --shard', one per shard")
+    merge_parser.add_argument("--output", help="Output CSV file to save results", required=True)
+    add_matching_arguments(merge_parser)
+    add_place_arguments(merge_parser)
+    media_stats.add_arguments(merge_parser)
     
     # Update command
     update_parser = subparsers.add_parser('update', help='Update GPS coordinates in media files from CSV')
     update_parser.add_argument("directory", help="Directory containing media files")
     update_parser.add_argument("csv_file", help="CSV file with filenames and GPS coordinates (latitude, longitude)")
     update_parser.add_argument("--all", help="Process all media files including videos", action='store_true')
+    update_parser.add_argument("--exiftool", default="exiftool", help="exiftool executable used for formats without a native writer")
+    media_stats.add_arguments(update_parser)
     
     args = parser.parse_args()
+    media_stats.configure(args)
+
+    if args.command == 'extract' and args.shard:
+        if args.track or args.event_gap or args.places:
+            parser.error("--track, --event-gap and --places apply to the whole library; pass them to 'merge'")
+        print(f"Scanning shard {args.shard[0]}/{args.shard[1]} of {args.directory} "
+              f"for {'all media files' if args.all else 'image files'}...")
+        media_files = scan_media(args.directory, process_videos=args.all, catalog_path=args.catalog, shard=args.shard)
+        count = write_shard(media_files, args.output, args.directory, args.shard)
+        print(f"\nShard file with {count} records saved to {args.output}")
 
-    if args.command == 'extract':
-        print(f"Scanning {args.directory} for {'all media files' if args.all else 'image files'}...")
-        media_files = process_directory(args.directory, process_videos=args.all)
+    elif args.command in ('extract', 'merge'):
+        track, clock_offsets = load_track(args, parser)
+        geocoder = load_geocoder(args)
+        camera_model = get_camera_model
+        if args.command == 'merge':
+            try:
+                media_files, camera_models = read_shards(args.shard_files)
+                # Shards written before models were recorded fall back to reading the file
+                camera_model = lambda path: camera_models[path] if path in camera_models else get_camera_model(path)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            print(f"Merged {len(args.shard_files)} shard files with {len(media_files)} records")
+        else:
+            print(f"Scanning {args.directory} for {'all media files' if args.all else 'image files'}...")
+            media_files = scan_media(args.directory, process_videos=args.all, catalog_path=args.catalog)
+        assign_gps(media_files, track=track, clock_offsets=clock_offsets, track_gap=args.track_gap,
+                   event_gap_hours=args.event_gap, event_split_km=args.event_split_km, camera_model=camera_model)
         
-        files_with_gps = sum(1 for m in media_files if m['gps'] is not None)
+        files_with_gps = int(np.count_nonzero(media_files.has_gps))
         
-        # Count proxy GPS (assigned from nearby files)
-        files_with_proxy_gps = 0
-        for m in media_files:
-            if m['gps'] is not None:
-                if not m['path'].lower().endswith(('.jpg', '.jpeg', '.png', '.heic')):
-                    files_with_proxy_gps += 1  # Videos always count as proxy
-                elif m['gps'] != get_media_gps(m['path']):
-                    files_with_proxy_gps += 1  # Images with different GPS than original
+        # Count proxy GPS (assigned from nearby files, tracks or events)
+        files_with_proxy_gps = files_with_gps - media_files.count('original')
         
         print(f"\nProcessed {len(media_files)} media files:")
         print(f"- {files_with_gps} files with GPS coordinates ({files_with_proxy_gps} with proxy GPS)")
+        if track is not None:
+            print(f"- {media_files.count('track')} positioned from GPS tracks")
+        if args.event_gap:
+            print(f"- {media_files.count('event')} placed at their event's location")
         print(f"- {len(media_files) - files_with_gps} files without GPS coordinates")
         
-        save_results(media_files, args.output)
+        save_results(media_files, args.output, geocoder, args.places_max_km or None)
         print(f"\nResults saved to {args.output}")
     
     elif args.command == 'update':
@@ -490,7 +904,9 @@ def main():
         print(f"Processing videos: {'Yes' if args.all else 'No'}")
         print(f"{'='*50}\n")
         
-        update_gps_from_csv(args.csv_file, args.directory, process_videos=args.all)
+        update_gps_from_csv(args.csv_file, args.directory, process_videos=args.all, exiftool=args.exiftool)
+
+    media_stats.report(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,17 +1,14 @@
 import os
 import argparse
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
-from PIL import Image, ImageFile
-import piexif
 import subprocess
 import sys
-
-# Allow loading of truncated images
-ImageFile.LOAD_TRUNCATED_IMAGES = True
+import media_stats
 
 def get_gps_coordinates(place_name):
     """Convert place name to GPS coordinates using Nominatim."""
+    from geopy.geocoders import Nominatim
+    from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+
     geolocator = Nominatim(user_agent="media_geo_updater")
     try:
         location = geolocator.geocode(place_name)
@@ -34,6 +31,8 @@ def decimal_to_dms(decimal):
 
 def update_image_gps(image_path, lat, lon):
     """Update GPS metadata for images using piexif."""
+    import piexif
+
     try:
         print(f"\nProcessing image: {image_path}")
         
@@ -55,7 +54,9 @@ def update_image_gps(image_path, lat, lon):
         exif_dict["GPS"] = gps_ifd
         
         # Save with new EXIF
-        piexif.insert(piexif.dump(exif_dict), image_path)
+        with media_stats.stage('write'):
+            piexif.insert(piexif.dump(exif_dict), image_path)
+        media_stats.add_bytes_written(os.path.getsize(image_path))
         print(f"Successfully updated GPS for image")
         return True
     except Exception as e:
@@ -81,12 +82,13 @@ def update_video_gps(video_path, lat, lon):
         ]
         
         # Run FFmpeg (hide banner and only show errors)
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+        with media_stats.stage('write'):
+            result = media_stats.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
         
         if result.returncode != 0:
             print(f"FFmpeg error: {result.stderr}")
@@ -108,7 +110,11 @@ def is_valid_media(file_path):
     """Check if file is a valid media file."""
     try:
         if file_path.lower().endswith(('.jpg', '.jpeg', '.png', '.heic')):
-            with Image.open(file_path) as img:
+            from PIL import Image, ImageFile
+
+            # Allow loading of truncated images
+            ImageFile.LOAD_TRUNCATED_IMAGES = True
+            with media_stats.stage('metadata'), media_stats.open_counted(file_path) as f, Image.open(f) as img:
                 img.verify()
             return True
         return True  # Assume video files are valid
@@ -128,7 +134,7 @@ def process_directory(directory, place_name):
     processed = 0
     skipped = 0
 
-    for root, _, files in os.walk(directory):
+    for root, _, files in media_stats.walk(directory):
         for file in files:
             if file.lower().endswith(media_extensions):
                 file_path = os.path.join(root, file)
@@ -164,8 +170,10 @@ if __name__ == "__main__":
     )
     parser.add_argument("directory", help="Directory containing media files")
     parser.add_argument("place", help="Place name (e.g., 'Paris, France')")
+    media_stats.add_arguments(parser)
     
     args = parser.parse_args()
+    media_stats.configure(args)
 
     if not os.path.isdir(args.directory):
         print(f"Error: Directory not found - {args.directory}")
@@ -177,4 +185,5 @@ if __name__ == "__main__":
     print(f"Location: {args.place}")
     print(f"{'='*50}\n")
     
-    process_directory(args.directory, args.place)
\ No newline at end of file
+    process_directory(args.directory, args.place)
+    media_stats.report(args)
\ No newline at end of file
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Watch inbox folders with inotify and process files as they arrive.
+
+New photos are checked for GPS and, when they have none, given a proxy
+location from the fixes seen so far (the same find_closest_gps rule as
+update_media_gps-csv.py extract). New music is copied into the Plex layout
+used by plex_music_organizer.py. Linux only.
+
+Usage:
+    python watch_inbox.py --photos /inbox/phone --output proxy.csv --apply
+    python watch_inbox.py --music /inbox/downloads --music-dest /library/music
+"""
+
+import os
+import sys
+import csv
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import argparse
+from bisect import bisect_left, bisect_right
+
+from mediatools import load_script
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.heic', '.tiff')
+MUSIC_EXTENSIONS = ('.mp3', '.flac', '.m4a', '.ogg', '.wav')
+
+class Inotify:
+    """Minimal recursive inotify watcher on top of libc."""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        self.watches = {}
+
+    def add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            print(f"Could not watch {path}: {os.strerror(errno)}")
+            return
+        self.watches[wd] = path
+
+    def add_tree(self, root):
+        """Watch root and every directory below it."""
+        for dirpath, _, _ in os.walk(root):
+            self.add_watch(dirpath)
+
+    def read(self, timeout):
+        """Return the (path, mask) events available within timeout seconds."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                print("Warning: inotify queue overflowed, some events were lost")
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            events.append((os.path.join(directory, os.fsdecode(name)) if name else directory, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class Debouncer:
+    """Hold paths until they have been quiet for `delay` seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.pending = {}
+
+    def touch(self, path):
+        self.pending[path] = time.monotonic()
+
+    def ready(self):
+        now = time.monotonic()
+        due = [path for path, seen in self.pending.items() if now - seen >= self.delay]
+        for path in due:
+            del self.pending[path]
+        return due
+
+class GpsIngest:
+    """Assign proxy GPS to new photos from the fixes that have arrived so far.
+
+    Fixes are kept sorted by capture time, so the closest one is found with a
+    binary search. A daemon runs for months, so fixes captured more than
+    keep_hours before the newest fix are dropped, and at most max_waiting
+    photos wait for a fix.
+    """
+
+    def __init__(self, output_csv=None, apply=False, time_window_hours=1, keep_hours=7 * 24, max_waiting=10000):
+        self.gps_tool = load_script('update_media_gps-csv.py')
+        self.output_csv = output_csv
+        self.apply = apply
+        self.time_window_hours = time_window_hours
+        self.keep_hours = max(keep_hours, time_window_hours)
+        self.max_waiting = max_waiting
+        # Parallel lists sorted by capture time (POSIX seconds)
+        self.fix_times = []
+        self.fix_gps = []
+        self.waiting = []
+        self.own_writes = set()
+
+    def seed_from_catalog(self, catalog_path, directories):
+        from media_catalog import open_catalog, query_media
+
+        conn = open_catalog(catalog_path)
+        try:
+            for directory in directories:
+                for media in query_media(conn, directory):
+                    if media['gps'] and media['datetime']:
+                        self._add_fix(media)
+        finally:
+            conn.close()
+        self._evict()
+        print(f"Loaded {len(self.fix_times)} GPS fixes from {catalog_path}")
+
+    def _add_fix(self, media):
+        t = media['datetime'].timestamp()
+        i = bisect_right(self.fix_times, t)
+        self.fix_times.insert(i, t)
+        self.fix_gps.insert(i, media['gps'])
+
+    def _evict(self):
+        """Drop fixes, and waiting photos, captured more than keep_hours before the newest fix."""
+        if not self.fix_times:
+            return
+        horizon = self.fix_times[-1] - self.keep_hours * 3600
+        old = bisect_left(self.fix_times, horizon)
+        if old:
+            del self.fix_times[:old], self.fix_gps[:old]
+        still_waiting = []
+        for media in self.waiting:
+            if media['datetime'].timestamp() >= horizon:
+                still_waiting.append(media)
+            else:
+                print(f"Gave up waiting for a fix: {media['path']}")
+        self.waiting = still_waiting
+
+    def closest_fix(self, media):
+        """GPS of the fix closest in time to media within the time window, or None."""
+        t = media['datetime'].timestamp()
+        hi = bisect_left(self.fix_times, t)
+        best, best_diff = None, self.time_window_hours * 3600
+        # The earlier neighbour wins a tie, as in assign_proxy_gps
+        for i in (hi - 1, hi):
+            if 0 <= i < len(self.fix_times) and abs(self.fix_times[i] - t) <= best_diff:
+                if best is None or abs(self.fix_times[i] - t) < best_diff:
+                    best, best_diff = self.fix_gps[i], abs(self.fix_times[i] - t)
+        return best
+
+    def process(self, file_path):
+        if file_path in self.own_writes:
+            # The close-write event caused by our own EXIF update
+            self.own_writes.discard(file_path)
+            return
+
+        taken, gps = self.gps_tool.read_media(file_path)
+        media = {'path': file_path, 'datetime': taken, 'gps': gps}
+
+        if media['gps'] is not None:
+            print(f"GPS fix: {file_path}")
+            if media['datetime'] is not None:
+                self._add_fix(media)
+                self._retry_waiting(media)
+                self._evict()
+            return
+
+        if media['datetime'] is None:
+            print(f"No GPS and no datetime: {file_path}")
+            return
+
+        gps = self.closest_fix(media)
+        if gps is not None:
+            self._assign(media, gps)
+        else:
+            print(f"No GPS yet: {file_path} (waiting for a nearby fix)")
+            self.waiting.append(media)
+            if len(self.waiting) > self.max_waiting:
+                dropped = self.waiting.pop(0)
+                print(f"Gave up waiting for a fix: {dropped['path']}")
+
+    def _retry_waiting(self, fix):
+        """A new fix can only help the photos that were waiting for one."""
+        window = self.time_window_hours * 3600
+        t = fix['datetime'].timestamp()
+        still_waiting = []
+        for media in self.waiting:
+            if abs(media['datetime'].timestamp() - t) <= window:
+                # Another fix may be closer still
+                self._assign(media, self.closest_fix(media))
+            else:
+                still_waiting.append(media)
+        self.waiting = still_waiting
+
+    def _assign(self, media, gps):
+        media['gps'] = gps
+        print(f"Proxy GPS {gps[0]:.6f},{gps[1]:.6f}: {media['path']}")
+
+        if self.output_csv:
+            write_header = not os.path.exists(self.output_csv)
+            with open(self.output_csv, 'a', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=['path', 'datetime', 'latitude', 'longitude', 'gps_source'])
+                if write_header:
+                    writer.writeheader()
+                writer.writerow({
+                    'path': media['path'],
+                    'datetime': media['datetime'].isoformat(),
+                    'latitude': gps[0],
+                    'longitude': gps[1],
+                    'gps_source': 'proxy'
+                })
+
+        if self.apply:
+            self.own_writes.add(media['path'])
+            if not self.gps_tool.update_image_gps(media['path'], gps[0], gps[1]):
+                self.own_writes.discard(media['path'])
+
+class MusicIngest:
+    """Copy new music into the Plex layout as it arrives."""
+
+    def __init__(self, dest_dir):
+        import plex_music_organizer
+
+        self.organizer = plex_music_organizer
+        self.dest_dir = dest_dir
+
+    def process(self, file_path):
+        metadata = self.organizer.get_metadata(file_path)
+        if not metadata:
+            print(f"Skipping: {file_path} (No metadata)")
+            return
+        self.organizer.organize_file(file_path, metadata, self.dest_dir)
+
+def _under(path, roots):
+    return any(os.path.commonpath([path, root]) == root for root in roots)
+
+def watch(photo_dirs, music_dirs, photo_handler=None, music_handler=None, debounce=2.0):
+    photo_dirs = [os.path.abspath(d) for d in photo_dirs]
+    music_dirs = [os.path.abspath(d) for d in music_dirs]
+
+    inotify = Inotify()
+    for directory in photo_dirs + music_dirs:
+        inotify.add_tree(directory)
+    debouncer = Debouncer(debounce)
+    print(f"Watching {len(inotify.watches)} directories (Ctrl+C to stop)")
+
+    try:
+        while True:
+            for path, mask in inotify.read(timeout=debounce / 2):
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # Files already inside a new or moved-in directory raise no events of their own
+                        inotify.add_tree(path)
+                        for dirpath, _, filenames in os.walk(path):
+                            for filename in filenames:
+                                debouncer.touch(os.path.join(dirpath, filename))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    if not os.path.basename(path).startswith('.'):
+                        debouncer.touch(path)
+
+            for path in debouncer.ready():
+                if not os.path.isfile(path):
+                    continue
+                lower_path = path.lower()
+                try:
+                    if photo_handler and lower_path.endswith(PHOTO_EXTENSIONS) and _under(path, photo_dirs):
+                        photo_handler.process(path)
+                    elif music_handler and lower_path.endswith(MUSIC_EXTENSIONS) and _under(path, music_dirs):
+                        music_handler.process(path)
+                except Exception as e:
+                    print(f"Error processing {path}: {e}")
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        inotify.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Process new photos and music as they land in inbox folders.")
+    parser.add_argument("--photos", action="append", default=[], help="Photo inbox to watch (repeatable)")
+    parser.add_argument("--music", action="append", default=[], help="Music inbox to watch (repeatable)")
+    parser.add_argument("--music-dest", help="Plex music library that new music is copied into")
+    parser.add_argument("--output", help="CSV that proxy GPS assignments are appended to")
+    parser.add_argument("--apply", action="store_true", help="Write proxy GPS into the photos' EXIF")
+    parser.add_argument("--catalog", help="Seed known GPS fixes from a media catalog database")
+    parser.add_argument("--time-window", type=float, default=1, help="Proxy GPS time window in hours")
+    parser.add_argument("--keep-fixes", type=float, default=7 * 24,
+                        help="Hours of GPS fixes (before the newest one) kept in memory for matching")
+    parser.add_argument("--debounce", type=float, default=2.0, help="Seconds a file must be quiet before processing")
+    args = parser.parse_args()
+
+    if not args.photos and not args.music:
+        parser.error("nothing to watch: give --photos and/or --music")
+    if args.music and not args.music_dest:
+        parser.error("--music requires --music-dest")
+    for directory in args.photos + args.music:
+        if not os.path.isdir(directory):
+            print(f"Error: Directory not found - {directory}")
+            sys.exit(1)
+
+    photo_handler = None
+    if args.photos:
+        photo_handler = GpsIngest(args.output, apply=args.apply, time_window_hours=args.time_window,
+                                  keep_hours=args.keep_fixes)
+        if args.catalog:
+            photo_handler.seed_from_catalog(args.catalog, args.photos)
+    music_handler = MusicIngest(args.music_dest) if args.music else None
+
+    watch(args.photos, args.music, photo_handler, music_handler, debounce=args.debounce)
+
+if __name__ == "__main__":
+    main()